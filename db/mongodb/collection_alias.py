@@ -0,0 +1,183 @@
+# coding=utf-8
+"""
+컬렉션 별칭(alias) - 읽는 쪽이 실제 컬렉션 이름 대신 별칭으로 컬렉션을 찾게 하여 원자적으로 전환
+
+MongoDB에는 컬렉션 별칭 기능이 없으므로 collection_aliases 컬렉션에 {_id: 별칭, target: 실제 컬렉션}
+문서를 두고, 전환은 이 문서 한 건의 compare-and-swap update로 한다 (문서 단위 update는 원자적).
+이전 target들은 history에 남겨 rollback에 쓴다.
+
+target 컬렉션을 읽는 데 필요한 설정(예: 임베딩 모델/차원/저장 형식)은 settings로 별칭 문서에 함께 기록하여
+이름과 같은 update로 전환/rollback되게 한다. 읽는 쪽은 AliasResolver의 validate로 자기 설정과 비교한다.
+
+별칭 문서가 없으면 별칭과 같은 이름의 컬렉션을 그대로 사용하므로 기존 rag_docs는 설정 없이 동작한다.
+전환/rollback/상태 조회는 embedding/reindex.py에서 한다.
+"""
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+
+ALIAS_COLLECTION = 'collection_aliases'
+# 이전 target을 몇 개까지 history에 남길지
+DEFAULT_HISTORY = 5
+# 읽는 쪽이 별칭을 다시 조회하는 주기 (초). 전환 후 이 시간 안에 모든 프로세스가 새 컬렉션을 읽음
+DEFAULT_RESOLVE_TTL = 30.0
+
+
+class AliasConflictError(Exception):
+    """다른 프로세스가 먼저 별칭을 바꿔 compare-and-swap이 실패했을 때 발생"""
+    pass
+
+
+def get_alias(db, alias: str) -> Optional[Dict[str, Any]]:
+    return db[ALIAS_COLLECTION].find_one({'_id': alias})
+
+
+def get_settings(db, alias: str) -> Optional[Dict[str, Any]]:
+    """별칭 문서에 기록된 현재 target의 settings (별칭 문서나 기록이 없으면 None)"""
+    doc = get_alias(db, alias)
+    return doc.get('settings') if doc else None
+
+
+def target_settings(db, alias: str, target: str) -> Optional[Dict[str, Any]]:
+    """현재 target 또는 history에 있는 target의 settings (기록이 없으면 None)"""
+    doc = get_alias(db, alias)
+    if doc is None:
+        return None
+    if doc['target'] == target:
+        return doc.get('settings')
+    for entry in reversed(doc.get('history', [])):
+        if entry['target'] == target:
+            return entry.get('settings')
+    return None
+
+
+def resolve_name(db, alias: str) -> str:
+    """별칭이 가리키는 실제 컬렉션 이름 (별칭 문서가 없으면 별칭 자체)"""
+    doc = get_alias(db, alias)
+    return doc['target'] if doc else alias
+
+
+def resolve_collection(db, alias: str):
+    return db[resolve_name(db, alias)]
+
+
+class AliasResolver:
+    """
+    별칭을 ttl초마다 다시 조회하는 읽기용 resolver (요청마다 조회하지 않도록)
+
+    Args:
+        db: pymongo Database
+        alias: 별칭 (예: rag_docs)
+        ttl: 재조회 주기 (초)
+        validate: (target, settings)를 받아 이 프로세스가 읽을 수 없으면 예외를 던지는 함수.
+            target이나 settings가 바뀔 때마다 호출하며, 실패하면 새 값을 캐시하지 않아 조회할 때마다 다시 확인한다.
+    """
+
+    def __init__(self, db, alias: str, ttl: float = DEFAULT_RESOLVE_TTL,
+                 validate: Callable[[str, Optional[Dict[str, Any]]], None] = None):
+        self.db = db
+        self.alias = alias
+        self.ttl = ttl
+        self.validate = validate
+        self._name = None
+        self._settings = None
+        self._resolved_at = 0.0
+
+    @property
+    def name(self) -> str:
+        now = time.monotonic()
+        if self._name is None or now - self._resolved_at >= self.ttl:
+            doc = get_alias(self.db, self.alias)
+            name, settings = (doc['target'], doc.get('settings')) if doc else (self.alias, None)
+            if self.validate is not None and (name, settings) != (self._name, self._settings):
+                self.validate(name, settings)
+            self._name, self._settings = name, settings
+            self._resolved_at = now
+        return self._name
+
+    @property
+    def settings(self) -> Optional[Dict[str, Any]]:
+        self.name
+        return self._settings
+
+    def collection(self):
+        return self.db[self.name]
+
+    def invalidate(self):
+        self._name = None
+
+
+def switch_alias(db, alias: str, target: str, expected: str = None, history: int = DEFAULT_HISTORY,
+                 settings: Dict[str, Any] = None) -> str:
+    """
+    별칭을 target으로 전환하고 이전 target(과 그 settings)을 history에 추가
+
+    Args:
+        expected: 전환 전 target이어야 하는 값 (None이면 현재 값). 다르면 AliasConflictError
+        settings: target을 읽는 데 필요한 설정 (None이면 기록하지 않음)
+
+    Returns:
+        이전 target
+    """
+    aliases = db[ALIAS_COLLECTION]
+    doc = aliases.find_one({'_id': alias})
+    current = doc['target'] if doc else alias
+    if expected is not None and expected != current:
+        raise AliasConflictError(f"{alias}: 현재 target {current} != 예상 {expected}")
+    if current == target:
+        return current
+
+    now = datetime.now(timezone.utc)
+    entry = {'target': current, 'until': now}
+    if doc is not None and doc.get('settings') is not None:
+        entry['settings'] = doc['settings']
+    if doc is None:
+        new_doc = {'_id': alias, 'target': target, 'switched_at': now, 'history': [entry]}
+        if settings is not None:
+            new_doc['settings'] = settings
+        aliases.insert_one(new_doc)
+        return current
+    update = {'$set': {'target': target, 'switched_at': now},
+              '$push': {'history': {'$each': [entry], '$slice': -history}}}
+    if settings is not None:
+        update['$set']['settings'] = settings
+    else:
+        update['$unset'] = {'settings': ''}
+    result = aliases.update_one({'_id': alias, 'target': current}, update)
+    if result.matched_count == 0:
+        raise AliasConflictError(f"{alias}: 전환 중에 다른 프로세스가 target을 바꿨습니다")
+    return current
+
+
+def rollback_alias(db, alias: str) -> str:
+    """별칭을 history의 마지막 target과 그 settings로 되돌리고 target 이름을 반환"""
+    aliases = db[ALIAS_COLLECTION]
+    doc = aliases.find_one({'_id': alias})
+    if not doc or not doc.get('history'):
+        raise ValueError(f"{alias}: 되돌릴 이전 target이 없습니다")
+    entry = doc['history'][-1]
+    previous = entry['target']
+    update = {'$set': {'target': previous, 'switched_at': datetime.now(timezone.utc)}, '$pop': {'history': 1}}
+    if entry.get('settings') is not None:
+        update['$set']['settings'] = entry['settings']
+    else:
+        update['$unset'] = {'settings': ''}
+    result = aliases.update_one({'_id': alias, 'target': doc['target']}, update)
+    if result.matched_count == 0:
+        raise AliasConflictError(f"{alias}: rollback 중에 다른 프로세스가 target을 바꿨습니다")
+    return previous
+
+
+def set_settings(db, alias: str, settings: Dict[str, Any]) -> bool:
+    """target은 그대로 두고 settings만 갱신 (제자리 변환 등). 별칭 문서가 없으면 False"""
+    result = db[ALIAS_COLLECTION].update_one({'_id': alias}, {'$set': {'settings': settings}})
+    return result.matched_count > 0
+
+
+def retained_targets(db, alias: str) -> List[str]:
+    """현재 target과 history의 target들 (최근 순)"""
+    doc = get_alias(db, alias)
+    if doc is None:
+        return [alias]
+    return [doc['target']] + [entry['target'] for entry in reversed(doc.get('history', []))]
+
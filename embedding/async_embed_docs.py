@@ -0,0 +1,225 @@
+# coding=utf-8
+"""
+rag_docs 임베딩 backlog를 동시에 처리하는 파이프라인 (embed_docs의 provider를 async로 호출)
+
+    backlog cursor ──▶ [batch queue] ──▶ 임베딩 워커 N개 ──▶ [write queue] ──▶ Mongo writer M개
+
+- 임베딩 워커: 동시에 N개 요청을 보내고, RPM/TPM 토큰 버킷(rate_limit.RequestPacer)으로 시작 시점을 조절
+- 429: 모든 워커를 잠시 멈추고(Retry-After 우선), 적용 한도를 줄였다가 성공이 이어지면 천천히 복구 (adaptive)
+- Mongo 쓰기: 별도 스레드에서 bulk_write하므로 DB가 느려도 write queue가 찰 때까지 API 호출은 멈추지 않음
+- 문서 선택/묶음 구성/캐시/업데이트 형식은 embed_docs.py(동기 버전)와 같음
+
+Usage:
+    python async_embed_docs.py --concurrency 8 --rpm 3000 --tpm 1000000
+"""
+import argparse
+import asyncio
+import time
+from typing import Any, Dict, List
+
+from embed_docs import (
+    PENDING_FIELD,
+    check_alias_settings,
+    collection,
+    db_client,
+    embedding_updates,
+    ensure_backlog_index,
+    fill_missing,
+    iter_backlog,
+    lookup_cached,
+    model,
+    provider,
+    storage_format,
+    valid_docs,
+)
+from embedding_batches import MAX_INPUTS_PER_REQUEST, MAX_TOKENS_PER_REQUEST, estimate_tokens, pack_batches
+from embedding_cache import EmbeddingCache
+from embedding_providers import EmbeddingProvider
+from llm_prompt_response.rate_limit import RequestPacer, call_with_retry
+from monitoring.usage_ledger import BudgetExceededError, UsageLedger, add_ledger_arguments, ledger_from_args
+from vector_storage import sync_vector_index
+
+_DONE = object()
+
+
+async def produce_batches(batch_queue: asyncio.Queue, counts: Dict[str, int], max_inputs: int, max_tokens: int,
+                          workers: int, target):
+    """backlog cursor에서 묶음을 만들어 queue에 넣음 (cursor 읽기는 blocking이므로 스레드에서)"""
+    batches = pack_batches(valid_docs(iter_backlog(target), counts), max_inputs, max_tokens, counts=counts)
+    while True:
+        batch = await asyncio.to_thread(next, batches, None)
+        if batch is None:
+            break
+        await batch_queue.put(batch)
+    for _ in range(workers):
+        await batch_queue.put(_DONE)
+
+
+async def embed_worker(
+    provider: EmbeddingProvider,
+    pacer: RequestPacer,
+    batch_queue: asyncio.Queue,
+    write_queue: asyncio.Queue,
+    counts: Dict[str, int],
+    stop: asyncio.Event,
+    max_retries: int,
+    cache: EmbeddingCache = None,
+    ledger: UsageLedger = None,
+):
+    """묶음을 꺼내 임베딩한 뒤 write queue로 넘김 (예산 초과 시 stop을 켜고 남은 묶음은 버림)"""
+    while True:
+        batch = await batch_queue.get()
+        if batch is _DONE:
+            return
+        if stop.is_set():
+            continue
+
+        texts = [doc['vector_content'] for doc in batch]
+        try:
+            keys, embeddings, missing = lookup_cached(texts, cache, ledger)
+            if missing:
+                request_texts = [texts[i] for i in missing]
+                result = await call_with_retry(
+                    lambda: provider.aembed(request_texts),
+                    pacer, sum(estimate_tokens(text) for text in request_texts), max_retries,
+                    label=f"{len(request_texts)}개 문서", ledger=ledger, stage='embedding', model=model,
+                    kind='embedding',
+                )
+                counts['requests'] += 1
+                fill_missing(embeddings, missing, result.vectors, keys, cache)
+        except BudgetExceededError as e:
+            print(f"⚠️  {e} - 남은 문서는 다음 실행에서 처리합니다.")
+            stop.set()
+            continue
+        except Exception as e:
+            counts['error'] += len(batch)
+            print(f"❌ {len(batch)}개 문서 묶음 임베딩 실패: {e}")
+            continue
+
+        await write_queue.put((batch, embeddings))
+
+
+async def mongo_writer(write_queue: asyncio.Queue, counts: Dict[str, int], total_count: int, target):
+    """임베딩 결과를 bulk_write로 저장 (스레드에서 실행하여 이벤트 루프/API 호출을 막지 않음)"""
+    while True:
+        item = await write_queue.get()
+        if item is _DONE:
+            return
+        batch, embeddings = item
+        try:
+            await asyncio.to_thread(target.bulk_write, embedding_updates(batch, embeddings), ordered=False)
+        except Exception as e:
+            counts['error'] += len(batch)
+            print(f"❌ {len(batch)}개 문서 저장 실패: {e}")
+            continue
+        counts['success'] += len(batch)
+        print(f"✅ [{counts['success'] + counts['error']}/{total_count}] {len(batch)}개 문서 임베딩 저장 완료")
+
+
+async def run_pipeline(
+    concurrency: int = 8,
+    writers: int = 2,
+    rpm: int = 3000,
+    tpm: int = 1_000_000,
+    max_retries: int = 6,
+    max_inputs: int = MAX_INPUTS_PER_REQUEST,
+    max_tokens: int = MAX_TOKENS_PER_REQUEST,
+    cache: EmbeddingCache = None,
+    ledger: UsageLedger = None,
+    target=None,
+) -> Dict[str, Any]:
+    """
+    backlog 전체를 임베딩 (target이 None이면 rag_docs, reindex.py는 shadow 컬렉션을 넘김)
+
+    rag_docs 별칭에 기록된 임베딩 설정이 이 프로세스와 다르면 EmbeddingSettingsError를 던진다.
+
+    Returns:
+        {'total', 'success', 'error', 'requests', 'truncated', 'elapsed'}
+    """
+    if target is None:
+        check_alias_settings()
+    target = collection if target is None else target
+    ensure_backlog_index(target)
+    total_count = await asyncio.to_thread(target.count_documents, {PENDING_FIELD: True})
+    counts = {'success': 0, 'error': 0, 'requests': 0, 'truncated': 0}
+    if total_count == 0:
+        return {'total': 0, **counts, 'elapsed': 0.0}
+
+    print(f"📊 임베딩이 필요한 문서: {total_count}개 (동시 {concurrency}, RPM {rpm}, TPM {tpm})")
+    started = time.perf_counter()
+
+    pacer = RequestPacer(rpm=rpm, tpm=tpm, adaptive=True)
+    batch_queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    # DB가 느릴 때 흡수할 버퍼. 가득 차면 워커가 기다리므로 메모리는 제한됨
+    write_queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 8)
+    stop = asyncio.Event()
+
+    try:
+        producer = asyncio.create_task(produce_batches(batch_queue, counts, max_inputs, max_tokens, concurrency,
+                                                       target))
+        workers: List[asyncio.Task] = [
+            asyncio.create_task(embed_worker(provider, pacer, batch_queue, write_queue, counts, stop, max_retries,
+                                             cache, ledger))
+            for _ in range(concurrency)
+        ]
+        writer_tasks = [asyncio.create_task(mongo_writer(write_queue, counts, total_count, target))
+                        for _ in range(writers)]
+
+        await producer
+        await asyncio.gather(*workers)
+        for _ in range(writers):
+            await write_queue.put(_DONE)
+        await asyncio.gather(*writer_tasks)
+    finally:
+        await provider.aclose()
+
+    return {'total': total_count, **counts, 'elapsed': time.perf_counter() - started}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='rag_docs 임베딩 동시 처리 파이프라인')
+    parser.add_argument('--concurrency', type=int, default=8, help='동시에 진행할 최대 임베딩 요청 수')
+    parser.add_argument('--writers', type=int, default=2, help='Mongo bulk_write 동시 실행 수')
+    parser.add_argument('--rpm', type=int, default=3000, help='분당 최대 요청 수')
+    parser.add_argument('--tpm', type=int, default=1_000_000, help='분당 최대 토큰 수')
+    parser.add_argument('--max-retries', type=int, default=6, help='429/5xx 재시도 횟수')
+    parser.add_argument('--max-inputs', type=int, default=MAX_INPUTS_PER_REQUEST, help='요청당 최대 문서 수')
+    parser.add_argument('--no-cache', action='store_true', help='임베딩 캐시를 사용하지 않음')
+    add_ledger_arguments(parser)
+    args = parser.parse_args()
+
+    cache = None if args.no_cache else EmbeddingCache()
+    ledger = ledger_from_args(args)
+    try:
+        db_client.admin.command('ping')
+        print("✅ MongoDB 연결 성공\n")
+        check_alias_settings()
+        dims = provider.num_dimensions
+        print(f"🗂️  vector index ({dims}차원, {storage_format}): {sync_vector_index(collection, dims)}\n")
+        summary = asyncio.run(run_pipeline(
+            args.concurrency, args.writers, args.rpm, args.tpm, args.max_retries, args.max_inputs,
+            MAX_TOKENS_PER_REQUEST, cache, ledger,
+        ))
+    finally:
+        if cache is not None:
+            cache.print_stats()
+            cache.close()
+        db_client.close()
+
+    if summary['total'] == 0:
+        print("✅ 모든 문서에 임베딩이 이미 존재합니다.")
+        return
+    print(f"\n{'='*60}")
+    print(f"📊 작업 완료 요약 ({summary['elapsed']:.1f}s):")
+    print(f"   ✅ 성공: {summary['success']}개")
+    print(f"   ❌ 실패: {summary['error']}개")
+    print(f"   📝 전체: {summary['total']}개")
+    print(f"   📨 API 요청: {summary['requests']}회")
+    if summary['truncated']:
+        print(f"   ✂️  잘라서 임베딩: {summary['truncated']}개")
+    print(f"   💰 비용: ${ledger.run_cost:.4f} ({ledger.run_tokens} tokens, run {ledger.run_id})")
+    print(f"{'='*60}")
+
+
+if __name__ == "__main__":
+    main()
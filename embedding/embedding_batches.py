@@ -0,0 +1,67 @@
+# coding=utf-8
+"""
+임베딩 요청 묶음(batch) 구성
+
+embeddings API는 한 요청에 여러 input을 받을 수 있으므로, 문서마다 한 번씩 호출하지 않고
+요청당 input 개수/토큰 한도 안에서 최대한 많이 묶어 보낸다.
+(한도: 요청당 input 2048개, 합계 300,000 토큰, input당 8,192 토큰)
+input 하나가 한도를 넘으면 그 문서가 든 요청 전체가 거절되므로, 묶기 전에 input당 한도로 자른다.
+"""
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+# API 한도보다 여유 있게 잡은 값 (토큰 수는 추정치이므로)
+MAX_INPUTS_PER_REQUEST = 2048
+MAX_TOKENS_PER_REQUEST = 250_000
+# input당 한도(8,192)는 추정치와 비교하므로 여유를 크게 둠 (한글은 실제 토큰 수가 추정보다 많은 경우가 있음)
+MAX_TOKENS_PER_INPUT = 6000
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    tokenizer 없이 쓰는 보수적인 토큰 수 추정 (llm_prompt_response/rate_limit.py와 같은 방식)
+
+    한글은 대략 글자당 1토큰, 영문/숫자는 3~4글자당 1토큰이므로 UTF-8 바이트 수 / 3을 사용한다.
+    """
+    if not text:
+        return 0
+    return len(text.encode('utf-8')) // 3 + 1
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """estimate_tokens 기준 max_tokens 이하가 되도록 앞부분만 남김 (UTF-8 글자 중간에서 자르지 않음)"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    return text.encode('utf-8')[:(max_tokens - 1) * 3].decode('utf-8', errors='ignore')
+
+
+def pack_batches(
+    docs: Iterable[Dict[str, Any]],
+    max_inputs: int = MAX_INPUTS_PER_REQUEST,
+    max_tokens: int = MAX_TOKENS_PER_REQUEST,
+    text_field: str = 'vector_content',
+    max_input_tokens: int = MAX_TOKENS_PER_INPUT,
+    counts: Optional[Dict[str, int]] = None,
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    문서들을 요청 한도 안에 들어가는 묶음으로 나눔 (입력 순서 유지, 스트리밍 가능)
+
+    text_field가 max_input_tokens보다 긴 문서는 앞부분만 남긴 사본으로 바꿔 넣고 counts['truncated']에 센다
+    (원본 문서 dict와 DB의 vector_content는 그대로). 한 문서가 max_tokens보다 크면 단독 묶음으로 보낸다.
+    """
+    batch, batch_tokens = [], 0
+    for doc in docs:
+        tokens = estimate_tokens(doc[text_field])
+        if tokens > max_input_tokens:
+            doc = {**doc, text_field: truncate_to_tokens(doc[text_field], max_input_tokens)}
+            tokens = estimate_tokens(doc[text_field])
+            print(f"✂️  문서 {doc.get('page_id', doc.get('_id'))}: {text_field}가 input당 한도를 넘어 "
+                  f"앞 {max_input_tokens} 토큰만 임베딩합니다.")
+            if counts is not None:
+                counts['truncated'] = counts.get('truncated', 0) + 1
+        if batch and (len(batch) >= max_inputs or batch_tokens + tokens > max_tokens):
+            yield batch
+            batch, batch_tokens = [], 0
+        batch.append(doc)
+        batch_tokens += tokens
+    if batch:
+        yield batch
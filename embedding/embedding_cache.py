@@ -0,0 +1,255 @@
+# coding=utf-8
+"""
+텍스트 내용 기준 임베딩 디스크 캐시
+
+generate_rag_objects로 문서를 다시 적재하거나 rag_docs를 새로 만들면 vector_content_embedding이 사라지지만,
+vector_content가 그대로인 문서는 이 캐시에서 벡터를 가져오므로 API를 다시 호출하지 않는다.
+
+- 키: (모델, dimensions, sha256(텍스트)) 이므로 모델/차원이 바뀌면 자동으로 다른 키
+- 벡터: float32로 하나의 append-only blob 파일(vectors.f32)에 이어 붙여 저장 (1536차원 = 6KB)
+- 인덱스: SQLite (key -> blob 내 위치, 차원, 최근 사용 시각) - 여러 프로세스에서 동시에 열어도 안전
+- 크기 제한: 저장된 벡터 크기가 max_bytes를 넘으면 가장 오래 사용되지 않은 항목부터 인덱스에서 삭제(LRU)하고,
+  blob에 버려진 영역이 절반을 넘으면 살아 있는 벡터만 새 blob으로 옮겨 씀(compact)
+- 통계: 이번 실행과 누적 hit/miss 수
+
+Usage:
+    python embedding_cache.py stats
+    python embedding_cache.py compact
+    python embedding_cache.py clear
+"""
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_CACHE_DIR = ROOT_DIR / 'data' / 'embedding_cache'
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+VECTOR_DTYPE = np.float32
+BLOB_FILENAME = 'vectors.f32'
+INDEX_FILENAME = 'index.sqlite3'
+LOCK_FILENAME = 'vectors.lock'
+
+
+def embedding_cache_key(model: str, dimensions: Optional[int], text: str) -> str:
+    """(모델, 차원, 텍스트 sha256) 키. dimensions가 None이면 모델 기본 차원"""
+    text_hash = hashlib.sha256(text.encode('utf-8')).hexdigest()
+    return f"{model}:{dimensions or 'default'}:{text_hash}"
+
+
+class EmbeddingCache:
+    """
+    크기 제한이 있는 LRU 임베딩 캐시
+
+    Args:
+        cache_dir: blob/인덱스 파일을 둘 디렉토리
+        max_bytes: 저장할 벡터 크기의 상한 (바이트)
+    """
+
+    def __init__(self, cache_dir: Path = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.blob_path = self.cache_dir / BLOB_FILENAME
+        self.lock_path = self.cache_dir / LOCK_FILENAME
+        self.blob_path.touch(exist_ok=True)
+        self._conn = sqlite3.connect(self.cache_dir / INDEX_FILENAME, timeout=30, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS vectors ('
+            ' key TEXT PRIMARY KEY,'
+            ' offset INTEGER NOT NULL,'
+            ' dims INTEGER NOT NULL,'
+            ' created_at REAL NOT NULL,'
+            ' last_access REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS vectors_last_access ON vectors(last_access)')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+
+    @contextmanager
+    def _blob_lock(self, exclusive: bool):
+        """blob 쓰기/compact는 배타 잠금, 읽기는 공유 잠금 (compact 중에 위치가 바뀌므로)"""
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _add_stat(self, name: str, value: int):
+        if value:
+            self._conn.execute(
+                'INSERT INTO stats(name, value) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + ?',
+                (name, value, value),
+            )
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, np.ndarray]:
+        """캐시에 있는 키의 벡터만 반환 (없는 키는 결과에 없음). 조회한 항목의 최근 사용 시각을 갱신"""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        with self._blob_lock(exclusive=False):
+            rows = []
+            # SQLite 변수 개수 한도를 넘지 않도록 나누어 조회
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                rows.extend(self._conn.execute(
+                    f"SELECT key, offset, dims FROM vectors WHERE key IN ({','.join('?' * len(chunk))})", chunk,
+                ).fetchall())
+            if rows:
+                with open(self.blob_path, 'rb') as blob:
+                    for key, offset, dims in sorted(rows, key=lambda row: row[1]):
+                        blob.seek(offset)
+                        vector = np.fromfile(blob, dtype=VECTOR_DTYPE, count=dims)
+                        if len(vector) == dims:
+                            found[key] = vector
+
+        now = time.time()
+        self._conn.executemany('UPDATE vectors SET last_access = ? WHERE key = ?', [(now, key) for key in found])
+        hits, misses = len(found), len(keys) - len(found)
+        self.hits += hits
+        self.misses += misses
+        self._add_stat('hits', hits)
+        self._add_stat('misses', misses)
+        return found
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        return self.get_many([key]).get(key)
+
+    def put_many(self, items: Dict[str, Any]):
+        """벡터들을 blob 끝에 이어 쓰고 인덱스에 등록한 뒤 크기 상한을 넘으면 정리"""
+        if not items:
+            return
+        now = time.time()
+        rows = []
+        with self._blob_lock(exclusive=True):
+            with open(self.blob_path, 'ab') as blob:
+                offset = blob.seek(0, os.SEEK_END)
+                for key, vector in items.items():
+                    data = np.asarray(vector, dtype=VECTOR_DTYPE)
+                    blob.write(data.tobytes())
+                    rows.append((key, offset, len(data), now, now))
+                    offset += data.nbytes
+                blob.flush()
+                os.fsync(blob.fileno())
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO vectors(key, offset, dims, created_at, last_access) VALUES (?, ?, ?, ?, ?)',
+                rows,
+            )
+        self._evict()
+
+    def put(self, key: str, vector: Any):
+        self.put_many({key: vector})
+
+    def _live_bytes(self) -> int:
+        itemsize = np.dtype(VECTOR_DTYPE).itemsize
+        return self._conn.execute('SELECT COALESCE(SUM(dims), 0) FROM vectors').fetchone()[0] * itemsize
+
+    def _evict(self):
+        itemsize = np.dtype(VECTOR_DTYPE).itemsize
+        total = self._live_bytes()
+        if total > self.max_bytes:
+            evicted = 0
+            for key, dims in self._conn.execute('SELECT key, dims FROM vectors ORDER BY last_access').fetchall():
+                if total <= self.max_bytes:
+                    break
+                self._conn.execute('DELETE FROM vectors WHERE key = ?', (key,))
+                total -= dims * itemsize
+                evicted += 1
+            self._add_stat('evictions', evicted)
+
+        # 삭제/덮어쓰기로 버려진 영역이 blob의 절반을 넘으면 compact
+        if self.blob_path.stat().st_size > 2 * max(total, 1) and self.blob_path.stat().st_size > 64 * 1024:
+            self.compact()
+
+    def compact(self) -> int:
+        """살아 있는 벡터만 새 blob으로 옮겨 쓰고 위치를 갱신. 회수한 바이트 수를 반환"""
+        itemsize = np.dtype(VECTOR_DTYPE).itemsize
+        with self._blob_lock(exclusive=True):
+            before = self.blob_path.stat().st_size
+            tmp_path = self.blob_path.with_suffix('.f32.tmp')
+            rows = self._conn.execute('SELECT key, offset, dims FROM vectors ORDER BY offset').fetchall()
+            moved = []
+            with open(self.blob_path, 'rb') as src, open(tmp_path, 'wb') as dst:
+                for key, offset, dims in rows:
+                    src.seek(offset)
+                    moved.append((dst.tell(), key))
+                    dst.write(src.read(dims * itemsize))
+                dst.flush()
+                os.fsync(dst.fileno())
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                self._conn.executemany('UPDATE vectors SET offset = ? WHERE key = ?', moved)
+                os.replace(tmp_path, self.blob_path)
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+            return before - self.blob_path.stat().st_size
+
+    def stats(self) -> Dict[str, Any]:
+        """이번 실행(session)과 누적(total) hit/miss 및 저장 용량"""
+        entries = self._conn.execute('SELECT COUNT(*) FROM vectors').fetchone()[0]
+        totals = dict(self._conn.execute('SELECT name, value FROM stats').fetchall())
+        session_lookups = self.hits + self.misses
+        total_lookups = totals.get('hits', 0) + totals.get('misses', 0)
+        return {
+            'entries': entries,
+            'bytes': self._live_bytes(),
+            'blob_bytes': self.blob_path.stat().st_size,
+            'max_bytes': self.max_bytes,
+            'session_hits': self.hits,
+            'session_misses': self.misses,
+            'session_hit_rate': self.hits / session_lookups if session_lookups else 0.0,
+            'total_hits': totals.get('hits', 0),
+            'total_misses': totals.get('misses', 0),
+            'total_hit_rate': totals.get('hits', 0) / total_lookups if total_lookups else 0.0,
+            'evictions': totals.get('evictions', 0),
+        }
+
+    def print_stats(self):
+        s = self.stats()
+        print(f"🗄️  임베딩 캐시: hit {s['session_hits']} / miss {s['session_misses']} "
+              f"(hit rate {s['session_hit_rate']:.1%}), "
+              f"{s['entries']}개 벡터, {s['bytes'] / 1024 / 1024:.1f}MB / {s['max_bytes'] / 1024 / 1024:.0f}MB")
+
+    def clear(self):
+        with self._blob_lock(exclusive=True):
+            self._conn.execute('DELETE FROM vectors')
+            self._conn.execute('DELETE FROM stats')
+            open(self.blob_path, 'wb').close()
+
+    def close(self):
+        self._conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='임베딩 캐시 관리')
+    parser.add_argument('command', choices=['stats', 'compact', 'clear'])
+    parser.add_argument('--path', type=Path, default=DEFAULT_CACHE_DIR, help='캐시 디렉토리')
+    args = parser.parse_args()
+
+    cache = EmbeddingCache(args.path)
+    try:
+        if args.command == 'stats':
+            print(json.dumps(cache.stats(), ensure_ascii=False, indent=4))
+        elif args.command == 'compact':
+            print(f"🧹 {cache.compact() / 1024 / 1024:.1f}MB 회수: {args.path}")
+        else:
+            cache.clear()
+            print(f"🧹 캐시를 비웠습니다: {args.path}")
+    finally:
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+# coding=utf-8
+"""
+임베딩 provider
+
+적재(embed_docs.py, async_embed_docs.py)와 검색(run_vector_search.py)은 provider.embed / aembed만 호출하므로
+EMBEDDING_PROVIDER 환경 변수로 임베딩 방식을 바꿀 수 있다.
+
+- openai (기본): text-embedding-3-small. EMBEDDING_DIMENSIONS가 있으면 dimensions 파라미터로 전달
+- local: 해시된 문자 n-gram TF-IDF를 sparse random projection으로 고정 차원에 사영한 벡터
+  네트워크/API 키 없이 같은 텍스트에 항상 같은 벡터를 만들므로, 적재→검색 전체 경로를 오프라인에서
+  실제 규모로 부하 테스트/벤치마크할 때 사용한다 (검색 품질은 OpenAI 임베딩보다 낮음)
+  IDF는 fit-idf로 한 번 계산해 두면 사용하고, 없으면 TF만 쓴다
+
+Usage:
+    EMBEDDING_PROVIDER=local python embed_docs.py
+    EMBEDDING_PROVIDER=local python embedding_providers.py fit-idf    # rag_docs의 vector_content로 IDF 계산
+    python embedding_providers.py bench --provider local --count 20000
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import random
+import time
+from pathlib import Path
+from typing import Any, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from openai import AsyncOpenAI, OpenAI
+
+DEFAULT_OPENAI_MODEL = 'text-embedding-3-small'
+MODEL_DIMENSIONS = {
+    'text-embedding-3-small': 1536,
+    'text-embedding-3-large': 3072,
+    'text-embedding-ada-002': 1536,
+}
+
+LOCAL_MODEL = 'local-hash-tfidf'
+LOCAL_DEFAULT_DIMENSIONS = 384
+LOCAL_NGRAM_RANGE = (2, 4)
+# IDF를 셀 해시 공간 크기 (2^20 float32 = 4MB)
+LOCAL_NUM_FEATURES = 2 ** 20
+# n-gram 하나를 사영할 차원 수 (sparse random projection의 0이 아닌 원소 수)
+LOCAL_PROJECTIONS = 4
+ROOT_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_IDF_PATH = ROOT_DIR / 'data' / 'local_embedding_idf.npz'
+
+_HASH_BASE = np.uint64(0x100000001B3)
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+
+
+class EmbeddingResult(NamedTuple):
+    """입력 순서대로의 벡터와 API usage (local provider는 None)"""
+    vectors: List[List[float]]
+    usage: Any = None
+
+
+class EmbeddingProvider:
+    """
+    provider 공통 인터페이스
+
+    Attributes:
+        model: ledger/캐시 키에 쓰는 모델 이름 (설정이 바뀌면 벡터도 바뀌므로 이름도 달라야 함)
+        dimensions: 요청한 차원 (None이면 모델 기본 차원)
+    """
+
+    model: str = ''
+    dimensions: Optional[int] = None
+
+    @property
+    def num_dimensions(self) -> int:
+        raise NotImplementedError
+
+    def embed(self, texts: List[str]) -> EmbeddingResult:
+        raise NotImplementedError
+
+    async def aembed(self, texts: List[str]) -> EmbeddingResult:
+        """기본 구현은 embed를 스레드에서 실행"""
+        return await asyncio.to_thread(self.embed, texts)
+
+    async def aclose(self):
+        pass
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    """
+    OpenAI embeddings API
+
+    재시도는 호출하는 쪽(embed_docs의 예외 처리, rate_limit.call_with_retry)에서 관리하므로
+    async 클라이언트의 SDK 재시도는 끈다.
+    """
+
+    def __init__(self, model: str = DEFAULT_OPENAI_MODEL, dimensions: Optional[int] = None, api_key: str = None):
+        self.model = model
+        self.dimensions = dimensions
+        self.client = OpenAI(api_key=api_key)
+        self._api_key = api_key
+        self._async_client = None
+
+    @property
+    def num_dimensions(self) -> int:
+        return self.dimensions or MODEL_DIMENSIONS[self.model]
+
+    def _kwargs(self, texts: List[str]):
+        kwargs = {'input': texts, 'model': self.model}
+        if self.dimensions:
+            kwargs['dimensions'] = self.dimensions
+        return kwargs
+
+    @staticmethod
+    def _result(response) -> EmbeddingResult:
+        vectors = [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        return EmbeddingResult(vectors, response.usage)
+
+    def embed(self, texts: List[str]) -> EmbeddingResult:
+        return self._result(self.client.embeddings.create(**self._kwargs(texts)))
+
+    async def aembed(self, texts: List[str]) -> EmbeddingResult:
+        if self._async_client is None:
+            self._async_client = AsyncOpenAI(api_key=self._api_key, max_retries=0)
+        return self._result(await self._async_client.embeddings.create(**self._kwargs(texts)))
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
+
+
+def _mix64(values: np.ndarray) -> np.ndarray:
+    """splitmix64 finalizer (uint64 오버플로는 mod 2^64로 동작)"""
+    values = values ^ (values >> np.uint64(30))
+    values = values * np.uint64(0xBF58476D1CE4E5B9)
+    values = values ^ (values >> np.uint64(27))
+    values = values * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def ngram_hashes(text: str, ngram_range: Tuple[int, int] = LOCAL_NGRAM_RANGE) -> np.ndarray:
+    """
+    공백을 정리한 소문자 텍스트의 문자 n-gram 해시 (uint64, 중복 포함)
+
+    파이썬 hash()는 프로세스마다 값이 달라지므로 쓰지 않고, 코드포인트 배열에 대한 다항식 해시를 NumPy로 계산한다.
+    """
+    normalized = f" {' '.join(text.lower().split())} "
+    codes = np.frombuffer(normalized.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    hashes = []
+    with np.errstate(over='ignore'):
+        for n in range(ngram_range[0], ngram_range[1] + 1):
+            if len(codes) < n:
+                break
+            h = np.full(len(codes) - n + 1, np.uint64(n), dtype=np.uint64)
+            for offset in range(n):
+                h = h * _HASH_BASE + codes[offset:len(codes) - n + 1 + offset]
+            hashes.append(_mix64(h))
+    return np.concatenate(hashes) if hashes else np.zeros(0, dtype=np.uint64)
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """
+    해시된 문자 n-gram TF-IDF + sparse random projection (결정적, 네트워크 없음)
+
+    n-gram마다 LOCAL_PROJECTIONS개의 (차원, 부호)를 해시로 정하고 (1 + log tf) * idf 가중치를 더한 뒤 L2 정규화한다.
+    한글은 음절 단위 n-gram이므로 형태소 분석 없이도 조사/어미가 붙은 단어끼리 겹치는 n-gram이 생긴다.
+    """
+
+    def __init__(self, dimensions: int = LOCAL_DEFAULT_DIMENSIONS, idf_path: Path = DEFAULT_IDF_PATH,
+                 ngram_range: Tuple[int, int] = LOCAL_NGRAM_RANGE):
+        self.dimensions = dimensions
+        self.ngram_range = ngram_range
+        self.idf_path = Path(idf_path)
+        self.idf = None
+        model = f"{LOCAL_MODEL}-{ngram_range[0]}{ngram_range[1]}"
+        if self.idf_path.exists():
+            with np.load(self.idf_path) as data:
+                self.idf = data['idf'].astype(np.float32)
+            # IDF가 바뀌면 벡터도 바뀌므로 캐시 키가 겹치지 않게 모델 이름에 포함
+            model += f"@{hashlib.sha256(self.idf.tobytes()).hexdigest()[:8]}"
+        self.model = model
+
+    @property
+    def num_dimensions(self) -> int:
+        return self.dimensions
+
+    def _vector(self, text: str) -> np.ndarray:
+        hashes, counts = np.unique(ngram_hashes(text, self.ngram_range), return_counts=True)
+        weights = 1 + np.log(counts.astype(np.float32))
+        if self.idf is not None:
+            weights *= self.idf[(hashes % np.uint64(LOCAL_NUM_FEATURES)).astype(np.int64)]
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        with np.errstate(over='ignore'):
+            for j in range(LOCAL_PROJECTIONS):
+                projected = _mix64(hashes + _GOLDEN * np.uint64(j + 1))
+                positions = (projected % np.uint64(self.dimensions)).astype(np.int64)
+                signs = np.where(projected >> np.uint64(63), 1.0, -1.0).astype(np.float32)
+                vector += np.bincount(positions, weights=weights * signs, minlength=self.dimensions)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def embed(self, texts: List[str]) -> EmbeddingResult:
+        return EmbeddingResult([self._vector(text).tolist() for text in texts])
+
+    def fit_idf(self, texts: Iterable[str]) -> int:
+        """문서 빈도로 IDF(smooth)를 계산해 idf_path에 저장. 저장 후 생성하는 provider부터 적용"""
+        document_frequency = np.zeros(LOCAL_NUM_FEATURES, dtype=np.int64)
+        num_docs = 0
+        for text in texts:
+            features = np.unique(ngram_hashes(text, self.ngram_range) % np.uint64(LOCAL_NUM_FEATURES))
+            document_frequency[features.astype(np.int64)] += 1
+            num_docs += 1
+        idf = np.log((1 + num_docs) / (1 + document_frequency)) + 1
+        self.idf_path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez(self.idf_path, idf=idf.astype(np.float32), documents=num_docs)
+        return num_docs
+
+
+def get_provider(name: str = None, dimensions: Optional[int] = None) -> EmbeddingProvider:
+    """EMBEDDING_PROVIDER(openai | local) 환경 변수 또는 name으로 provider 생성"""
+    name = name or os.getenv('EMBEDDING_PROVIDER', 'openai')
+    if name == 'openai':
+        return OpenAIEmbeddingProvider(dimensions=dimensions)
+    if name == 'local':
+        return HashingEmbeddingProvider(dimensions or LOCAL_DEFAULT_DIMENSIONS)
+    raise ValueError(f"알 수 없는 EMBEDDING_PROVIDER: {name} (openai | local)")
+
+
+def synthetic_texts(count: int, length: int = 1500, seed: int = 0) -> List[str]:
+    """벤치마크용 한글 음절/영문 단어 무작위 텍스트 (seed가 같으면 같은 텍스트)"""
+    rng = random.Random(seed)
+    hangul = [''.join(chr(0xAC00 + rng.randrange(11172)) for _ in range(rng.randint(1, 4))) for _ in range(5000)]
+    latin = [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(2, 8))) for _ in range(1000)]
+    vocabulary = hangul + latin
+    texts = []
+    for _ in range(count):
+        words, size = [], 0
+        while size < length:
+            word = rng.choice(vocabulary)
+            words.append(word)
+            size += len(word) + 1
+        texts.append(' '.join(words))
+    return texts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='임베딩 provider 관리/벤치마크')
+    parser.add_argument('command', choices=['fit-idf', 'bench'])
+    parser.add_argument('--provider', default=None, help='openai | local (기본: EMBEDDING_PROVIDER)')
+    parser.add_argument('--count', type=int, default=10000, help='bench 문서 수')
+    parser.add_argument('--batch-size', type=int, default=256, help='bench 요청당 문서 수')
+    args = parser.parse_args()
+
+    if args.command == 'fit-idf':
+        # embed_docs가 이 모듈을 import하므로 CLI에서만 불러옴
+        from embed_docs import collection, db_client
+
+        provider = HashingEmbeddingProvider()
+        try:
+            cursor = collection.find({'vector_content': {'$type': 'string'}}, {'vector_content': 1}, batch_size=500)
+            num_docs = provider.fit_idf(doc['vector_content'] for doc in cursor)
+        finally:
+            db_client.close()
+        print(f"✅ {num_docs}개 문서로 IDF 계산: {provider.idf_path}")
+        return
+
+    provider = get_provider(args.provider)
+    texts = synthetic_texts(args.count)
+    started = time.perf_counter()
+    for i in range(0, len(texts), args.batch_size):
+        provider.embed(texts[i:i + args.batch_size])
+    elapsed = time.perf_counter() - started
+    print(f"📊 {provider.model} ({provider.num_dimensions}차원): {args.count}개 문서 {elapsed:.1f}s "
+          f"({args.count / elapsed:.0f} docs/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+# coding=utf-8
+"""
+임베딩 작업 큐 (SQLite, 프로세스 간 공유)
+
+적재 스크립트(generate_rag_objects.py)가 page_id를 넣고, embedding_worker.py가 계속 꺼내 임베딩한다.
+
+- 중복 제거: page_id가 키이므로 같은 페이지를 여러 번 넣어도 작업은 하나
+  (처리 중인 페이지를 다시 넣으면 처리가 끝난 뒤 한 번 더 처리하도록 표시)
+- visibility timeout: 꺼낸(lease) 작업은 timeout 동안 다른 워커에게 보이지 않고, 워커가 죽어 ack하지 못하면
+  timeout 뒤 다시 꺼낼 수 있음
+- dead-letter: max_attempts번 실패한 작업은 dead 상태로 옮겨 더 이상 꺼내지 않음 (requeue-dead로 되살림)
+
+Usage:
+    python embedding_queue.py stats
+    python embedding_queue.py enqueue 12345 67890
+    python embedding_queue.py dead
+    python embedding_queue.py requeue-dead
+"""
+import argparse
+import json
+import sqlite3
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Tuple
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+# 적재 스크립트와 워커가 서로 다른 디렉토리에서 실행되어도 같은 파일을 쓰도록 저장소 루트 기준
+DEFAULT_QUEUE_PATH = ROOT_DIR / 'data' / 'embedding_queue.sqlite3'
+DEFAULT_VISIBILITY_TIMEOUT = 300.0
+DEFAULT_MAX_ATTEMPTS = 5
+
+READY, LEASED, DEAD = 'ready', 'leased', 'dead'
+
+
+class EmbeddingQueue:
+    """
+    page_id 단위 내구성 작업 큐
+
+    Args:
+        path: SQLite 파일 경로
+        visibility_timeout: lease한 작업이 다른 워커에게 다시 보이기까지의 시간 (초)
+        max_attempts: 이 횟수만큼 lease되고도 끝나지 않으면 dead-letter
+    """
+
+    def __init__(self, path: Path = DEFAULT_QUEUE_PATH, visibility_timeout: float = DEFAULT_VISIBILITY_TIMEOUT,
+                 max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.path = Path(path)
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            ' page_id TEXT PRIMARY KEY,'
+            ' state TEXT NOT NULL,'
+            ' attempts INTEGER NOT NULL DEFAULT 0,'
+            ' visible_at REAL NOT NULL,'
+            ' enqueued_at REAL NOT NULL,'
+            ' lease_id TEXT,'
+            ' requeue INTEGER NOT NULL DEFAULT 0,'
+            ' last_error TEXT)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS jobs_visible ON jobs(state, visible_at)')
+
+    def enqueue_many(self, page_ids: Iterable[Any]) -> int:
+        """
+        page_id들을 큐에 추가하고 추가/갱신된 수를 반환
+
+        대기 중이면 그대로, 처리 중이면 끝난 뒤 다시 처리하도록 표시, dead면 시도 횟수를 초기화해 되살림
+        """
+        now = time.time()
+        rows = [(str(page_id), READY, now, now) for page_id in page_ids]
+        if not rows:
+            return 0
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                'INSERT INTO jobs(page_id, state, visible_at, enqueued_at) VALUES (?, ?, ?, ?) '
+                'ON CONFLICT(page_id) DO UPDATE SET '
+                " requeue = CASE WHEN state = 'leased' THEN 1 ELSE requeue END,"
+                " attempts = CASE WHEN state = 'dead' THEN 0 ELSE attempts END,"
+                " last_error = CASE WHEN state = 'dead' THEN NULL ELSE last_error END,"
+                " visible_at = CASE WHEN state = 'dead' THEN excluded.visible_at ELSE visible_at END,"
+                " state = CASE WHEN state = 'dead' THEN 'ready' ELSE state END",
+                rows,
+            )
+            changed = self._conn.total_changes - before
+            self._conn.execute('COMMIT')
+        except Exception:
+            self._conn.execute('ROLLBACK')
+            raise
+        return changed
+
+    def enqueue(self, page_id: Any) -> int:
+        return self.enqueue_many([page_id])
+
+    def lease(self, limit: int, visibility_timeout: float = None) -> Tuple[str, List[str]]:
+        """
+        보이는 작업을 오래된 순으로 최대 limit개 꺼냄 (timeout이 지난 lease 포함)
+
+        이미 max_attempts번 lease된 작업(처리 중 워커가 계속 죽은 경우)은 꺼내지 않고 dead로 옮긴다.
+
+        Returns:
+            (lease_id, page_id 목록) - ack/nack에 lease_id를 넘김
+        """
+        now = time.time()
+        lease_id = uuid.uuid4().hex
+        timeout = self.visibility_timeout if visibility_timeout is None else visibility_timeout
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            self._conn.execute(
+                "UPDATE jobs SET state = 'dead', lease_id = NULL,"
+                " last_error = COALESCE(last_error, 'visibility timeout 초과 반복') "
+                "WHERE state = 'leased' AND visible_at <= ? AND attempts >= ?",
+                (now, self.max_attempts),
+            )
+            page_ids = [row[0] for row in self._conn.execute(
+                "SELECT page_id FROM jobs WHERE state IN ('ready', 'leased') AND visible_at <= ? "
+                'ORDER BY enqueued_at LIMIT ?',
+                (now, limit),
+            ).fetchall()]
+            self._conn.executemany(
+                "UPDATE jobs SET state = 'leased', lease_id = ?, visible_at = ?, attempts = attempts + 1 "
+                'WHERE page_id = ?',
+                [(lease_id, now + timeout, page_id) for page_id in page_ids],
+            )
+            self._conn.execute('COMMIT')
+        except Exception:
+            self._conn.execute('ROLLBACK')
+            raise
+        return lease_id, page_ids
+
+    def ack(self, lease_id: str, page_ids: Iterable[Any]):
+        """처리 완료. 처리 중에 다시 들어온 작업은 삭제하지 않고 새 작업으로 되돌림"""
+        rows = [(lease_id, str(page_id)) for page_id in page_ids]
+        now = time.time()
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            self._conn.executemany(
+                "UPDATE jobs SET state = 'ready', requeue = 0, attempts = 0, lease_id = NULL, last_error = NULL,"
+                ' visible_at = ?, enqueued_at = ? '
+                'WHERE lease_id = ? AND page_id = ? AND requeue = 1',
+                [(now, now, lease, page_id) for lease, page_id in rows],
+            )
+            self._conn.executemany('DELETE FROM jobs WHERE lease_id = ? AND page_id = ? AND requeue = 0', rows)
+            self._conn.execute('COMMIT')
+        except Exception:
+            self._conn.execute('ROLLBACK')
+            raise
+
+    def nack(self, lease_id: str, page_ids: Iterable[Any], error: str = None, delay: float = 0.0) -> int:
+        """
+        처리 실패. 시도 횟수가 남았으면 delay초 뒤 다시 보이게 하고, 아니면 dead-letter
+
+        Returns:
+            이번에 dead로 옮긴 작업 수
+        """
+        page_ids = [str(page_id) for page_id in page_ids]
+        now = time.time()
+        self._conn.execute('BEGIN IMMEDIATE')
+        try:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "UPDATE jobs SET state = 'dead', lease_id = NULL, last_error = ? "
+                'WHERE lease_id = ? AND page_id = ? AND attempts >= ?',
+                [(error, lease_id, page_id, self.max_attempts) for page_id in page_ids],
+            )
+            dead = self._conn.total_changes - before
+            self._conn.executemany(
+                "UPDATE jobs SET state = 'ready', lease_id = NULL, requeue = 0, last_error = ?, visible_at = ? "
+                'WHERE lease_id = ? AND page_id = ?',
+                [(error, now + delay, lease_id, page_id) for page_id in page_ids],
+            )
+            self._conn.execute('COMMIT')
+        except Exception:
+            self._conn.execute('ROLLBACK')
+            raise
+        return dead
+
+    def release(self, lease_id: str, page_ids: Iterable[Any]):
+        """처리하지 않은 작업을 바로 다시 보이게 되돌림 (이번 lease는 시도 횟수에 넣지 않음)"""
+        now = time.time()
+        self._conn.executemany(
+            "UPDATE jobs SET state = 'ready', lease_id = NULL, requeue = 0, visible_at = ?,"
+            ' attempts = MAX(attempts - 1, 0) WHERE lease_id = ? AND page_id = ?',
+            [(now, lease_id, str(page_id)) for page_id in page_ids],
+        )
+
+    def attempts(self, page_id: Any) -> int:
+        row = self._conn.execute('SELECT attempts FROM jobs WHERE page_id = ?', (str(page_id),)).fetchone()
+        return row[0] if row else 0
+
+    def dead_letters(self, limit: int = 100) -> List[Dict[str, Any]]:
+        rows = self._conn.execute(
+            "SELECT page_id, attempts, last_error, enqueued_at FROM jobs WHERE state = 'dead' "
+            'ORDER BY enqueued_at LIMIT ?',
+            (limit,),
+        ).fetchall()
+        return [{'page_id': r[0], 'attempts': r[1], 'last_error': r[2], 'enqueued_at': r[3]} for r in rows]
+
+    def requeue_dead(self) -> int:
+        """dead 작업을 모두 되살림"""
+        now = time.time()
+        return self._conn.execute(
+            "UPDATE jobs SET state = 'ready', attempts = 0, last_error = NULL, visible_at = ? WHERE state = 'dead'",
+            (now,),
+        ).rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        """상태별 작업 수와 가장 오래 기다린 대기 작업의 대기 시간(초)"""
+        counts = dict(self._conn.execute('SELECT state, COUNT(*) FROM jobs GROUP BY state').fetchall())
+        oldest = self._conn.execute("SELECT MIN(enqueued_at) FROM jobs WHERE state = 'ready'").fetchone()[0]
+        return {
+            READY: counts.get(READY, 0),
+            LEASED: counts.get(LEASED, 0),
+            DEAD: counts.get(DEAD, 0),
+            'oldest_ready_age': time.time() - oldest if oldest else 0.0,
+        }
+
+    def close(self):
+        self._conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='임베딩 작업 큐 관리')
+    parser.add_argument('command', choices=['stats', 'enqueue', 'dead', 'requeue-dead'])
+    parser.add_argument('page_ids', nargs='*', help='enqueue할 page_id')
+    parser.add_argument('--path', type=Path, default=DEFAULT_QUEUE_PATH, help='큐 SQLite 파일')
+    args = parser.parse_args()
+
+    queue = EmbeddingQueue(args.path)
+    try:
+        if args.command == 'stats':
+            print(json.dumps(queue.stats(), ensure_ascii=False, indent=4))
+        elif args.command == 'enqueue':
+            print(f"📥 {queue.enqueue_many(args.page_ids)}개 작업 추가")
+        elif args.command == 'dead':
+            for job in queue.dead_letters():
+                print(f"💀 {job['page_id']} ({job['attempts']}회): {job['last_error']}")
+        else:
+            print(f"🔁 {queue.requeue_dead()}개 dead 작업을 되살렸습니다.")
+    finally:
+        queue.close()
+
+
+if __name__ == "__main__":
+    main()
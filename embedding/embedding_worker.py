@@ -0,0 +1,201 @@
+# coding=utf-8
+"""
+임베딩 큐를 계속 비우는 백그라운드 워커
+
+적재 스크립트가 embedding_queue.py 큐에 넣은 page_id를 묶음으로 꺼내(lease) 현재 rag_docs 버전에서
+임베딩 대상(embedding_pending) 문서를 읽어 임베딩하고 저장한 뒤 ack한다. 큐가 비어 있으면 poll_interval마다
+다시 확인하므로 적재부터 검색 가능해지기까지 몇 초 안에 끝난다.
+
+- 묶음 임베딩이 실패하면 문서별로 다시 시도해 실패한 문서만 nack (한 문서 때문에 묶음 전체가 dead-letter되지 않도록)
+- nack된 작업은 지수 백오프 후 다시 꺼내고, max_attempts번 실패하면 dead-letter
+- 예산을 넘으면 꺼낸 작업을 되돌리고 종료. SIGINT/SIGTERM을 받으면 처리 중인 묶음을 마치고 종료
+- rag_docs가 다른 임베딩 설정(모델/차원/저장 형식)의 버전으로 전환되면 꺼낸 작업을 되돌리고 종료
+
+Usage:
+    python embedding_worker.py                 # 계속 실행
+    python embedding_worker.py --sweep         # 시작할 때 embedding_pending 문서를 모두 큐에 추가
+    python embedding_worker.py --once          # 큐가 빌 때까지만 처리
+"""
+import argparse
+import signal
+import time
+from typing import Any, Dict, List
+
+from embed_docs import (
+    BACKLOG_PROJECTION,
+    PENDING_FIELD,
+    RAG_DOCS_ALIAS,
+    db,
+    db_client,
+    embed_with_cache,
+    embedding_updates,
+    valid_docs,
+    validate_settings,
+)
+from embedding_batches import MAX_TOKENS_PER_REQUEST, pack_batches
+from embedding_cache import EmbeddingCache
+from embedding_queue import DEFAULT_MAX_ATTEMPTS, DEFAULT_VISIBILITY_TIMEOUT, EmbeddingQueue
+from vector_storage import EmbeddingSettingsError
+# 저장소 루트 모듈 (embed_docs가 sys.path에 추가한 뒤 import)
+from db.mongodb.collection_alias import AliasResolver
+from monitoring.usage_ledger import BudgetExceededError, UsageLedger, add_ledger_arguments, ledger_from_args
+
+DEFAULT_LEASE_SIZE = 256
+DEFAULT_POLL_INTERVAL = 1.0
+# nack 후 다시 보이기까지의 지연: RETRY_BASE_DELAY * 2^(시도 횟수 - 1), 최대 RETRY_MAX_DELAY
+RETRY_BASE_DELAY = 5.0
+RETRY_MAX_DELAY = 600.0
+
+
+class EmbeddingWorker:
+    """
+    큐 → rag_docs 임베딩 워커
+
+    Args:
+        queue: 작업 큐
+        lease_size: 한 번에 꺼낼 page_id 수 (요청 묶음은 embedding_batches 한도로 다시 나눔)
+        cache: 임베딩 캐시 (None이면 사용 안 함)
+        ledger: usage ledger (예산 상한 포함)
+    """
+
+    def __init__(self, queue: EmbeddingQueue, lease_size: int = DEFAULT_LEASE_SIZE, cache: EmbeddingCache = None,
+                 ledger: UsageLedger = None, max_tokens: int = MAX_TOKENS_PER_REQUEST):
+        self.queue = queue
+        self.lease_size = lease_size
+        self.cache = cache
+        self.ledger = ledger
+        self.max_tokens = max_tokens
+        # reindex.py로 전환되면 다음 조회부터 새 버전 컬렉션에 씀 (임베딩 설정이 다르면 EmbeddingSettingsError)
+        self.rag_docs = AliasResolver(db, RAG_DOCS_ALIAS, validate=validate_settings)
+        self.stopping = False
+        self.counts = {'embedded': 0, 'skipped': 0, 'failed': 0, 'dead': 0, 'requests': 0, 'truncated': 0}
+
+    def stop(self, *_):
+        if not self.stopping:
+            print("\n⏹️  종료 요청 - 처리 중인 묶음을 마치고 종료합니다.")
+        self.stopping = True
+
+    def _embed_and_write(self, target, docs: List[Dict[str, Any]]):
+        embeddings, requested = embed_with_cache([doc['vector_content'] for doc in docs], self.cache, self.ledger)
+        self.counts['requests'] += requested
+        target.bulk_write(embedding_updates(docs, embeddings), ordered=False)
+
+    def process(self, lease_id: str, page_ids: List[str]):
+        """꺼낸 작업 처리 후 ack/nack (예산 초과는 호출한 쪽으로 전달)"""
+        target = self.rag_docs.collection()
+        docs = list(target.find({'page_id': {'$in': page_ids}, PENDING_FIELD: True}, BACKLOG_PROJECTION))
+        counts = {'error': 0}
+        docs = list(valid_docs(docs, counts))
+        failed_pages = {}
+        for batch in pack_batches(docs, self.lease_size, self.max_tokens, counts=self.counts):
+            try:
+                self._embed_and_write(target, batch)
+                continue
+            except BudgetExceededError:
+                raise
+            except Exception as e:
+                if len(batch) == 1:
+                    failed_pages[str(batch[0].get('page_id'))] = f"{type(e).__name__}: {e}"
+                    continue
+            # 묶음 실패 시 문서별로 다시 시도해 원인이 된 문서만 실패 처리
+            for doc in batch:
+                try:
+                    self._embed_and_write(target, [doc])
+                except BudgetExceededError:
+                    raise
+                except Exception as e:
+                    failed_pages[str(doc.get('page_id'))] = f"{type(e).__name__}: {e}"
+
+        done = [page_id for page_id in page_ids if page_id not in failed_pages]
+        self.queue.ack(lease_id, done)
+        self.counts['embedded'] += sum(1 for doc in docs if str(doc.get('page_id')) not in failed_pages)
+        # 큐에는 있지만 임베딩할 문서가 없는 페이지 (이미 임베딩됨, vector_content 없음, 삭제됨)
+        self.counts['skipped'] += len(set(page_ids) - {str(doc.get('page_id')) for doc in docs}) + counts['error']
+        for page_id, error in failed_pages.items():
+            attempts = self.queue.attempts(page_id)
+            delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** max(0, attempts - 1))
+            dead = self.queue.nack(lease_id, [page_id], error=error, delay=delay)
+            self.counts['failed'] += 1
+            self.counts['dead'] += dead
+            print(f"{'💀' if dead else '🔁'} {page_id}: {error}" + ('' if dead else f" - {delay:.0f}초 후 재시도"))
+
+    def run(self, once: bool = False, poll_interval: float = DEFAULT_POLL_INTERVAL):
+        """큐를 계속 비움. once이면 보이는 작업이 없을 때 종료"""
+        while not self.stopping:
+            lease_id, page_ids = self.queue.lease(self.lease_size)
+            if not page_ids:
+                if once:
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            started = time.perf_counter()
+            try:
+                self.process(lease_id, page_ids)
+            except BudgetExceededError as e:
+                # 시도 횟수를 쓰지 않도록 바로 다시 보이게 되돌리고 종료
+                self.queue.release(lease_id, page_ids)
+                print(f"⚠️  {e} - 꺼낸 작업을 큐에 되돌리고 종료합니다.")
+                break
+            except EmbeddingSettingsError as e:
+                # 설정을 맞춰 다시 시작하기 전에는 계속 실패하므로 시도 횟수를 쓰지 않고 종료
+                self.queue.release(lease_id, page_ids)
+                print(f"❌ {e}")
+                break
+            except Exception as e:
+                # Mongo 연결 오류 등 묶음 전체 실패
+                self.queue.nack(lease_id, page_ids, error=f"{type(e).__name__}: {e}", delay=RETRY_BASE_DELAY)
+                print(f"❌ {len(page_ids)}개 작업 실패: {e}")
+                time.sleep(poll_interval)
+                continue
+            stats = self.queue.stats()
+            print(f"✅ {len(page_ids)}개 작업 처리 ({time.perf_counter() - started:.1f}s) - "
+                  f"대기 {stats['ready']}개, dead {stats['dead']}개")
+
+
+def sweep_backlog(queue: EmbeddingQueue) -> int:
+    """현재 rag_docs 버전의 embedding_pending 문서를 모두 큐에 추가 (큐 도입 전 적재분, 유실 대비)"""
+    target = AliasResolver(db, RAG_DOCS_ALIAS).collection()
+    return queue.enqueue_many(target.distinct('page_id', {PENDING_FIELD: True}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='임베딩 큐 워커')
+    parser.add_argument('--lease-size', type=int, default=DEFAULT_LEASE_SIZE, help='한 번에 꺼낼 작업 수')
+    parser.add_argument('--visibility-timeout', type=float, default=DEFAULT_VISIBILITY_TIMEOUT,
+                        help='꺼낸 작업이 다른 워커에게 다시 보이기까지의 시간 (초)')
+    parser.add_argument('--max-attempts', type=int, default=DEFAULT_MAX_ATTEMPTS, help='dead-letter 전 최대 시도 횟수')
+    parser.add_argument('--poll-interval', type=float, default=DEFAULT_POLL_INTERVAL, help='큐가 비었을 때 확인 주기 (초)')
+    parser.add_argument('--sweep', action='store_true', help='시작할 때 embedding_pending 문서를 모두 큐에 추가')
+    parser.add_argument('--once', action='store_true', help='큐가 빌 때까지만 처리하고 종료')
+    parser.add_argument('--no-cache', action='store_true', help='임베딩 캐시를 사용하지 않음')
+    add_ledger_arguments(parser)
+    args = parser.parse_args()
+
+    queue = EmbeddingQueue(visibility_timeout=args.visibility_timeout, max_attempts=args.max_attempts)
+    cache = None if args.no_cache else EmbeddingCache()
+    ledger = ledger_from_args(args)
+    worker = EmbeddingWorker(queue, args.lease_size, cache, ledger)
+    signal.signal(signal.SIGINT, worker.stop)
+    signal.signal(signal.SIGTERM, worker.stop)
+    try:
+        db_client.admin.command('ping')
+        print("✅ MongoDB 연결 성공")
+        if args.sweep:
+            print(f"📥 embedding_pending 문서 {sweep_backlog(queue)}개 페이지를 큐에 추가")
+        print(f"🚀 워커 시작 (큐: {queue.path}, lease {args.lease_size}개, timeout {args.visibility_timeout:.0f}s)")
+        worker.run(once=args.once, poll_interval=args.poll_interval)
+    finally:
+        counts = worker.counts
+        print(f"\n📊 임베딩 {counts['embedded']}개, 건너뜀 {counts['skipped']}개, 실패 {counts['failed']}개 "
+              f"(dead {counts['dead']}개), API 요청 {counts['requests']}회, 잘라서 임베딩 {counts['truncated']}개")
+        print(f"💰 비용: ${ledger.run_cost:.4f} ({ledger.run_tokens} tokens, run {ledger.run_id})")
+        if cache is not None:
+            cache.print_stats()
+            cache.close()
+        queue.close()
+        db_client.close()
+
+
+if __name__ == "__main__":
+    main()
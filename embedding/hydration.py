@@ -0,0 +1,126 @@
+# coding=utf-8
+"""
+검색 결과 hydration - 1단계 검색은 page_id/점수만 받고, 실제로 보여주거나 LLM에 넘길 문서의 필요한 필드만 나중에 읽음
+
+rag_docs에서 가장 큰 필드(llm_content, tables, vector_content)를 검색 결과마다 받지 않도록
+요청한 필드 경로(예: metadata.title, llm_content.summary)만 projection해서 가져오고,
+가져온 문서는 작은 LRU에 둬서 같은 페이지가 다시 나오면 DB를 읽지 않는다.
+더 많은 필드를 요청하면 캐시에 없는 페이지/필드만 다시 읽어 합친다.
+
+캐시는 version(예: rag_docs 별칭이 가리키는 컬렉션 이름, 로컬 스냅샷 생성 시각)이 바뀌면 비운다.
+page_versions가 있으면 문서마다 가져올 때의 페이지 버전(_id, embedded_at)을 같이 두고, hydrate할 때마다
+현재 버전과 비교해 재적재/재임베딩된 페이지는 다시 읽는다 (버전 조회는 작은 필드만 읽음).
+"""
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+DEFAULT_HYDRATION_CACHE_SIZE = 256
+
+
+def get_path(doc: Dict[str, Any], path: str) -> Tuple[bool, Any]:
+    """점(.) 경로의 값 (있는지 여부, 값)"""
+    for key in path.split('.'):
+        if not isinstance(doc, dict) or key not in doc:
+            return False, None
+        doc = doc[key]
+    return True, doc
+
+
+def set_path(doc: Dict[str, Any], path: str, value: Any):
+    *parents, last = path.split('.')
+    for key in parents:
+        doc = doc.setdefault(key, {})
+    doc[last] = value
+
+
+def project_fields(doc: Dict[str, Any], fields: Iterable[str]) -> Dict[str, Any]:
+    """문서에서 요청한 필드 경로만 남긴 사본 (MongoDB projection과 같은 중첩 모양)"""
+    projected = {}
+    for path in fields:
+        found, value = get_path(doc, path)
+        if found:
+            set_path(projected, path, value)
+    return projected
+
+
+def merge_fields(target: Dict[str, Any], source: Dict[str, Any]):
+    """source를 target에 중첩 dict 단위로 합침 (llm_content.summary만 있던 문서에 llm_content 전체를 합치는 경우)"""
+    for key, value in source.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            merge_fields(target[key], value)
+        else:
+            target[key] = value
+
+
+def covers(cached_fields: Set[str], path: str) -> bool:
+    """cached_fields로 path를 채울 수 있는지 (llm_content를 읽었으면 llm_content.summary도 있음)"""
+    return any(path == field or path.startswith(field + '.') for field in cached_fields)
+
+
+class DocumentHydrator:
+    """
+    page_id → 요청 필드 문서 LRU
+
+    Args:
+        fetch: (page_id 목록, 필드 경로 목록) → {page_id: 문서}
+        version: 현재 데이터 버전을 반환하는 함수 (바뀌면 캐시를 비움)
+        capacity: 캐시할 문서 수
+        page_versions: page_id 목록 → {page_id: 페이지 버전} (바뀐 페이지만 다시 읽음, 결과에 없는 페이지는 버전 None)
+    """
+
+    def __init__(self, fetch: Callable[[List[Any], List[str]], Dict[Any, Dict[str, Any]]],
+                 version: Callable[[], Any] = None, capacity: int = DEFAULT_HYDRATION_CACHE_SIZE,
+                 page_versions: Callable[[List[Any]], Dict[Any, Any]] = None):
+        self.fetch = fetch
+        self.version = version
+        self.capacity = capacity
+        self.page_versions = page_versions
+        # page_id → (읽은 필드 경로, 문서, 읽을 때의 페이지 버전)
+        self._docs: 'OrderedDict[Any, Tuple[Set[str], Dict[str, Any], Any]]' = OrderedDict()
+        self._version = None
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self, page_ids: Optional[Iterable[Any]] = None):
+        """page_ids의 캐시를 지움 (None이면 전체)"""
+        if page_ids is None:
+            self._docs.clear()
+            return
+        for page_id in page_ids:
+            self._docs.pop(page_id, None)
+
+    def hydrate(self, page_ids: Iterable[Any], fields: List[str]) -> Dict[Any, Dict[str, Any]]:
+        """page_id별 요청 필드 문서 (DB에 없는 page_id는 빠짐)"""
+        if self.version is not None:
+            version = self.version()
+            if version != self._version:
+                self._docs.clear()
+                self._version = version
+
+        page_ids = list(dict.fromkeys(page_ids))
+        current = self.page_versions(page_ids) if self.page_versions is not None and page_ids else {}
+        missing = []
+        for page_id in page_ids:
+            cached = self._docs.get(page_id)
+            if cached is not None and cached[2] != current.get(page_id):
+                # 읽은 뒤 재적재/재임베딩된 페이지: 합치지 않고 새로 읽음
+                del self._docs[page_id]
+                cached = None
+            if cached is not None and all(covers(cached[0], path) for path in fields):
+                self._docs.move_to_end(page_id)
+                self.hits += 1
+            else:
+                missing.append(page_id)
+        self.misses += len(missing)
+
+        if missing:
+            for page_id, doc in self.fetch(missing, fields).items():
+                cached_fields, cached_doc, _ = self._docs.pop(page_id, (set(), {}, None))
+                merge_fields(cached_doc, doc)
+                self._docs[page_id] = (cached_fields | set(fields), cached_doc, current.get(page_id))
+
+        docs = {page_id: project_fields(self._docs[page_id][1], fields)
+                for page_id in page_ids if page_id in self._docs}
+        while len(self._docs) > self.capacity:
+            self._docs.popitem(last=False)
+        return docs
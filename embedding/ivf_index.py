@@ -0,0 +1,294 @@
+# coding=utf-8
+"""
+로컬 백엔드용 근사 최근접 이웃 인덱스 (IVF + 선택적 PQ, NumPy만 사용)
+
+섹션/표 행 단위로 색인하면 벡터 수가 수백만 개가 되어 local_index.py의 전수 행렬-벡터 곱이 느려진다.
+
+- IVF: 샘플로 spherical k-means를 학습해 nlist개 중심을 만들고 모든 벡터를 가장 가까운 중심의 리스트에 넣는다.
+  질문은 중심과의 유사도 상위 nprobe개 리스트의 벡터만 후보로 본다
+- PQ (선택): 중심과의 잔차를 m개 부분 공간으로 나눠 부분 공간마다 256개 코드북으로 양자화 (벡터당 m바이트).
+  inner product는 q·x ≈ q·c + Σ q_j·codebook_j[code_j] 이므로 질문마다 (m, 256) 표 하나로 후보 점수를 근사
+- 재채점: 근사 점수 상위 rerank개(PQ 없으면 후보 전체)를 스냅샷의 원래 벡터로 정확히 다시 계산해 top-k
+
+스냅샷 디렉토리에 ivf.npz로 저장하며, local_index.py build로 스냅샷을 다시 만들면 함께 지워지므로 train을 다시 해야 한다.
+LocalVectorIndex는 ivf.npz가 있으면 이 인덱스로 검색한다.
+
+Usage:
+    python ivf_index.py train --nlist 1024 --pq-m 48         # 현재 스냅샷으로 학습
+    python ivf_index.py eval --queries data/eval_queries.txt --nprobe 1 4 16 64
+"""
+import argparse
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from embedding_providers import get_provider
+from vector_storage import DEFAULT_QUERY_FILE, normalize
+
+IVF_FILE = 'ivf.npz'
+DEFAULT_NPROBE = 16
+DEFAULT_RERANK = 100
+DEFAULT_TRAIN_SAMPLE = 50000
+DEFAULT_KMEANS_ITERATIONS = 15
+PQ_CENTROIDS = 256
+# 전체 벡터를 리스트에 배정할 때 한 번에 곱하는 행 수 (메모리 상한)
+ASSIGN_CHUNK = 65536
+
+
+def default_nlist(count: int) -> int:
+    """리스트 수 기본값 (약 4·√n)"""
+    return int(max(1, min(count, round(4 * np.sqrt(count)))))
+
+
+def nearest_centroids(vectors: np.ndarray, centroids: np.ndarray, spherical: bool = True) -> np.ndarray:
+    """행별로 가장 가까운 중심 번호 (spherical이면 inner product 최대, 아니면 L2 거리 최소)"""
+    scores = vectors @ centroids.T
+    if not spherical:
+        # argmin ||x - c||² = argmax (x·c - ||c||²/2)
+        scores -= 0.5 * np.einsum('ij,ij->i', centroids, centroids)
+    return scores.argmax(axis=1)
+
+
+def kmeans(vectors: np.ndarray, k: int, iterations: int = DEFAULT_KMEANS_ITERATIONS, spherical: bool = True,
+           seed: int = 0) -> np.ndarray:
+    """
+    Lloyd k-means (spherical이면 중심을 매번 정규화)
+
+    빈 클러스터는 가장 큰 클러스터의 임의 점으로 다시 시작한다.
+    """
+    rng = np.random.default_rng(seed)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    k = min(k, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+    for _ in range(iterations):
+        labels = nearest_centroids(vectors, centroids, spherical)
+        counts = np.bincount(labels, minlength=k)
+        empty = counts == 0
+        # 클러스터별 합: 라벨 순으로 정렬한 뒤 구간 합
+        order = np.argsort(labels, kind='stable')
+        bounds = (np.cumsum(counts) - counts)[~empty]
+        centroids[~empty] = np.add.reduceat(vectors[order], bounds, axis=0) / counts[~empty, None]
+        if empty.any():
+            largest = np.flatnonzero(labels == counts.argmax())
+            centroids[empty] = vectors[rng.choice(largest, int(empty.sum()))]
+        if spherical:
+            centroids = normalize(centroids)
+    return centroids.astype(np.float32)
+
+
+class IVFIndex:
+    """
+    IVF(+PQ) 인덱스
+
+    Args:
+        vectors: 스냅샷의 정규화된 벡터 (memory-map), 재채점에 사용
+        centroids: (nlist, 차원) 정규화된 중심
+        list_offsets: (nlist + 1,) 리스트 i의 항목은 list_rows[list_offsets[i]:list_offsets[i + 1]]
+        list_rows: 리스트 순서로 정렬한 벡터 행 번호
+        codebooks: PQ 코드북 (m, 256, 차원 / m) 또는 None
+        codes: 리스트 순서의 PQ 코드 (벡터 수, m) uint8 또는 None
+    """
+
+    def __init__(self, vectors: np.ndarray, centroids: np.ndarray, list_offsets: np.ndarray, list_rows: np.ndarray,
+                 codebooks: Optional[np.ndarray] = None, codes: Optional[np.ndarray] = None,
+                 nprobe: int = DEFAULT_NPROBE, rerank: int = DEFAULT_RERANK, info: Dict[str, Any] = None):
+        self.vectors = vectors
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+        self.codebooks = codebooks
+        self.codes = codes
+        self.nprobe = nprobe
+        self.rerank = rerank
+        self.info = info or {}
+
+    @property
+    def nlist(self) -> int:
+        return len(self.centroids)
+
+    @property
+    def pq_m(self) -> int:
+        return 0 if self.codebooks is None else self.codebooks.shape[0]
+
+    @classmethod
+    def train(cls, vectors: np.ndarray, nlist: int = None, pq_m: int = 0, sample_size: int = DEFAULT_TRAIN_SAMPLE,
+              iterations: int = DEFAULT_KMEANS_ITERATIONS, nprobe: int = DEFAULT_NPROBE, rerank: int = DEFAULT_RERANK,
+              seed: int = 0) -> 'IVFIndex':
+        """
+        샘플로 중심(과 PQ 코드북)을 학습하고 전체 벡터를 리스트에 배정
+
+        Args:
+            vectors: 정규화된 (벡터 수, 차원) 행렬 (memory-map 가능, 배정은 ASSIGN_CHUNK 행씩)
+            nlist: 리스트 수 (None이면 약 4·√n)
+            pq_m: PQ 부분 공간 수 (0이면 PQ 없이 IVF-Flat, 차원이 m으로 나누어떨어져야 함)
+        """
+        count, dims = vectors.shape
+        nlist = nlist or default_nlist(count)
+        if pq_m and dims % pq_m:
+            raise ValueError(f"차원 {dims}이 pq_m {pq_m}으로 나누어떨어지지 않습니다")
+        rng = np.random.default_rng(seed)
+        sample_rows = np.sort(rng.choice(count, min(count, max(sample_size, nlist)), replace=False))
+        sample = np.asarray(vectors[sample_rows], dtype=np.float32)
+        centroids = kmeans(sample, nlist, iterations, spherical=True, seed=seed)
+
+        codebooks = None
+        if pq_m:
+            residuals = (sample - centroids[nearest_centroids(sample, centroids)]).reshape(len(sample), pq_m, -1)
+            codebooks = np.stack([
+                kmeans(residuals[:, j], PQ_CENTROIDS, iterations, spherical=False, seed=seed + j)
+                for j in range(pq_m)
+            ])
+            if codebooks.shape[1] < PQ_CENTROIDS:
+                raise ValueError(f"PQ 학습 샘플이 너무 적습니다 ({len(sample)}개 < {PQ_CENTROIDS})")
+
+        labels = np.empty(count, dtype=np.int32)
+        codes = np.empty((count, pq_m), dtype=np.uint8) if pq_m else None
+        for start in range(0, count, ASSIGN_CHUNK):
+            chunk = np.asarray(vectors[start:start + ASSIGN_CHUNK], dtype=np.float32)
+            labels[start:start + len(chunk)] = nearest_centroids(chunk, centroids)
+            if pq_m:
+                residuals = (chunk - centroids[labels[start:start + len(chunk)]]).reshape(len(chunk), pq_m, -1)
+                for j in range(pq_m):
+                    codes[start:start + len(chunk), j] = nearest_centroids(residuals[:, j], codebooks[j], spherical=False)
+
+        list_rows = np.argsort(labels, kind='stable')
+        list_offsets = np.concatenate([[0], np.cumsum(np.bincount(labels, minlength=len(centroids)))])
+        return cls(vectors, centroids, list_offsets, list_rows, codebooks,
+                   None if codes is None else codes[list_rows], nprobe, rerank,
+                   {'count': count, 'sample_size': len(sample)})
+
+    def search_rows(self, query_vector: Any, k: int = 3, nprobe: int = None,
+                    rerank: int = None) -> Tuple[np.ndarray, np.ndarray]:
+        """상위 k개 행 번호와 정확히 다시 계산한 cosine 유사도 (LocalVectorIndex.search_rows와 같은 반환)"""
+        query = normalize(np.asarray(query_vector, dtype=np.float32))
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        rerank = rerank or self.rerank
+
+        coarse = self.centroids @ query
+        probe = np.argpartition(-coarse, nprobe - 1)[:nprobe]
+        starts, ends = self.list_offsets[probe], self.list_offsets[probe + 1]
+        sizes = ends - starts
+        if sizes.sum() == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        # 고른 리스트들의 위치를 한 번에 (리스트별 arange를 이어 붙인 것과 같음)
+        positions = np.repeat(starts - np.cumsum(sizes) + sizes, sizes) + np.arange(sizes.sum())
+
+        if self.codes is not None and len(positions) > rerank:
+            lut = np.einsum('jd,jcd->jc', query.reshape(self.pq_m, -1), self.codebooks)
+            approx = np.repeat(coarse[probe], sizes)
+            approx += lut[np.arange(self.pq_m), self.codes[positions]].sum(axis=1)
+            positions = positions[np.argpartition(-approx, rerank - 1)[:rerank]]
+
+        # 재채점: 원래 벡터에서 후보 행만 읽음 (행 순서로 읽어야 memory-map 접근이 순차적)
+        rows = np.sort(self.list_rows[positions])
+        scores = np.asarray(self.vectors[rows]) @ query
+        k = min(k, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return rows[top], scores[top]
+
+    def save(self, directory: Path):
+        arrays = {
+            'centroids': self.centroids,
+            'list_offsets': self.list_offsets,
+            'list_rows': self.list_rows,
+            'settings': np.asarray([self.nprobe, self.rerank, self.info.get('count', len(self.list_rows))]),
+        }
+        if self.codes is not None:
+            arrays.update(codebooks=self.codebooks, codes=self.codes)
+        np.savez(Path(directory) / IVF_FILE, **arrays)
+
+    @classmethod
+    def load(cls, directory: Path, vectors: np.ndarray) -> Optional['IVFIndex']:
+        """ivf.npz를 읽음. 없거나 스냅샷 벡터 수와 다르면 (스냅샷을 다시 만든 경우) None"""
+        path = Path(directory) / IVF_FILE
+        if not path.exists():
+            return None
+        with np.load(path) as data:
+            nprobe, rerank, count = (int(value) for value in data['settings'])
+            if count != len(vectors):
+                print(f"⚠️  {path}가 현재 스냅샷({len(vectors)}개)과 다릅니다({count}개) - 전수 검색을 사용합니다.")
+                return None
+            return cls(vectors, data['centroids'], data['list_offsets'], data['list_rows'],
+                       data['codebooks'] if 'codebooks' in data else None,
+                       data['codes'] if 'codes' in data else None,
+                       nprobe, rerank, {'count': count})
+
+
+def exact_rows(vectors: np.ndarray, query_vectors: np.ndarray, k: int) -> List[np.ndarray]:
+    """기준이 되는 전수 검색 결과 (질문별 상위 k개 행)"""
+    rows = []
+    for query in normalize(np.asarray(query_vectors, dtype=np.float32)):
+        scores = vectors @ query
+        top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+        rows.append(top[np.argsort(-scores[top])])
+    return rows
+
+
+def evaluate(index: IVFIndex, query_vectors: np.ndarray, k: int = 3,
+             nprobe_list: List[int] = (1, 4, 16, 64)) -> List[Dict[str, Any]]:
+    """nprobe별 recall@k (전수 검색 대비)와 질문당 지연 시간"""
+    started = time.perf_counter()
+    truth = exact_rows(index.vectors, query_vectors, k)
+    exact_ms = (time.perf_counter() - started) / len(query_vectors) * 1000
+    results = [{'nprobe': 'exact', f'recall@{k}': 1.0, 'ms_per_query': exact_ms}]
+    for nprobe in nprobe_list:
+        found, times = [], []
+        for query in query_vectors:
+            started = time.perf_counter()
+            rows, _ = index.search_rows(query, k, nprobe)
+            times.append(time.perf_counter() - started)
+            found.append(rows)
+        recall = np.mean([len(set(a) & set(b)) / max(1, len(b)) for a, b in zip(found, truth)])
+        results.append({'nprobe': nprobe, f'recall@{k}': float(recall), 'ms_per_query': float(np.mean(times) * 1000)})
+    return results
+
+
+def main():
+    # local_index가 이 모듈을 import하므로 CLI에서만 불러옴
+    from local_index import DEFAULT_INDEX_DIR, LocalVectorIndex
+
+    parser = argparse.ArgumentParser(description='로컬 백엔드 IVF(+PQ) 인덱스')
+    parser.add_argument('command', choices=['train', 'eval'])
+    parser.add_argument('--path', type=Path, default=DEFAULT_INDEX_DIR, help='local_index.py 스냅샷 디렉토리')
+    parser.add_argument('--nlist', type=int, default=None, help='리스트 수 (기본 약 4·√n)')
+    parser.add_argument('--pq-m', type=int, default=0, help='PQ 부분 공간 수 (0이면 PQ 없음)')
+    parser.add_argument('--sample', type=int, default=DEFAULT_TRAIN_SAMPLE, help='k-means 학습 샘플 수')
+    parser.add_argument('--iterations', type=int, default=DEFAULT_KMEANS_ITERATIONS, help='k-means 반복 횟수')
+    parser.add_argument('--rerank', type=int, default=DEFAULT_RERANK, help='PQ 근사 점수로 남겨 재채점할 후보 수')
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[DEFAULT_NPROBE],
+                        help='train: 기본 nprobe / eval: 비교할 nprobe 목록')
+    parser.add_argument('--queries', type=Path, default=DEFAULT_QUERY_FILE, help='eval용 질문 파일')
+    parser.add_argument('--k', type=int, default=3, help='eval의 recall@k')
+    args = parser.parse_args()
+
+    snapshot = LocalVectorIndex(args.path)
+    if args.command == 'train':
+        started = time.perf_counter()
+        index = IVFIndex.train(snapshot.vectors, args.nlist, args.pq_m, args.sample, args.iterations,
+                               args.nprobe[0], args.rerank)
+        index.save(args.path)
+        print(f"✅ IVF{index.nlist}{f',PQ{index.pq_m}' if index.pq_m else ''} 학습 완료: {len(snapshot)}개 벡터, "
+              f"샘플 {index.info['sample_size']}개 ({time.perf_counter() - started:.1f}s) → {args.path / IVF_FILE}")
+        return
+
+    if snapshot.ivf is None:
+        parser.error(f"{args.path / IVF_FILE}가 없습니다. train을 먼저 실행하세요.")
+    provider = get_provider(dimensions=snapshot.dimensions)
+    snapshot.check_compatible(provider.model, provider.num_dimensions)
+    with open(args.queries, 'r', encoding='utf-8') as f:
+        queries = [line.strip() for line in f if line.strip()]
+    query_vectors = np.asarray(provider.embed(queries).vectors, dtype=np.float32)
+    rows = evaluate(snapshot.ivf, query_vectors, args.k, args.nprobe)
+    recall_key = f'recall@{args.k}'
+    print(f"\n📊 IVF{snapshot.ivf.nlist}{f',PQ{snapshot.ivf.pq_m}' if snapshot.ivf.pq_m else ''} "
+          f"(벡터 {len(snapshot)}개, 질문 {len(queries)}개, rerank {snapshot.ivf.rerank})")
+    print(f"{'nprobe':>8} {recall_key:>10} {'ms/query':>10}")
+    for row in rows:
+        print(f"{row['nprobe']:>8} {row[recall_key]:>10.3f} {row['ms_per_query']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+# coding=utf-8
+"""
+BM25 역색인 (한글 문자 n-gram) + 벡터 검색과의 reciprocal rank fusion
+
+프로젝트 코드, 고객사 이름, 계약 용어처럼 글자가 정확히 일치해야 하는 질문은 $vectorSearch만으로 자주 놓친다.
+형태소 분석기 없이 색인하기 위해 한글 연속 구간은 문자 bigram으로 나누고(조사/어미가 붙어도 어간 bigram이 겹침),
+영문/숫자는 소문자 단어 그대로, ABC-2024-01 같은 코드는 전체와 부분을 모두 색인한다.
+
+- 필드: metadata.title, toc, vector_content, tables (FIELD_WEIGHTS 가중치를 곱한 tf)
+- 저장: 단어 순 CSR 배열 (term_offsets, doc_ids, tfs) 하나의 .npz - 질문 단어의 posting 구간만 읽어 점수 계산
+- fusion: 벡터 순위와 BM25 순위를 RRF(1 / (k + 순위))로 합침 - 점수 척도가 달라도 정규화가 필요 없음
+
+스냅샷이므로 적재 후에는 build를 다시 실행한다. run_vector_search.py는 HYBRID_SEARCH=1이면 이 인덱스와 fusion한다.
+
+Usage:
+    python lexical_index.py build
+    python lexical_index.py search "PRJ-2024-017 계약 해지 조항"
+"""
+import argparse
+import json
+import re
+import time
+import unicodedata
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+import numpy as np
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_LEXICAL_INDEX_PATH = ROOT_DIR / 'data' / 'lexical_index.npz'
+# 필드별 tf 가중치 (제목/목차에 나온 단어를 본문보다 높게)
+FIELD_WEIGHTS = {'metadata.title': 3.0, 'toc': 1.5, 'vector_content': 1.0, 'tables': 1.0}
+BM25_K1 = 1.2
+BM25_B = 0.75
+# RRF 상수 (원 논문 기본값). 클수록 상위 순위의 영향이 완만해짐
+RRF_K = 60
+
+HANGUL = re.compile(r'[가-힣]')
+TOKEN_PATTERN = re.compile(r'[가-힣]+|[0-9a-z]+(?:[-_./][0-9a-z]+)*')
+CODE_SEPARATORS = re.compile(r'[-_./]')
+
+
+def tokenize(text: str) -> List[str]:
+    """NFKC 정규화 + 소문자 후 한글은 문자 bigram(한 글자면 그대로), 영문/숫자는 단어, 코드는 전체와 부분"""
+    tokens = []
+    for match in TOKEN_PATTERN.finditer(unicodedata.normalize('NFKC', text).lower()):
+        word = match.group()
+        if HANGUL.match(word):
+            tokens.extend([word] if len(word) == 1 else [word[i:i + 2] for i in range(len(word) - 1)])
+        else:
+            tokens.append(word)
+            if CODE_SEPARATORS.search(word):
+                tokens.extend(CODE_SEPARATORS.split(word))
+    return tokens
+
+
+def field_text(value: Any) -> str:
+    """문자열/리스트/딕셔너리 필드의 문자열을 모두 이어 붙임 (tables, toc 형식이 페이지마다 달라도)"""
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict):
+        return ' '.join(field_text(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return ' '.join(field_text(item) for item in value)
+    return str(value)
+
+
+def get_field(doc: Dict[str, Any], path: str) -> Any:
+    for key in path.split('.'):
+        if not isinstance(doc, dict):
+            return None
+        doc = doc.get(key)
+    return doc
+
+
+def document_terms(doc: Dict[str, Any]) -> Tuple[Counter, float]:
+    """필드 가중치를 곱한 단어별 tf와 문서 길이"""
+    terms = Counter()
+    for path, weight in FIELD_WEIGHTS.items():
+        for token in tokenize(field_text(get_field(doc, path))):
+            terms[token] += weight
+    return terms, sum(terms.values())
+
+
+class LexicalIndex:
+    """
+    BM25 역색인
+
+    Args:
+        terms: 단어 (정렬됨, term id = 위치)
+        term_offsets: (단어 수 + 1,) 단어 i의 posting은 doc_ids/tfs[term_offsets[i]:term_offsets[i + 1]]
+        doc_ids: posting의 문서 번호 (int32)
+        tfs: posting의 가중 tf (float32)
+        doc_lengths: 문서별 가중 길이
+        page_ids: 문서 번호 → page_id
+    """
+
+    def __init__(self, terms: np.ndarray, term_offsets: np.ndarray, doc_ids: np.ndarray, tfs: np.ndarray,
+                 doc_lengths: np.ndarray, page_ids: List[Any], info: Dict[str, Any] = None):
+        self.terms = terms
+        self.term_offsets = term_offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_lengths = doc_lengths
+        self.page_ids = page_ids
+        self.info = info or {}
+        self.vocab = {term: i for i, term in enumerate(terms.tolist())}
+        count = len(page_ids)
+        document_frequency = np.diff(term_offsets)
+        self.idf = np.log1p((count - document_frequency + 0.5) / (document_frequency + 0.5)).astype(np.float32)
+        # 문서마다 고정인 BM25 분모 항 k1 * (1 - b + b * dl / avgdl)
+        average = doc_lengths.mean() if count else 1.0
+        self.length_norms = (BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths / max(average, 1e-9))).astype(np.float32)
+
+    def __len__(self) -> int:
+        return len(self.page_ids)
+
+    @classmethod
+    def build(cls, docs: Iterable[Dict[str, Any]], info: Dict[str, Any] = None) -> 'LexicalIndex':
+        """page_id가 있는 문서들로 색인 (posting은 단어 순, 단어 안에서는 문서 순)"""
+        page_ids, doc_lengths = [], []
+        postings: Dict[str, List[Tuple[int, float]]] = {}
+        for doc in docs:
+            terms, length = document_terms(doc)
+            if not terms:
+                continue
+            doc_id = len(page_ids)
+            page_ids.append(doc.get('page_id'))
+            doc_lengths.append(length)
+            for term, tf in terms.items():
+                postings.setdefault(term, []).append((doc_id, tf))
+
+        terms = sorted(postings)
+        lengths = [len(postings[term]) for term in terms]
+        term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=term_offsets[1:])
+        doc_ids = np.fromiter((doc_id for term in terms for doc_id, _ in postings[term]),
+                              dtype=np.int32, count=int(term_offsets[-1]))
+        tfs = np.fromiter((tf for term in terms for _, tf in postings[term]),
+                          dtype=np.float32, count=int(term_offsets[-1]))
+        return cls(np.asarray(terms, dtype=str), term_offsets, doc_ids, tfs,
+                   np.asarray(doc_lengths, dtype=np.float32), page_ids, info)
+
+    def search(self, query: str, k: int = 20) -> List[Tuple[Any, float]]:
+        """BM25 상위 k개 (page_id, 점수). 질문 단어가 하나도 색인에 없으면 빈 목록"""
+        query_terms = Counter(token for token in tokenize(query) if token in self.vocab)
+        if not query_terms:
+            return []
+        term_ids = np.asarray([self.vocab[term] for term in query_terms], dtype=np.int64)
+        starts, ends = self.term_offsets[term_ids], self.term_offsets[term_ids + 1]
+        sizes = ends - starts
+        # 질문 단어들의 posting 구간을 한 번에 모음
+        positions = np.repeat(starts - np.cumsum(sizes) + sizes, sizes) + np.arange(sizes.sum())
+        docs = self.doc_ids[positions]
+        tfs = self.tfs[positions]
+        weights = np.repeat(self.idf[term_ids] * np.asarray(list(query_terms.values()), dtype=np.float32), sizes)
+        contributions = weights * tfs * (BM25_K1 + 1) / (tfs + self.length_norms[docs])
+
+        matched, inverse = np.unique(docs, return_inverse=True)
+        scores = np.bincount(inverse, weights=contributions)
+        k = min(k, len(matched))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.page_ids[matched[i]], float(scores[i])) for i in top]
+
+    def save(self, path: Path = DEFAULT_LEXICAL_INDEX_PATH):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.stem}.tmp.npz")
+        np.savez(tmp_path, terms=self.terms, term_offsets=self.term_offsets, doc_ids=self.doc_ids, tfs=self.tfs,
+                 doc_lengths=self.doc_lengths, page_ids=np.asarray([str(page_id) for page_id in self.page_ids]),
+                 info=np.asarray(json.dumps(self.info, ensure_ascii=False)))
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: Path = DEFAULT_LEXICAL_INDEX_PATH) -> 'LexicalIndex':
+        path = Path(path)
+        if not path.exists():
+            raise FileNotFoundError(f"BM25 인덱스가 없습니다: {path} (python lexical_index.py build)")
+        with np.load(path) as data:
+            return cls(data['terms'], data['term_offsets'], data['doc_ids'], data['tfs'], data['doc_lengths'],
+                       data['page_ids'].tolist(), json.loads(str(data['info'])))
+
+
+def build_from_collection(collection, path: Path = DEFAULT_LEXICAL_INDEX_PATH) -> LexicalIndex:
+    """컬렉션의 색인 필드만 읽어 색인하고 저장"""
+    projection = {'_id': 0, 'page_id': 1, **{field: 1 for field in FIELD_WEIGHTS}}
+    info = {'collection': collection.name, 'built_at': datetime.now(timezone.utc).isoformat()}
+    index = LexicalIndex.build(collection.find({}, projection, batch_size=500), info)
+    index.save(path)
+    return index
+
+
+def reciprocal_rank_fusion(rankings: List[List[Any]], k: int = RRF_K) -> List[Tuple[Any, float]]:
+    """여러 순위 목록(page_id, 높은 순)을 Σ 1 / (k + 순위)로 합쳐 높은 순으로"""
+    fused: Dict[Any, float] = {}
+    for ranking in rankings:
+        for rank, page_id in enumerate(ranking, 1):
+            fused[page_id] = fused.get(page_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+def fuse_results(vector_results: List[Dict[str, Any]], lexical_hits: List[Tuple[Any, float]],
+                 fetch_docs: Callable[[List[Any]], Dict[Any, Dict[str, Any]]] = None, limit: int = 3,
+                 k: int = RRF_K) -> List[Dict[str, Any]]:
+    """
+    벡터 검색 결과(page_id 포함, 유사도 순)와 BM25 결과를 RRF로 합쳐 상위 limit개 문서
+
+    score는 RRF 점수이고 원래 점수는 vector_score / lexical_score로 남긴다.
+    BM25에만 나온 문서는 fetch_docs(page_id 목록) → {page_id: 문서}로 가져온다.
+    fetch_docs가 없으면 {page_id}만 채워 반환한다 (page_id/점수만 받고 나중에 hydration하는 경우).
+    """
+    by_page = {doc['page_id']: doc for doc in vector_results}
+    lexical_scores = dict(lexical_hits)
+    fused = reciprocal_rank_fusion([list(by_page), [page_id for page_id, _ in lexical_hits]], k)[:limit]
+
+    missing = [page_id for page_id, _ in fused if page_id not in by_page]
+    if fetch_docs is None:
+        fetched = {page_id: {'page_id': page_id} for page_id in missing}
+    else:
+        fetched = fetch_docs(missing) if missing else {}
+    results = []
+    for page_id, score in fused:
+        doc = by_page.get(page_id) or fetched.get(page_id)
+        if doc is None:
+            # BM25 스냅샷 이후 삭제된 문서
+            continue
+        doc = dict(doc)
+        if 'score' in doc and page_id in by_page:
+            doc['vector_score'] = doc['score']
+        if page_id in lexical_scores:
+            doc['lexical_score'] = lexical_scores[page_id]
+        doc['score'] = score
+        results.append(doc)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='BM25 역색인 (한글 문자 bigram)')
+    parser.add_argument('command', choices=['build', 'search'])
+    parser.add_argument('query', nargs='?', help='search할 질문')
+    parser.add_argument('--path', type=Path, default=DEFAULT_LEXICAL_INDEX_PATH, help='인덱스 파일')
+    parser.add_argument('--k', type=int, default=10, help='검색 결과 수')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        # embed_docs가 DB 연결을 만들므로 build에서만 불러옴 (search는 오프라인)
+        from embed_docs import collection, db_client
+
+        try:
+            started = time.perf_counter()
+            index = build_from_collection(collection, args.path)
+            print(f"✅ {collection.name}: 문서 {len(index)}개, 단어 {len(index.terms)}개, posting {len(index.doc_ids)}개 "
+                  f"({time.perf_counter() - started:.1f}s, {args.path.stat().st_size / 1024 / 1024:.1f}MB) → {args.path}")
+        finally:
+            db_client.close()
+        return
+
+    if not args.query:
+        parser.error('search에는 질문이 필요합니다')
+    index = LexicalIndex.load(args.path)
+    started = time.perf_counter()
+    hits = index.search(args.query, args.k)
+    print(f"⏱️  {(time.perf_counter() - started) * 1000:.2f}ms (문서 {len(index)}개), 질문 단어: {tokenize(args.query)}")
+    for i, (page_id, score) in enumerate(hits, 1):
+        print(f"[{i}] {page_id} ({score:.3f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+# coding=utf-8
+"""
+로컬 벡터 검색 백엔드 (NumPy) - Atlas $vectorSearch 없이, 네트워크 없이 top-k 검색
+
+rag_docs의 page_id와 임베딩을 스냅샷으로 떠서 디렉토리에 저장하고, 검색할 때는 memory-map으로 연다.
+
+    vectors.npy   (문서 수, 차원) float32, 행별 L2 정규화 → 질문 벡터와의 행렬-벡터 곱이 곧 cosine
+    ids.json      행 순서대로의 page_id와 스냅샷 정보 (컬렉션, 모델, 차원, 생성 시각)
+    docs.jsonl    행 순서대로의 결과 필드 (vector_storage.RESULT_PROJECTION)
+    offsets.npy   docs.jsonl의 행별 시작 위치 - top-k 문서만 seek해서 읽음
+
+검색은 행렬-벡터 곱 한 번과 argpartition(O(n))으로 상위 k개를 고른 뒤 k개만 정렬한다.
+ivf_index.py train으로 ivf.npz를 만들어 두면 전수 검색 대신 IVF(+PQ) 근사 검색을 쓴다 (벡터가 많을 때).
+결과는 ask_rag_system의 $project와 같은 모양이고 score도 Atlas cosine vectorSearchScore와 같은 (1 + cos) / 2.
+
+스냅샷이므로 적재/재임베딩/reindex 전환 후에는 build를 다시 실행해야 한다.
+run_vector_search.py는 SEARCH_BACKEND=local이면 이 백엔드를 쓴다.
+
+Usage:
+    python local_index.py build                                  # 현재 rag_docs 버전을 스냅샷
+    python local_index.py search "질문"
+    python local_index.py bench --queries data/eval_queries.txt  # Atlas와 지연 시간/결과 비교
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from ivf_index import IVFIndex
+from vector_storage import (
+    DEFAULT_QUERY_FILE,
+    EMBEDDING_FIELD,
+    RESULT_PROJECTION,
+    cosine_search_score,
+    decode_vector,
+    encode_vector,
+    normalize,
+    vector_search_stage,
+)
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_INDEX_DIR = ROOT_DIR / 'data' / 'local_index'
+VECTORS_FILE = 'vectors.npy'
+IDS_FILE = 'ids.json'
+DOCS_FILE = 'docs.jsonl'
+OFFSETS_FILE = 'offsets.npy'
+# 여러 질문을 한 번에 채점할 때 (질문 수 × 문서 수) 점수 행렬의 최대 원소 수 (float32 기준 128MB)
+MAX_BATCH_SCORES = 1 << 25
+
+
+def build_snapshot(collection, model: str, path: Path = DEFAULT_INDEX_DIR, batch_size: int = 1000) -> Dict[str, Any]:
+    """
+    임베딩이 있는 문서를 스냅샷으로 저장하고 스냅샷 정보를 반환
+
+    임시 디렉토리에 모두 쓴 뒤 교체하므로 build 중에도 기존 스냅샷으로 검색할 수 있다.
+    벡터는 open_memmap으로 바로 파일에 써서 전체를 메모리에 올리지 않는다.
+    """
+    path = Path(path)
+    tmp_path = path.with_name(f"{path.name}.tmp-{os.getpid()}")
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    tmp_path.mkdir(parents=True)
+
+    query = {EMBEDDING_FIELD: {'$exists': True}}
+    expected = collection.count_documents(query)
+    projection = {**RESULT_PROJECTION, 'page_id': 1, EMBEDDING_FIELD: 1}
+    cursor = collection.find(query, projection, batch_size=batch_size)
+
+    vectors = None
+    page_ids, offsets = [], []
+    with open(tmp_path / DOCS_FILE, 'wb') as docs_file:
+        for doc in cursor:
+            # count 이후에 추가된 문서는 다음 build에서
+            if len(page_ids) >= expected:
+                break
+            vector = decode_vector(doc.pop(EMBEDDING_FIELD))
+            if vectors is None:
+                vectors = np.lib.format.open_memmap(
+                    tmp_path / VECTORS_FILE, mode='w+', dtype=np.float32, shape=(expected, vector.shape[0]))
+            if vector.shape[0] != vectors.shape[1]:
+                raise ValueError(f"{doc.get('page_id')}: 차원 {vector.shape[0]} != {vectors.shape[1]} (convert 필요)")
+            vectors[len(page_ids)] = normalize(vector)
+            page_ids.append(doc.pop('page_id', None))
+            offsets.append(docs_file.tell())
+            docs_file.write(json.dumps(doc, ensure_ascii=False, default=str).encode('utf-8') + b'\n')
+    cursor.close()
+
+    if vectors is None:
+        shutil.rmtree(tmp_path)
+        raise ValueError(f"{collection.name}: 임베딩이 있는 문서가 없습니다")
+    vectors.flush()
+    dims = vectors.shape[1]
+    trimmed = np.array(vectors[:len(page_ids)]) if len(page_ids) < expected else None
+    del vectors
+    if trimmed is not None:
+        # count 이후에 삭제된 문서가 있으면 남는 행을 잘라 다시 저장
+        np.save(tmp_path / VECTORS_FILE, trimmed)
+    np.save(tmp_path / OFFSETS_FILE, np.asarray(offsets, dtype=np.int64))
+
+    info = {
+        'collection': collection.name,
+        'model': model,
+        'dimensions': dims,
+        'count': len(page_ids),
+        'built_at': datetime.now(timezone.utc).isoformat(),
+    }
+    with open(tmp_path / IDS_FILE, 'w', encoding='utf-8') as f:
+        json.dump({**info, 'page_ids': page_ids}, f, ensure_ascii=False)
+
+    old_path = path.with_name(f"{path.name}.old-{os.getpid()}")
+    if path.exists():
+        os.replace(path, old_path)
+    os.replace(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    return info
+
+
+class LocalVectorIndex:
+    """
+    스냅샷 디렉토리를 memory-map으로 열어 검색
+
+    Args:
+        path: build_snapshot으로 만든 디렉토리
+    """
+
+    def __init__(self, path: Path = DEFAULT_INDEX_DIR):
+        self.path = Path(path)
+        if not (self.path / IDS_FILE).exists():
+            raise FileNotFoundError(f"로컬 인덱스가 없습니다: {self.path} (python local_index.py build)")
+        with open(self.path / IDS_FILE, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        self.page_ids: List[Any] = meta.pop('page_ids')
+        self.info: Dict[str, Any] = meta
+        self.vectors = np.load(self.path / VECTORS_FILE, mmap_mode='r')
+        self.offsets = np.load(self.path / OFFSETS_FILE)
+        self.ivf: Optional[IVFIndex] = IVFIndex.load(self.path, self.vectors)
+        self._rows_by_page_id: Optional[Dict[Any, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.page_ids)
+
+    @property
+    def model(self) -> str:
+        return self.info['model']
+
+    @property
+    def dimensions(self) -> int:
+        return self.vectors.shape[1]
+
+    def check_compatible(self, model: str, dimensions: int):
+        """질문 임베딩과 같은 모델/차원으로 만든 스냅샷인지 확인"""
+        if model != self.model or dimensions != self.dimensions:
+            raise ValueError(f"로컬 인덱스({self.model}, {self.dimensions}차원)와 질문 임베딩({model}, {dimensions}차원)이 "
+                             f"다릅니다. python local_index.py build로 다시 만드세요.")
+
+    def search_rows(self, query_vector: Any, k: int = 3, exact: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """상위 k개 행 번호와 cosine 유사도 (유사도 내림차순). IVF가 있으면 exact=True일 때만 전수 검색"""
+        if self.ivf is not None and not exact:
+            return self.ivf.search_rows(query_vector, k)
+        query = normalize(np.asarray(query_vector, dtype=np.float32))
+        scores = self.vectors @ query
+        k = min(k, len(scores))
+        if k == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        rows = np.argpartition(-scores, k - 1)[:k]
+        rows = rows[np.argsort(-scores[rows])]
+        return rows, scores[rows]
+
+    def search_rows_batch(self, query_vectors: Any, k: int = 3) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """
+        질문별 search_rows (질문 순서대로)
+
+        전수 검색은 질문 묶음 × 전체 벡터의 행렬-행렬 곱으로 한 번에 채점한다 (MAX_BATCH_SCORES 단위로 나눔).
+        IVF가 있으면 질문마다 probe할 리스트가 달라서 질문별로 검색한다.
+        """
+        query_vectors = normalize(np.asarray(query_vectors, dtype=np.float32).reshape(-1, self.dimensions))
+        if self.ivf is not None:
+            return [self.ivf.search_rows(query, k) for query in query_vectors]
+        k = min(k, len(self))
+        if k == 0:
+            return [(np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)) for _ in query_vectors]
+        results = []
+        step = max(1, MAX_BATCH_SCORES // max(1, len(self)))
+        for start in range(0, len(query_vectors), step):
+            scores = query_vectors[start:start + step] @ self.vectors.T
+            rows = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            top = np.take_along_axis(scores, rows, axis=1)
+            order = np.argsort(-top, axis=1)
+            rows, top = np.take_along_axis(rows, order, axis=1), np.take_along_axis(top, order, axis=1)
+            results.extend(zip(rows, top))
+        return results
+
+    def load_docs(self, rows: Any) -> List[Dict[str, Any]]:
+        """행 번호 순서대로 결과 필드 문서를 읽음"""
+        docs = []
+        with open(self.path / DOCS_FILE, 'rb') as f:
+            for row in rows:
+                f.seek(int(self.offsets[row]))
+                docs.append(json.loads(f.readline()))
+        return docs
+
+    def docs_by_page_id(self, page_ids: Iterable[Any]) -> Dict[Any, Dict[str, Any]]:
+        """page_id → 결과 필드 문서 (스냅샷에 없는 page_id는 빠짐)"""
+        if self._rows_by_page_id is None:
+            self._rows_by_page_id = {page_id: row for row, page_id in enumerate(self.page_ids)}
+        found = [(page_id, self._rows_by_page_id[page_id]) for page_id in page_ids if page_id in self._rows_by_page_id]
+        docs = self.load_docs([row for _, row in found])
+        for (page_id, _), doc in zip(found, docs):
+            doc['page_id'] = page_id
+        return {page_id: doc for (page_id, _), doc in zip(found, docs)}
+
+    def result_docs(self, rows: np.ndarray, scores: np.ndarray, with_page_id: bool = False) -> List[Dict[str, Any]]:
+        """행 번호/cosine → ask_rag_system 결과 모양의 문서 (with_page_id면 page_id 포함)"""
+        docs = self.load_docs(rows)
+        for row, doc, score in zip(rows, docs, scores):
+            if with_page_id:
+                doc['page_id'] = self.page_ids[row]
+            doc['score'] = float(cosine_search_score(score))
+        return docs
+
+    def search(self, query_vector: Any, limit: int = 3, with_page_id: bool = False) -> List[Dict[str, Any]]:
+        """ask_rag_system의 $vectorSearch + $project와 같은 모양의 결과"""
+        return self.result_docs(*self.search_rows(query_vector, limit), with_page_id)
+
+    def search_hits_batch(self, query_vectors: Any, limit: int = 3) -> List[List[Dict[str, Any]]]:
+        """질문별 [{page_id, score}] (문서 필드는 읽지 않음, hydration은 호출한 쪽에서)"""
+        return [[{'page_id': self.page_ids[row], 'score': float(cosine_search_score(score))}
+                 for row, score in zip(rows, scores)]
+                for rows, scores in self.search_rows_batch(query_vectors, limit)]
+
+    def search_batch(self, query_vectors: Any, limit: int = 3, with_page_id: bool = False) -> List[List[Dict[str, Any]]]:
+        """질문별 search 결과 (질문 순서대로)"""
+        return [self.result_docs(rows, scores, with_page_id)
+                for rows, scores in self.search_rows_batch(query_vectors, limit)]
+
+
+def load_index(path: Path = DEFAULT_INDEX_DIR, model: str = None, dimensions: Optional[int] = None) -> LocalVectorIndex:
+    """스냅샷을 열고 model/dimensions가 주어지면 호환 여부 확인"""
+    index = LocalVectorIndex(path)
+    if model is not None:
+        index.check_compatible(model, dimensions)
+    return index
+
+
+def percentile_ms(samples: List[float], q: float) -> float:
+    return float(np.percentile(samples, q) * 1000) if samples else 0.0
+
+
+def bench(index: LocalVectorIndex, collection, query_vectors: np.ndarray, storage_format: str,
+          k: int = 3, repeat: int = 3) -> Dict[str, Any]:
+    """
+    같은 질문 벡터로 로컬 검색과 Atlas $vectorSearch의 지연 시간과 결과 겹침(overlap@k)을 비교
+
+    질문 임베딩 시간은 양쪽에 같으므로 제외한다.
+    """
+    local_times, atlas_times, overlaps = [], [], []
+    for query_vector in query_vectors:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            rows, _ = index.search_rows(query_vector, k)
+            local_times.append(time.perf_counter() - started)
+        local_ids = {index.page_ids[row] for row in rows}
+
+        pipeline = [vector_search_stage(encode_vector(query_vector, storage_format), limit=k),
+                    {'$project': {'_id': 0, 'page_id': 1}}]
+        for _ in range(repeat):
+            started = time.perf_counter()
+            results = list(collection.aggregate(pipeline))
+            atlas_times.append(time.perf_counter() - started)
+        overlaps.append(len(local_ids & {doc.get('page_id') for doc in results}) / max(1, len(local_ids)))
+
+    return {
+        'queries': len(query_vectors),
+        'local_p50_ms': percentile_ms(local_times, 50),
+        'local_p95_ms': percentile_ms(local_times, 95),
+        'atlas_p50_ms': percentile_ms(atlas_times, 50),
+        'atlas_p95_ms': percentile_ms(atlas_times, 95),
+        f'overlap@{k}': float(np.mean(overlaps)) if overlaps else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='로컬 NumPy 벡터 검색 백엔드')
+    parser.add_argument('command', choices=['build', 'search', 'bench'])
+    parser.add_argument('query', nargs='?', help='search할 질문')
+    parser.add_argument('--path', type=Path, default=DEFAULT_INDEX_DIR, help='스냅샷 디렉토리')
+    parser.add_argument('--queries', type=Path, default=DEFAULT_QUERY_FILE, help='bench용 질문 파일')
+    parser.add_argument('--k', type=int, default=3, help='검색 결과 수')
+    parser.add_argument('--repeat', type=int, default=3, help='bench에서 질문마다 반복할 횟수')
+    args = parser.parse_args()
+
+    # embed_docs가 DB 연결과 provider를 만들므로 CLI에서만 불러옴
+    from embed_docs import collection, db_client, provider, storage_format
+
+    try:
+        if args.command == 'build':
+            started = time.perf_counter()
+            info = build_snapshot(collection, provider.model, args.path)
+            print(f"✅ {info['collection']} 스냅샷: {info['count']}개 문서, {info['dimensions']}차원 "
+                  f"({time.perf_counter() - started:.1f}s) → {args.path}")
+            return
+
+        index = load_index(args.path, provider.model, provider.num_dimensions)
+        if args.command == 'search':
+            if not args.query:
+                parser.error('search에는 질문이 필요합니다')
+            started = time.perf_counter()
+            query_vector = provider.embed([args.query]).vectors[0]
+            embedded = time.perf_counter()
+            results = index.search(query_vector, args.k)
+            print(f"⏱️  임베딩 {(embedded - started) * 1000:.1f}ms, 검색 {(time.perf_counter() - embedded) * 1000:.2f}ms "
+                  f"({len(index)}개 문서)")
+            for i, doc in enumerate(results, 1):
+                print(f"[{i}] {doc.get('metadata', {}).get('title', '제목 없음')} ({doc['score']:.4f})")
+        else:
+            with open(args.queries, 'r', encoding='utf-8') as f:
+                queries = [line.strip() for line in f if line.strip()]
+            query_vectors = np.asarray(provider.embed(queries).vectors, dtype=np.float32)
+            if index.info['collection'] != collection.name:
+                print(f"⚠️  스냅샷({index.info['collection']})과 현재 rag_docs({collection.name}) 버전이 다릅니다.")
+            result = bench(index, collection, query_vectors, storage_format, args.k, args.repeat)
+            print(f"\n📊 로컬 vs Atlas (질문 {result['queries']}개, 문서 {len(index)}개, 질문 임베딩 제외)")
+            print(f"    로컬  p50 {result['local_p50_ms']:8.2f}ms  p95 {result['local_p95_ms']:8.2f}ms")
+            print(f"    Atlas p50 {result['atlas_p50_ms']:8.2f}ms  p95 {result['atlas_p95_ms']:8.2f}ms")
+            print(f"    overlap@{args.k}: {result[f'overlap@{args.k}']:.3f}")
+    finally:
+        db_client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+# coding=utf-8
+"""
+검색 질문 결과 캐시 (ask_rag_system 앞단, 프로세스 메모리)
+
+같은 질문을 표현만 조금 바꿔 다시 묻는 경우가 많아, 질문마다 임베딩 호출과 벡터 검색을 하지 않도록 1단계 검색 결과
+(page_id/점수 목록)를 캐시한다. 필드는 캐시하지 않고 hydration.py LRU에서 다시 채운다.
+
+- exact: 정규화(NFKC, 공백 정리)한 질문 텍스트 LRU - 맞으면 임베딩도 하지 않음
+- semantic: exact에 없으면 질문을 임베딩해서 캐시된 질문 벡터들과 cosine을 한 번에 계산하고,
+  threshold 이상인 가장 가까운 질문의 결과를 재사용 (검색 생략). lexical_key(예: BM25 색인에 있는 질문 단어 집합)를
+  함께 주면 그 값까지 같은 질문만 재사용한다 (벡터로는 가깝지만 코드/번호가 다른 질문을 섞지 않도록)
+- 무효화: 결과를 만든 페이지들의 버전(versions 함수, 예: 문서 _id와 embedded_at)을 함께 저장해 두고,
+  캐시를 쓰기 전에 현재 버전과 다르면(재적재/재임베딩) 버리고 다시 검색한다. 다른 검색 설정(limit, 백엔드,
+  rag_docs 버전, 스냅샷)의 결과는 context가 달라 섞이지 않는다. ttl이 지난 항목도 다시 검색한다.
+"""
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from vector_storage import normalize
+
+DEFAULT_QUERY_CACHE_SIZE = 256
+# 이 cosine 이상이면 같은 질문으로 봄 (낮출수록 재사용이 늘지만 다른 질문의 결과를 돌려줄 위험도 커짐)
+DEFAULT_SEMANTIC_THRESHOLD = 0.95
+DEFAULT_QUERY_CACHE_TTL = 3600.0
+
+
+def normalize_query(query: str) -> str:
+    return ' '.join(unicodedata.normalize('NFKC', query).split())
+
+
+class CachedHits(NamedTuple):
+    hits: List[Dict[str, Any]]
+    versions: Dict[Any, Any]
+    created: float
+
+
+class QueryCache:
+    """
+    exact + semantic 2단계 질문 결과 캐시
+
+    Args:
+        versions: page_id 목록 → {page_id: 현재 버전} (None이면 버전 검사 없이 context/ttl로만 무효화)
+        capacity: 캐시할 질문 수 (두 단계 공용, LRU)
+        threshold: semantic 재사용 cosine 하한 (None이면 exact만)
+        ttl: 항목 유효 시간 (초)
+        on_invalidate: 버전이 바뀐 page_id 목록을 받는 함수 (hydration 캐시도 함께 비우도록)
+    """
+
+    def __init__(self, versions: Callable[[List[Any]], Dict[Any, Any]] = None,
+                 capacity: int = DEFAULT_QUERY_CACHE_SIZE, threshold: Optional[float] = DEFAULT_SEMANTIC_THRESHOLD,
+                 ttl: float = DEFAULT_QUERY_CACHE_TTL, on_invalidate: Callable[[List[Any]], None] = None):
+        self.versions = versions
+        self.capacity = capacity
+        self.threshold = threshold
+        self.ttl = ttl
+        self.on_invalidate = on_invalidate
+        self._entries: 'OrderedDict[Tuple[str, Hashable], CachedHits]' = OrderedDict()
+        # semantic 단계: 행마다 캐시된 질문 하나의 정규화된 벡터 (slot_keys[i]가 그 질문의 키, 빈 행은 None)
+        self._vectors: Optional[np.ndarray] = None
+        self._slot_keys: List[Optional[Tuple[str, Hashable]]] = [None] * capacity
+        self._slot_lexical_keys: List[Hashable] = [None] * capacity
+        self._slots: Dict[Tuple[str, Hashable], int] = {}
+        self.stats = {'exact': 0, 'semantic': 0, 'miss': 0, 'invalidated': 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _discard(self, key: Tuple[str, Hashable]):
+        self._entries.pop(key, None)
+        slot = self._slots.pop(key, None)
+        if slot is not None:
+            self._slot_keys[slot] = None
+            self._slot_lexical_keys[slot] = None
+
+    def _validate(self, found: Dict[int, Tuple[str, Hashable]]) -> Dict[int, List[Dict[str, Any]]]:
+        """찾은 항목 중 ttl 안이고 페이지 버전이 그대로인 것만 (질문 위치 → hits 사본). 나머지는 버림"""
+        now = time.time()
+        fresh = {i: key for i, key in found.items() if now - self._entries[key].created < self.ttl}
+        for key in set(found.values()) - set(fresh.values()):
+            self._discard(key)
+            self.stats['invalidated'] += 1
+
+        current = {}
+        if self.versions is not None and fresh:
+            page_ids = {page_id for key in fresh.values() for page_id in self._entries[key].versions}
+            current = self.versions(list(page_ids)) if page_ids else {}
+        valid, changed = {}, set()
+        for i, key in fresh.items():
+            entry = self._entries.get(key)
+            if entry is None:
+                continue
+            stale = [page_id for page_id, version in entry.versions.items() if current.get(page_id) != version]
+            if self.versions is not None and stale:
+                changed.update(stale)
+                self._discard(key)
+                self.stats['invalidated'] += 1
+                continue
+            self._entries.move_to_end(key)
+            valid[i] = [dict(hit) for hit in entry.hits]
+        if changed and self.on_invalidate is not None:
+            self.on_invalidate(list(changed))
+        return valid
+
+    def get_exact(self, queries: List[str], context: Hashable) -> Dict[int, List[Dict[str, Any]]]:
+        """질문 위치 → 캐시된 hits (텍스트가 같은 질문)"""
+        found = {}
+        for i, query in enumerate(queries):
+            key = (normalize_query(query), context)
+            if key in self._entries:
+                found[i] = key
+        valid = self._validate(found)
+        self.stats['exact'] += len(valid)
+        return valid
+
+    def get_similar(self, vectors: Any, context: Hashable, positions: List[int],
+                    lexical_keys: List[Hashable] = None) -> Dict[int, List[Dict[str, Any]]]:
+        """
+        질문 위치 → 가장 가까운 캐시 질문의 hits (같은 context와 lexical_key, cosine >= threshold)
+
+        Args:
+            vectors: positions 순서의 질문 벡터
+            positions: 각 벡터의 원래 질문 위치
+            lexical_keys: positions 순서의 질문별 lexical_key (None이면 검사하지 않음)
+        """
+        if self.threshold is None or self._vectors is None or not self._slots:
+            return {}
+        candidates = np.asarray([key is not None and key[1] == context for key in self._slot_keys])
+        if not candidates.any():
+            return {}
+        similarities = normalize(np.asarray(vectors, dtype=np.float32)) @ self._vectors.T
+        similarities[:, ~candidates] = -np.inf
+        if lexical_keys is not None:
+            for row, lexical_key in enumerate(lexical_keys):
+                similarities[row, [slot for slot, key in enumerate(self._slot_lexical_keys) if key != lexical_key]] = -np.inf
+        best = similarities.argmax(axis=1)
+        found = {position: self._slot_keys[slot] for position, slot, similarity
+                 in zip(positions, best, similarities[np.arange(len(best)), best]) if similarity >= self.threshold}
+        valid = self._validate(found)
+        self.stats['semantic'] += len(valid)
+        return valid
+
+    def put(self, query: str, context: Hashable, hits: List[Dict[str, Any]], vector: Any = None,
+            versions: Dict[Any, Any] = None, lexical_key: Hashable = None):
+        """검색 결과 저장 (vector가 있으면 semantic 단계에도 lexical_key와 함께 등록)"""
+        key = (normalize_query(query), context)
+        self.stats['miss'] += 1
+        self._discard(key)
+        self._entries[key] = CachedHits([dict(hit) for hit in hits], versions or {}, time.time())
+        while len(self._entries) > self.capacity:
+            self._discard(next(iter(self._entries)))
+        if vector is None or self.threshold is None:
+            return
+        vector = normalize(np.asarray(vector, dtype=np.float32))
+        if self._vectors is None:
+            self._vectors = np.zeros((self.capacity, vector.shape[0]), dtype=np.float32)
+        slot = self._slot_keys.index(None)
+        self._vectors[slot] = vector
+        self._slot_keys[slot] = key
+        self._slot_lexical_keys[slot] = lexical_key
+        self._slots[key] = slot
+
+    def invalidate(self, page_ids: Optional[Iterable[Any]] = None):
+        """page_ids가 결과에 포함된 항목을 버림 (None이면 전체)"""
+        if page_ids is None:
+            for key in list(self._entries):
+                self._discard(key)
+            return
+        page_ids = set(page_ids)
+        for key, entry in list(self._entries.items()):
+            if any(hit.get('page_id') in page_ids for hit in entry.hits):
+                self._discard(key)
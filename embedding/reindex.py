@@ -0,0 +1,323 @@
+# coding=utf-8
+"""
+rag_docs blue-green 재색인
+
+임베딩 모델/차원/저장 형식이나 vector_content 구성이 바뀌면 rag_docs를 제자리에서 다시 임베딩하는 동안
+검색 결과에 이전/새 벡터가 섞인다. 대신 새 버전 컬렉션(shadow)을 처음부터 끝까지 만든 뒤 검증하고,
+rag_docs 별칭(db/mongodb/collection_alias.py)을 한 번에 전환한다.
+
+    1. 복사: 현재 버전(또는 final_rag_data JSONL)의 문서를 rag_docs__<버전>으로 복사 (임베딩 필드 제외)
+    2. 임베딩: async_embed_docs.run_pipeline으로 shadow 컬렉션 임베딩
+       (임베딩 캐시를 쓰므로 모델/차원과 텍스트가 그대로인 문서는 API를 호출하지 않음)
+    3. 색인: 현재 설정 차원의 vector index 생성 후 queryable이 될 때까지 대기
+    4. 검증: 문서 수/임베딩 수와, 표본 문서의 vector_content 앞부분으로 검색했을 때 자기 자신이 top-k에 드는 비율
+    5. 전환: 검증을 통과하면 별칭을 shadow로 전환. 이전 버전은 남겨 두어 rollback으로 즉시 되돌림
+       별칭 문서에는 shadow를 만든 임베딩 설정(모델/차원/저장 형식)을 함께 기록하므로, 설정이 다른 검색/임베딩
+       프로세스는 새 버전을 잘못된 벡터로 읽지 않고 멈춘다. 새 설정으로 다시 시작해야 한다 (rollback은 이전 설정으로 되돌림).
+
+재색인 중에 현재 버전에 새로 적재된 문서는 shadow에 들어가지 않으므로, 적재 작업이 없을 때 실행한다.
+
+Usage:
+    python reindex.py build                         # 현재 버전을 복사해 재임베딩 후 검증되면 전환
+    python reindex.py build --source jsonl          # final_rag_data JSONL에서 다시 만들기 (vector_content 구성 변경)
+    python reindex.py build --no-switch             # 검증까지만
+    python reindex.py switch rag_docs__20261019-120000
+    python reindex.py rollback
+    python reindex.py status
+    python reindex.py prune --keep 2
+"""
+import argparse
+import asyncio
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from async_embed_docs import run_pipeline
+from embed_docs import EMBEDDING_SETTINGS, PENDING_FIELD, RAG_DOCS_ALIAS, db, db_client, provider, storage_format
+from embedding_cache import EmbeddingCache
+from vector_storage import (
+    EMBEDDED_AT_FIELD,
+    EMBEDDING_FIELD,
+    VECTOR_INDEX_NAME,
+    EmbeddingSettingsError,
+    check_embedding_settings,
+    decode_vector,
+    encode_vector,
+    stored_format,
+    sync_vector_index,
+    vector_search_stage,
+    wait_for_vector_index,
+)
+# 저장소 루트 모듈 (embed_docs가 sys.path에 추가한 뒤 import)
+from db.mongodb.collection_alias import (
+    get_alias,
+    resolve_name,
+    retained_targets,
+    rollback_alias,
+    switch_alias,
+    target_settings,
+)
+from monitoring.usage_ledger import add_ledger_arguments, ledger_from_args
+
+VERSION_SEPARATOR = '__'
+# 표본 검색에 쓰는 vector_content 앞부분 길이 (글자)
+SAMPLE_QUERY_CHARS = 300
+DEFAULT_SAMPLE_SIZE = 30
+DEFAULT_MIN_RECALL = 0.8
+DEFAULT_KEEP = 2
+
+
+def new_version_name(alias: str = RAG_DOCS_ALIAS) -> str:
+    return f"{alias}{VERSION_SEPARATOR}{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+
+
+def list_versions(alias: str = RAG_DOCS_ALIAS):
+    """별칭의 버전 컬렉션들 (별칭과 같은 이름의 원래 컬렉션 포함, 이름 순)"""
+    names = db.list_collection_names()
+    return sorted(name for name in names if name == alias or name.startswith(alias + VERSION_SEPARATOR))
+
+
+def copy_from_collection(source, shadow_name: str) -> int:
+    """임베딩/대상 표시 필드를 뺀 문서를 서버에서 shadow 컬렉션으로 복사 ($out)"""
+    source.aggregate([
+        {'$project': {EMBEDDING_FIELD: 0, EMBEDDED_AT_FIELD: 0, PENDING_FIELD: 0}},
+        {'$out': shadow_name},
+    ])
+    return db[shadow_name].count_documents({})
+
+
+def copy_from_jsonl(shadow_name: str) -> int:
+    """generate_rag_objects.merge_data로 final_rag_data JSONL에서 문서를 새로 만들어 삽입"""
+    sys.path.append(str(Path(__file__).resolve().parent.parent / 'processing'))
+    from generate_rag_objects import merge_data
+
+    documents = merge_data()
+    for doc in documents:
+        doc.pop(PENDING_FIELD, None)
+    if documents:
+        db[shadow_name].insert_many(documents, ordered=False)
+    return len(documents)
+
+
+def version_settings(name: str) -> Dict[str, Any]:
+    """
+    버전 컬렉션을 만든 임베딩 설정 (switch로 전환할 때 별칭 문서에 기록)
+
+    별칭 문서(현재/history)에 기록이 있으면 그 값을, 없으면(--no-switch로 만든 shadow 등) 저장된 벡터의 차원/형식이
+    이 프로세스 설정과 같은지 확인한 뒤 이 프로세스 설정을 쓴다 (모델은 벡터로 확인할 수 없음).
+    """
+    settings = target_settings(db, RAG_DOCS_ALIAS, name)
+    if settings is not None:
+        return settings
+    sample = db[name].find_one({EMBEDDING_FIELD: {'$exists': True}}, {EMBEDDING_FIELD: 1})
+    if sample is None:
+        raise EmbeddingSettingsError(f"{name}에 임베딩된 문서가 없어 임베딩 설정을 확인할 수 없습니다")
+    value = sample[EMBEDDING_FIELD]
+    check_embedding_settings(
+        {'dimensions': len(decode_vector(value)), 'storage_format': stored_format(value)},
+        {'dimensions': EMBEDDING_SETTINGS['dimensions'], 'storage_format': EMBEDDING_SETTINGS['storage_format']},
+        name,
+    )
+    return EMBEDDING_SETTINGS
+
+
+def format_settings(settings: Optional[Dict[str, Any]]) -> str:
+    if not settings:
+        return '임베딩 설정 기록 없음'
+    return f"{settings['model']}, {settings['dimensions']}차원, {settings['storage_format']}"
+
+
+def mark_pending(shadow) -> int:
+    """vector_content가 있는 문서를 모두 임베딩 대상으로 표시"""
+    result = shadow.update_many(
+        {'vector_content': {'$type': 'string', '$ne': ''}},
+        {'$set': {PENDING_FIELD: True}},
+    )
+    return result.modified_count
+
+
+def sample_recall(shadow, sample_size: int = DEFAULT_SAMPLE_SIZE, k: int = 3) -> Dict[str, Any]:
+    """
+    표본 문서의 vector_content 앞부분을 질문으로 검색했을 때 자기 자신이 top-k에 드는 비율
+
+    정답 질문 세트 없이 색인이 완성되어 있고 질문/문서 벡터가 같은 공간에 있는지 확인하는 용도다.
+    """
+    samples = list(shadow.aggregate([
+        {'$match': {EMBEDDING_FIELD: {'$exists': True}}},
+        {'$sample': {'size': sample_size}},
+        {'$project': {'_id': 1, 'vector_content': 1}},
+    ]))
+    if not samples:
+        return {'samples': 0, 'hits': 0, 'recall': 0.0}
+    queries = [doc['vector_content'][:SAMPLE_QUERY_CHARS] for doc in samples]
+    vectors = provider.embed(queries).vectors
+    hits = 0
+    for doc, vector in zip(samples, vectors):
+        results = shadow.aggregate([
+            vector_search_stage(encode_vector(vector, storage_format), limit=k),
+            {'$project': {'_id': 1}},
+        ])
+        hits += any(result['_id'] == doc['_id'] for result in results)
+    return {'samples': len(samples), 'hits': hits, 'recall': hits / len(samples)}
+
+
+def verify_shadow(shadow, expected_count: int, sample_size: int = DEFAULT_SAMPLE_SIZE,
+                  min_recall: float = DEFAULT_MIN_RECALL, k: int = 3) -> Dict[str, Any]:
+    """
+    shadow 컬렉션이 전환 가능한지 검증
+
+    Returns:
+        {'ok', 'total', 'expected', 'with_content', 'embedded', 'pending', 'recall', 'problems'}
+    """
+    report = {
+        'total': shadow.count_documents({}),
+        'expected': expected_count,
+        'with_content': shadow.count_documents({'vector_content': {'$type': 'string', '$ne': ''}}),
+        'embedded': shadow.count_documents({EMBEDDING_FIELD: {'$exists': True}}),
+        'pending': shadow.count_documents({PENDING_FIELD: True}),
+    }
+    problems = []
+    if report['total'] != expected_count:
+        problems.append(f"문서 수 {report['total']} != 원본 {expected_count}")
+    if report['embedded'] != report['with_content'] or report['pending']:
+        problems.append(f"임베딩 {report['embedded']}/{report['with_content']}개 (남은 대상 {report['pending']}개)")
+    recall = sample_recall(shadow, sample_size, k)
+    report['recall'] = recall
+    if recall['recall'] < min_recall:
+        problems.append(f"표본 recall@{k} {recall['recall']:.2f} < {min_recall:.2f}")
+    report['problems'] = problems
+    report['ok'] = not problems
+    return report
+
+
+def build(
+    source: str = 'active',
+    switch: bool = True,
+    concurrency: int = 8,
+    sample_size: int = DEFAULT_SAMPLE_SIZE,
+    min_recall: float = DEFAULT_MIN_RECALL,
+    ledger=None,
+    cache: EmbeddingCache = None,
+) -> Optional[str]:
+    """shadow 컬렉션을 만들고 검증. 통과하고 switch이면 별칭을 전환. 만든 컬렉션 이름 (실패 시 None)"""
+    active_name = resolve_name(db, RAG_DOCS_ALIAS)
+    shadow_name = new_version_name()
+    print(f"🚀 {RAG_DOCS_ALIAS}: {active_name} → {shadow_name} ({provider.model}, "
+          f"{provider.num_dimensions}차원, {storage_format})")
+
+    if source == 'active':
+        expected = copy_from_collection(db[active_name], shadow_name)
+    else:
+        expected = copy_from_jsonl(shadow_name)
+    shadow = db[shadow_name]
+    print(f"📄 문서 복사: {expected}개, 임베딩 대상 {mark_pending(shadow)}개")
+
+    summary = asyncio.run(run_pipeline(concurrency=concurrency, cache=cache, ledger=ledger, target=shadow))
+    print(f"🧮 임베딩: 성공 {summary['success']}개, 실패 {summary['error']}개, API 요청 {summary['requests']}회")
+
+    print(f"🗂️  vector index: {sync_vector_index(shadow, provider.num_dimensions)} - queryable 대기 중...")
+    if not wait_for_vector_index(shadow, VECTOR_INDEX_NAME):
+        print(f"❌ vector index가 제한 시간 안에 준비되지 않았습니다. {shadow_name}은 남겨 둡니다.")
+        return None
+
+    report = verify_shadow(shadow, expected, sample_size, min_recall)
+    recall = report['recall']
+    print(f"🔍 검증: 문서 {report['total']}/{report['expected']}, "
+          f"임베딩 {report['embedded']}/{report['with_content']}, "
+          f"표본 recall {recall['hits']}/{recall['samples']} ({recall['recall']:.2f})")
+    if not report['ok']:
+        for problem in report['problems']:
+            print(f"   ❌ {problem}")
+        print(f"⚠️  전환하지 않습니다. {shadow_name}은 확인용으로 남겨 둡니다.")
+        return None
+
+    if switch:
+        previous = switch_alias(db, RAG_DOCS_ALIAS, shadow_name, expected=active_name, settings=EMBEDDING_SETTINGS)
+        print(f"✅ 전환 완료: {RAG_DOCS_ALIAS} → {shadow_name} (이전 {previous}, rollback 가능)")
+        print(f"   검색/임베딩 프로세스는 같은 설정({format_settings(EMBEDDING_SETTINGS)})으로 다시 시작해야 합니다.")
+    else:
+        print(f"✅ 검증 통과: python reindex.py switch {shadow_name} 으로 전환")
+    return shadow_name
+
+
+def prune(keep: int = DEFAULT_KEEP):
+    """현재 버전과 최근 keep개 이전 버전을 제외한 버전 컬렉션 삭제 (전환하지 않은 shadow도 삭제됨)"""
+    retained = set(retained_targets(db, RAG_DOCS_ALIAS)[:keep + 1])
+    dropped = []
+    for name in list_versions():
+        if name not in retained:
+            db.drop_collection(name)
+            dropped.append(name)
+    return dropped
+
+
+def print_status():
+    doc = get_alias(db, RAG_DOCS_ALIAS)
+    active = resolve_name(db, RAG_DOCS_ALIAS)
+    print(f"📌 {RAG_DOCS_ALIAS} → {active}" + (f" (전환: {doc['switched_at']})" if doc else " (별칭 없음)"))
+    if doc:
+        print(f"   임베딩 설정: {format_settings(doc.get('settings'))}")
+    history = [entry['target'] for entry in (doc or {}).get('history', [])]
+    for name in list_versions():
+        marker = '▶' if name == active else ('↩' if name in history else ' ')
+        count = db[name].estimated_document_count()
+        print(f"   {marker} {name}: {count}개 문서")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='rag_docs blue-green 재색인')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='shadow 컬렉션 생성/검증 후 전환')
+    build_parser.add_argument('--source', choices=['active', 'jsonl'], default='active',
+                              help='active: 현재 버전 문서 복사, jsonl: final_rag_data에서 새로 생성')
+    build_parser.add_argument('--no-switch', action='store_true', help='검증까지만 하고 전환하지 않음')
+    build_parser.add_argument('--concurrency', type=int, default=8, help='동시 임베딩 요청 수')
+    build_parser.add_argument('--sample-size', type=int, default=DEFAULT_SAMPLE_SIZE, help='검증 표본 문서 수')
+    build_parser.add_argument('--min-recall', type=float, default=DEFAULT_MIN_RECALL, help='전환에 필요한 표본 recall')
+    build_parser.add_argument('--no-cache', action='store_true', help='임베딩 캐시를 사용하지 않음')
+    add_ledger_arguments(build_parser)
+
+    switch_parser = subparsers.add_parser('switch', help='지정한 버전으로 전환')
+    switch_parser.add_argument('version')
+    subparsers.add_parser('rollback', help='직전 버전으로 되돌림')
+    subparsers.add_parser('status', help='현재 버전과 보관 중인 버전')
+    prune_parser = subparsers.add_parser('prune', help='오래된 버전 삭제')
+    prune_parser.add_argument('--keep', type=int, default=DEFAULT_KEEP, help='남길 이전 버전 수')
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'build':
+            cache = None if args.no_cache else EmbeddingCache()
+            try:
+                build(args.source, not args.no_switch, args.concurrency, args.sample_size, args.min_recall,
+                      ledger_from_args(args), cache)
+            finally:
+                if cache is not None:
+                    cache.close()
+        elif args.command == 'switch':
+            if args.version not in list_versions():
+                print(f"❌ 없는 버전입니다: {args.version}")
+                return
+            try:
+                settings = version_settings(args.version)
+            except EmbeddingSettingsError as e:
+                print(f"❌ {e}")
+                return
+            previous = switch_alias(db, RAG_DOCS_ALIAS, args.version, settings=settings)
+            print(f"✅ {RAG_DOCS_ALIAS} → {args.version} ({format_settings(settings)}, 이전 {previous})")
+        elif args.command == 'rollback':
+            previous = rollback_alias(db, RAG_DOCS_ALIAS)
+            print(f"↩️  {RAG_DOCS_ALIAS} → {previous} ({format_settings(get_alias(db, RAG_DOCS_ALIAS).get('settings'))})")
+        elif args.command == 'status':
+            print_status()
+        else:
+            dropped = prune(args.keep)
+            print(f"🧹 삭제한 버전: {', '.join(dropped) if dropped else '없음'}")
+    finally:
+        db_client.close()
+
+
+if __name__ == "__main__":
+    main()
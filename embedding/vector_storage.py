@@ -0,0 +1,338 @@
+# coding=utf-8
+"""
+임베딩 저장 형식(차원 축소/양자화)과 Atlas vector index 정의
+
+text-embedding-3-small 벡터를 BSON double 배열로 저장하면 1536차원 기준 문서당 약 20KB(배열 키 문자열 포함)이고,
+이 크기가 컬렉션 크기, vector index 메모리, projection 없는 find마다 그대로 들어간다.
+
+- 차원 축소: embeddings API의 dimensions 파라미터. text-embedding-3 계열은 앞쪽 차원만 잘라 다시 정규화한 것과
+  같으므로 이미 저장된 벡터도 API 호출 없이 줄일 수 있다 (convert)
+- 저장 형식: float64 (BSON double 배열, 기존 형식) / float32, int8 (BSON binary vector, subtype 9)
+  int8은 벡터마다 최대 절댓값을 127에 맞추는 대칭 스칼라 양자화. cosine 유사도는 벡터 크기와 무관하므로
+  scale을 따로 저장하지 않고, 질문 벡터도 같은 방식으로 양자화해서 검색한다
+- vector index 정의의 numDimensions는 현재 설정의 차원과 항상 같게 생성/갱신 (sync_vector_index)
+
+설정은 embed_docs.py, async_embed_docs.py, run_vector_search.py가 같은 환경 변수에서 읽는다:
+    EMBEDDING_DIMENSIONS  (없으면 모델 기본 차원)
+    EMBEDDING_STORAGE     (float64 | float32 | int8, 기본 float64)
+reindex.py로 전환한 rag_docs 버전은 벡터를 만든 (모델, 차원, 저장 형식)이 별칭 문서에 기록되고,
+각 프로세스는 자기 설정과 다르면 검색/임베딩하지 않고 EmbeddingSettingsError로 멈춘다 (check_embedding_settings).
+
+Usage:
+    python vector_storage.py index                                  # 현재 설정에 맞게 vector index 생성/갱신
+    python vector_storage.py convert                                # 저장된 벡터를 현재 설정으로 변환 (API 호출 없음)
+    python vector_storage.py report --queries data/eval_queries.txt # 차원/형식별 recall과 크기 비교
+"""
+import argparse
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import bson
+import numpy as np
+from bson.binary import Binary, BinaryVectorDtype
+from pymongo import UpdateOne
+from pymongo.operations import SearchIndexModel
+
+from embedding_providers import get_provider
+
+EMBEDDING_FIELD = 'vector_content_embedding'
+# 임베딩을 저장한 시각 (재임베딩되면 바뀜 - run_vector_search.py의 질문 결과 캐시 무효화에 사용)
+EMBEDDED_AT_FIELD = 'embedded_at'
+VECTOR_INDEX_NAME = 'default'
+VECTOR_SIMILARITY = 'cosine'
+# 검색 결과 필드 ($vectorSearch 뒤의 $project). 로컬 백엔드(local_index.py)도 같은 모양으로 반환
+RESULT_PROJECTION = {"_id": 0, "metadata.title": 1, "toc": 1, "llm_content": 1, "tables": 1, "vector_content": 1}
+
+STORAGE_FORMATS = ('float64', 'float32', 'int8')
+DEFAULT_STORAGE_FORMAT = 'float64'
+
+# report에서 비교할 차원 (저장된 차원보다 큰 값은 제외)
+REPORT_DIMENSIONS = [1536, 1024, 768, 512, 256]
+ROOT_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_QUERY_FILE = ROOT_DIR / 'data' / 'eval_queries.txt'
+
+
+class EmbeddingSettingsError(ValueError):
+    """컬렉션 벡터를 만든 임베딩 설정과 이 프로세스의 설정이 다를 때 발생"""
+    pass
+
+
+def storage_settings() -> Tuple[Optional[int], str]:
+    """환경 변수의 (dimensions, 저장 형식). dimensions가 None이면 모델 기본 차원"""
+    dimensions = os.getenv('EMBEDDING_DIMENSIONS')
+    storage_format = os.getenv('EMBEDDING_STORAGE', DEFAULT_STORAGE_FORMAT)
+    if storage_format not in STORAGE_FORMATS:
+        raise ValueError(f"EMBEDDING_STORAGE는 {', '.join(STORAGE_FORMATS)} 중 하나여야 합니다: {storage_format}")
+    return (int(dimensions) if dimensions else None), storage_format
+
+
+def embedding_settings(model: str, dimensions: int, storage_format: str) -> Dict[str, Any]:
+    """벡터를 만든 임베딩 설정 (reindex.py가 rag_docs 별칭 문서의 settings로 기록)"""
+    return {'model': model, 'dimensions': dimensions, 'storage_format': storage_format}
+
+
+def check_embedding_settings(stored: Optional[Dict[str, Any]], current: Dict[str, Any], target: str):
+    """
+    target 컬렉션의 기록된 임베딩 설정이 이 프로세스의 설정과 같은지 확인
+
+    기록이 없으면(설정을 기록하기 전에 만든 버전) 확인하지 않는다.
+
+    Raises:
+        EmbeddingSettingsError: 모델/차원/저장 형식 중 하나라도 다른 경우
+    """
+    if not stored:
+        return
+    different = {key: (stored.get(key), value) for key, value in current.items() if stored.get(key) != value}
+    if different:
+        details = ', '.join(f"{key} {expected} (현재 {value})" for key, (expected, value) in different.items())
+        raise EmbeddingSettingsError(
+            f"{target}은 다른 임베딩 설정으로 만든 버전입니다: {details}. "
+            f"EMBEDDING_PROVIDER/EMBEDDING_DIMENSIONS/EMBEDDING_STORAGE를 맞춘 뒤 다시 시작하세요.")
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    """마지막 축 기준 L2 정규화 (영벡터는 그대로)"""
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def truncate_vector(vector: Any, dimensions: Optional[int]) -> np.ndarray:
+    """앞쪽 dimensions개만 남기고 다시 정규화 (API의 dimensions 파라미터와 같은 결과)"""
+    vector = np.asarray(vector, dtype=np.float32)
+    if dimensions is None or dimensions >= vector.shape[-1]:
+        return vector
+    return normalize(vector[..., :dimensions])
+
+
+def quantize_int8(vector: Any) -> np.ndarray:
+    """벡터별 대칭 스칼라 양자화 (최대 절댓값 → 127)"""
+    vector = np.asarray(vector, dtype=np.float32)
+    scale = np.abs(vector).max(axis=-1, keepdims=True)
+    scale = np.where(scale == 0, 1, scale)
+    return np.clip(np.rint(vector / scale * 127), -127, 127).astype(np.int8)
+
+
+def encode_vector(vector: Any, storage_format: str = DEFAULT_STORAGE_FORMAT) -> Any:
+    """저장/질문용 벡터 값 (float64는 리스트, float32/int8은 BSON binary vector)"""
+    if storage_format == 'float64':
+        return np.asarray(vector, dtype=np.float64).tolist()
+    if storage_format == 'float32':
+        return Binary.from_vector(np.asarray(vector, dtype=np.float32).tolist(), BinaryVectorDtype.FLOAT32)
+    if storage_format == 'int8':
+        return Binary.from_vector(quantize_int8(vector).tolist(), BinaryVectorDtype.INT8)
+    raise ValueError(f"알 수 없는 저장 형식: {storage_format}")
+
+
+def decode_vector(value: Any) -> np.ndarray:
+    """저장된 값(리스트 또는 BSON binary vector)을 float32 배열로 (int8은 양자화된 값 그대로)"""
+    if isinstance(value, Binary):
+        return np.asarray(value.as_vector().data, dtype=np.float32)
+    return np.asarray(value, dtype=np.float32)
+
+
+def stored_format(value: Any) -> str:
+    if isinstance(value, Binary):
+        return 'int8' if value.as_vector().dtype == BinaryVectorDtype.INT8 else 'float32'
+    return 'float64'
+
+
+def encoded_bytes(value: Any) -> int:
+    """문서 안에서 임베딩 필드가 차지하는 BSON 바이트 수"""
+    return len(bson.encode({EMBEDDING_FIELD: value})) - len(bson.encode({}))
+
+
+def vector_index_definition(dimensions: int, similarity: str = VECTOR_SIMILARITY) -> Dict[str, Any]:
+    return {
+        'fields': [
+            {'type': 'vector', 'path': EMBEDDING_FIELD, 'numDimensions': dimensions, 'similarity': similarity},
+        ]
+    }
+
+
+def sync_vector_index(collection, dimensions: int, name: str = VECTOR_INDEX_NAME) -> str:
+    """
+    vector index 정의를 현재 차원에 맞춤 (정의가 같으면 그대로 두어 재색인하지 않음)
+
+    Returns:
+        'created' / 'updated' / 'unchanged'
+    """
+    definition = vector_index_definition(dimensions)
+    existing = next(iter(collection.list_search_indexes(name)), None)
+    if existing is None:
+        collection.create_search_index(SearchIndexModel(definition=definition, name=name, type='vectorSearch'))
+        return 'created'
+    current = existing.get('latestDefinition') or existing.get('definition') or {}
+    if current.get('fields') == definition['fields']:
+        return 'unchanged'
+    collection.update_search_index(name, definition)
+    return 'updated'
+
+
+def wait_for_vector_index(collection, name: str = VECTOR_INDEX_NAME, timeout: float = 900, interval: float = 5) -> bool:
+    """index가 만들어지거나 갱신된 뒤 검색 가능(queryable) 상태가 될 때까지 대기. 시간 안에 안 되면 False"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        existing = next(iter(collection.list_search_indexes(name)), None)
+        if existing is not None and existing.get('queryable') and existing.get('status') in (None, 'READY'):
+            return True
+        time.sleep(interval)
+    return False
+
+
+def vector_search_stage(query_vector: Any, limit: int = 3, num_candidates: int = 100,
+                        name: str = VECTOR_INDEX_NAME) -> Dict[str, Any]:
+    """$vectorSearch 단계 (query_vector는 encode_vector로 저장 형식에 맞춘 값)"""
+    return {
+        "$vectorSearch": {
+            "index": name,
+            "path": EMBEDDING_FIELD,
+            "queryVector": query_vector,
+            "numCandidates": num_candidates,
+            "limit": limit,
+        }
+    }
+
+
+def cosine_search_score(cosine: Any) -> Any:
+    """cosine 유사도 → Atlas vectorSearchScore (cosine index는 (1 + cos) / 2, 0~1)"""
+    return (1 + cosine) / 2
+
+
+def convert_collection(
+    collection, dimensions: Optional[int], storage_format: str, batch_size: int = 500,
+) -> Dict[str, int]:
+    """
+    저장된 임베딩을 (dimensions, storage_format)으로 변환 (API 호출 없음)
+
+    int8로 저장된 벡터를 다른 형식으로 바꾸면 양자화 오차는 그대로 남으므로, 원래 정밀도가 필요하면 재임베딩한다.
+    """
+    counts = {'converted': 0, 'unchanged': 0}
+    ops = []
+    cursor = collection.find({EMBEDDING_FIELD: {'$exists': True}}, {EMBEDDING_FIELD: 1}, batch_size=batch_size)
+    for doc in cursor:
+        value = doc[EMBEDDING_FIELD]
+        vector = decode_vector(value)
+        if stored_format(value) == storage_format and (dimensions is None or len(vector) == dimensions):
+            counts['unchanged'] += 1
+            continue
+        if stored_format(value) == 'int8':
+            vector = normalize(vector)
+        ops.append(UpdateOne(
+            {'_id': doc['_id']},
+            {'$set': {EMBEDDING_FIELD: encode_vector(truncate_vector(vector, dimensions), storage_format)}},
+        ))
+        if len(ops) >= batch_size:
+            collection.bulk_write(ops, ordered=False)
+            counts['converted'] += len(ops)
+            ops = []
+    if ops:
+        collection.bulk_write(ops, ordered=False)
+        counts['converted'] += len(ops)
+    return counts
+
+
+def top_k(doc_vectors: np.ndarray, query_vectors: np.ndarray, k: int) -> np.ndarray:
+    """질문별 cosine 상위 k개 문서 위치 (정규화된 행렬 기준)"""
+    scores = query_vectors @ doc_vectors.T
+    k = min(k, scores.shape[1])
+    candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.take_along_axis(scores, candidates, axis=1).argsort(axis=1)[:, ::-1]
+    return np.take_along_axis(candidates, order, axis=1)
+
+
+def size_recall_report(
+    doc_vectors: np.ndarray,
+    query_vectors: np.ndarray,
+    dimensions_list: List[int],
+    formats: List[str] = STORAGE_FORMATS,
+    k: int = 3,
+) -> List[Dict[str, Any]]:
+    """
+    저장된 전체 차원 float 벡터의 정확한 top-k를 기준으로, 차원/형식별 recall@k와 크기를 비교
+
+    Args:
+        doc_vectors: (문서 수, 차원) 기준 벡터
+        query_vectors: (질문 수, 차원) 같은 모델/차원의 질문 벡터
+    """
+    full_dims = doc_vectors.shape[1]
+    truth = top_k(normalize(doc_vectors), normalize(query_vectors), k)
+    rows = []
+    for dims in sorted({d for d in dimensions_list if d <= full_dims} | {full_dims}, reverse=True):
+        docs = truncate_vector(doc_vectors, dims)
+        queries = truncate_vector(query_vectors, dims)
+        for storage_format in formats:
+            if storage_format == 'int8':
+                docs_q, queries_q = quantize_int8(docs).astype(np.float32), quantize_int8(queries).astype(np.float32)
+            else:
+                docs_q, queries_q = docs, queries
+            found = top_k(normalize(docs_q), normalize(queries_q), k)
+            recall = np.mean([len(set(a) & set(b)) / len(a) for a, b in zip(found, truth)])
+            per_doc = encoded_bytes(encode_vector(docs[0], storage_format))
+            rows.append({
+                'dimensions': dims,
+                'format': storage_format,
+                f'recall@{k}': float(recall),
+                'bytes_per_doc': per_doc,
+                'collection_mb': per_doc * len(doc_vectors) / 1024 / 1024,
+                # Atlas는 float 벡터를 float32로 색인하므로 float64/float32 모두 4바이트
+                'index_mb': dims * (1 if storage_format == 'int8' else 4) * len(doc_vectors) / 1024 / 1024,
+            })
+    return rows
+
+
+def print_report(rows: List[Dict[str, Any]], num_docs: int, num_queries: int):
+    recall_key = next(key for key in rows[0] if key.startswith('recall@'))
+    baseline = rows[0]['bytes_per_doc']
+    print(f"\n📊 차원/저장 형식별 비교 (문서 {num_docs}개, 질문 {num_queries}개, 기준: {rows[0]['dimensions']}차원 float)")
+    print(f"{'dims':>6} {'format':>8} {recall_key:>10} {'bytes/doc':>10} {'vs base':>7} {'coll MB':>9} {'index MB':>9}")
+    for row in rows:
+        print(f"{row['dimensions']:>6} {row['format']:>8} {row[recall_key]:>10.3f} {row['bytes_per_doc']:>10} "
+              f"{row['bytes_per_doc'] / baseline:>6.0%} {row['collection_mb']:>9.1f} {row['index_mb']:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='임베딩 저장 형식/vector index 관리')
+    parser.add_argument('command', choices=['index', 'convert', 'report'])
+    parser.add_argument('--queries', type=Path, default=DEFAULT_QUERY_FILE, help='report용 질문 파일 (한 줄에 하나)')
+    parser.add_argument('--k', type=int, default=3, help='report의 recall@k (ask_rag_system의 limit과 같게)')
+    args = parser.parse_args()
+
+    # embed_docs가 이 모듈을 import하므로 CLI에서만 불러옴
+    from embed_docs import EMBEDDING_SETTINGS, RAG_DOCS_ALIAS, check_alias_settings, collection, db, db_client, provider
+    from db.mongodb.collection_alias import set_settings
+
+    dimensions, storage_format = storage_settings()
+    try:
+        if args.command == 'index':
+            check_alias_settings()
+            dims = provider.num_dimensions
+            print(f"🗂️  vector index '{VECTOR_INDEX_NAME}' ({dims}차원): {sync_vector_index(collection, dims)}")
+        elif args.command == 'convert':
+            counts = convert_collection(collection, dimensions, storage_format)
+            print(f"✅ {storage_format}/{provider.num_dimensions}차원으로 변환: "
+                  f"{counts['converted']}개 (이미 같은 형식 {counts['unchanged']}개)")
+            print(f"🗂️  vector index: {sync_vector_index(collection, provider.num_dimensions)}")
+            # 제자리 변환이므로 현재 버전의 기록된 설정도 바꿈 (다른 설정의 검색 프로세스는 다시 시작해야 함)
+            if set_settings(db, RAG_DOCS_ALIAS, EMBEDDING_SETTINGS):
+                print(f"📌 {RAG_DOCS_ALIAS} 임베딩 설정 기록: {EMBEDDING_SETTINGS}")
+        else:
+            with open(args.queries, 'r', encoding='utf-8') as f:
+                queries = [line.strip() for line in f if line.strip()]
+            docs = list(collection.find({EMBEDDING_FIELD: {'$exists': True}}, {EMBEDDING_FIELD: 1}))
+            values = [doc[EMBEDDING_FIELD] for doc in docs]
+            if any(stored_format(value) == 'int8' for value in values):
+                print("⚠️  int8로 저장된 벡터가 있어 기준 자체에 양자화 오차가 포함됩니다.")
+            doc_vectors = np.stack([decode_vector(value) for value in values])
+            # 질문은 저장된 벡터와 같은 차원으로 한 번에 임베딩
+            query_provider = get_provider(dimensions=doc_vectors.shape[1])
+            query_vectors = np.asarray(query_provider.embed(queries).vectors, dtype=np.float32)
+            rows = size_recall_report(doc_vectors, query_vectors, REPORT_DIMENSIONS, k=args.k)
+            print_report(rows, len(doc_vectors), len(queries))
+    finally:
+        db_client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+# coding=utf-8
+"""
+AsyncOpenAI로 data/raw/*.txt 페이지들을 동시에 정제하는 스크립트
+
+- 세마포어로 동시에 진행 중인 요청 수를 제한
+- RPM/TPM 한도에 맞춰 요청 시작 시점을 조절 (rate_limit.RequestPacer)
+- 429/5xx는 백오프 후 재시도하고, 그래도 실패한 페이지는 목록으로 모아 저장 (전체 실행은 계속)
+- 결과 파일 형식은 main.py(동기 버전)와 같아서 merge_llm_response_to_one_jsonl.py로 그대로 병합 가능
+
+Usage:
+    python async_cleaning.py --concurrency 16 --rpm 500 --tpm 200000
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List
+
+from openai import AsyncOpenAI
+
+from main import (
+    MODEL,
+    OPENAI_API_KEY,
+    RESPONSE_FORMAT,
+    build_messages,
+    cache_key_for,
+    extract_page_id_from_basename,
+    load_file,
+    load_system_prompt,
+    processed_dir,
+    raw_dir,
+    save_result,
+)
+from page_schema import MAX_REPAIR_ATTEMPTS, PageValidationError, build_repair_messages, is_valid_content, validate_content
+from long_page_cleaning import DEFAULT_CHUNK_TOKENS, DEFAULT_LONG_PAGE_TOKENS, clean_long_page
+from incremental_refresh import (
+    DEFAULT_MAX_DIFF_RATIO,
+    diff_sections,
+    load_previous_content,
+    load_snapshot,
+    refresh_with_patch,
+    save_snapshot,
+)
+from model_routing import choose_route, load_routes, measure_page, structure_dir
+from rate_limit import COMPLETION_TOKEN_RATIO, RequestPacer, call_with_retry, estimate_tokens
+from response_cache import ResponseCache
+# monitoring/은 main import 시 sys.path에 추가된 저장소 루트에서 찾음
+from monitoring.usage_ledger import UsageLedger, add_ledger_arguments, ledger_from_args
+
+FAILURES_FILENAME = 'cleaning_failures.json'
+
+
+async def validate_or_repair_async(
+    client: AsyncOpenAI,
+    pacer: RequestPacer,
+    semaphore: asyncio.Semaphore,
+    content: str,
+    page_id: str,
+    max_retries: int = 5,
+    ledger: UsageLedger = None,
+    model: str = MODEL,
+    route: str = None,
+) -> str:
+    """main.validate_or_repair의 비동기 버전 (수리 요청도 pacer/세마포어를 공유)"""
+    _, errors = validate_content(content)
+    attempt = 0
+    while errors and attempt < MAX_REPAIR_ATTEMPTS:
+        attempt += 1
+        print(f"🔧 [{page_id}] 스키마 검증 실패 ({'; '.join(errors)}) - 수리 요청 {attempt}/{MAX_REPAIR_ATTEMPTS}")
+        messages = build_repair_messages(content, errors)
+        estimated_tokens = int(sum(estimate_tokens(m['content']) for m in messages) * (1 + COMPLETION_TOKEN_RATIO))
+        response = await call_with_retry(
+            lambda: client.chat.completions.create(model=model, messages=messages, response_format=RESPONSE_FORMAT),
+            pacer, estimated_tokens, max_retries, label=f"{page_id}#repair", semaphore=semaphore,
+            ledger=ledger, stage='cleaning_repair', page_id=page_id, model=model, route=route,
+        )
+        content = response.choices[0].message.content
+        _, errors = validate_content(content)
+    if errors:
+        raise PageValidationError(page_id, errors)
+    return content
+
+
+async def clean_page(
+    client: AsyncOpenAI,
+    pacer: RequestPacer,
+    semaphore: asyncio.Semaphore,
+    raw_file: Path,
+    output_path: Path,
+    system_prompt: str,
+    max_retries: int = 5,
+    cache: ResponseCache = None,
+    long_page_tokens: int = DEFAULT_LONG_PAGE_TOKENS,
+    chunk_tokens: int = DEFAULT_CHUNK_TOKENS,
+    reduce_mode: str = 'deterministic',
+    ledger: UsageLedger = None,
+    routes: List[Dict[str, Any]] = None,
+    structure_base: Path = None,
+    incremental: bool = False,
+    max_diff_ratio: float = DEFAULT_MAX_DIFF_RATIO,
+) -> Dict[str, Any]:
+    """
+    페이지 하나를 정제하여 저장하고, 결과 요약을 반환 (예외는 밖으로 던지지 않음)
+
+    추정 입력 토큰이 long_page_tokens를 넘으면 long_page_cleaning의 map-reduce 경로로 처리한다.
+    ledger의 예산을 넘은 뒤에는 API를 호출하지 않고 실패(BudgetExceededError)로 반환한다.
+    routes가 있으면 페이지 크기/표·리스트 개수로 모델을 고른다 (model_routing).
+    incremental이면 이전 원본과의 섹션 diff가 max_diff_ratio 이하일 때 바뀐 섹션만 보내 패치로 갱신한다.
+    """
+    page_id = extract_page_id_from_basename(raw_file.stem)
+    raw_contract_data = load_file(raw_file)
+
+    model, route_name = MODEL, None
+    if routes:
+        route = choose_route(measure_page(page_id, raw_contract_data, system_prompt, structure_base), routes)
+        model, route_name = route['model'], route['name']
+
+    # 입력이 바뀌지 않은 페이지는 API를 호출하지 않음
+    cache_key = cache_key_for(system_prompt, raw_contract_data, model)
+    cached = cache.get(cache_key) if cache is not None else None
+    if cached is not None and is_valid_content(cached):
+        if ledger is not None:
+            ledger.record('cleaning', model, page_id=page_id, cache_hit=True, route=route_name)
+        save_result(page_id, cached, output_path)
+        return {'page_id': page_id, 'ok': True, 'cached': True, 'route': route_name}
+
+    # 이전 정제 결과와 원본이 있으면 섹션 diff로 갱신 방식 결정
+    diff, previous = None, None
+    if incremental:
+        previous_raw = load_snapshot(raw_file)
+        previous = load_previous_content(output_path)
+        if previous_raw is not None and previous is not None:
+            diff = diff_sections(previous_raw, raw_contract_data)
+            if not diff['removed'] and not diff['added']:
+                save_snapshot(raw_file, raw_contract_data)
+                return {'page_id': page_id, 'ok': True, 'mode': 'unchanged', 'route': route_name}
+            if diff['ratio'] > max_diff_ratio:
+                print(f"🔄 [{page_id}] 변경 비율 {diff['ratio']:.0%} > {max_diff_ratio:.0%} - 전체 재생성")
+                diff = None
+
+    started = time.perf_counter()
+    prompt_tokens = estimate_tokens(system_prompt) + estimate_tokens(raw_contract_data)
+    content, mode = None, 'full'
+    try:
+        if diff is not None:
+            # 바뀐 섹션과 이전 결과만 보내 패치 (패치 응답이 JSON 객체가 아니면 전체 재생성)
+            content = await refresh_with_patch(
+                client, pacer, semaphore, page_id, previous, diff, system_prompt, model, max_retries, ledger, route_name,
+            )
+            if content is not None:
+                mode = 'patch'
+
+        if content is None and long_page_tokens and prompt_tokens > long_page_tokens:
+            # 컨텍스트/출력 한도를 넘을 수 있는 페이지는 chunk로 나누어 동시에 정제
+            content = await clean_long_page(
+                client, pacer, semaphore, page_id, raw_contract_data, system_prompt,
+                max_retries, chunk_tokens, reduce_mode, ledger, model, route_name,
+            )
+        elif content is None:
+            messages = build_messages(system_prompt, raw_contract_data)
+            estimated_tokens = int(prompt_tokens * (1 + COMPLETION_TOKEN_RATIO))
+            response = await call_with_retry(
+                lambda: client.chat.completions.create(
+                    model=model,
+                    messages=messages,
+                    response_format=RESPONSE_FORMAT,
+                ),
+                pacer, estimated_tokens, max_retries, label=page_id, semaphore=semaphore,
+                ledger=ledger, stage='cleaning', page_id=page_id, model=model, route=route_name,
+            )
+            content = response.choices[0].message.content
+        # 스키마 검증 실패 시 검증 오류만 보내 수리 (원본 페이지 재전송 없음)
+        content = await validate_or_repair_async(
+            client, pacer, semaphore, content, page_id, max_retries, ledger, model, route_name,
+        )
+    except Exception as e:
+        print(f"❌ [{page_id}] 정제 실패: {e}")
+        return {
+            'page_id': page_id,
+            'ok': False,
+            'raw_file': str(raw_file),
+            'route': route_name,
+            'error': f"{type(e).__name__}: {e}",
+        }
+
+    if cache is not None:
+        cache.put(cache_key, content)
+    save_result(page_id, content, output_path)
+    save_snapshot(raw_file, raw_contract_data)
+    route_label = f" [{route_name}: {model}]" if route_name else ''
+    mode_label = f" (패치: 변경 {diff['changed_tokens']}/{diff['total_tokens']} 토큰)" if mode == 'patch' else ''
+    print(f"✅ [{page_id}] 정제 완료{route_label}{mode_label} ({time.perf_counter() - started:.1f}s): {output_path}")
+    return {'page_id': page_id, 'ok': True, 'mode': mode, 'route': route_name}
+
+
+async def clean_pages(
+    raw_files: List[Path],
+    output_dir: Path,
+    concurrency: int = 8,
+    rpm: int = 500,
+    tpm: int = 200_000,
+    max_retries: int = 5,
+    overwrite: bool = False,
+    cache: ResponseCache = None,
+    long_page_tokens: int = DEFAULT_LONG_PAGE_TOKENS,
+    chunk_tokens: int = DEFAULT_CHUNK_TOKENS,
+    reduce_mode: str = 'deterministic',
+    ledger: UsageLedger = None,
+    routes: List[Dict[str, Any]] = None,
+    structure_base: Path = None,
+    incremental: bool = False,
+    max_diff_ratio: float = DEFAULT_MAX_DIFF_RATIO,
+) -> Dict[str, Any]:
+    """
+    여러 페이지를 동시에 정제
+
+    incremental이면 이미 정제된 페이지 중 원본이 snapshot과 달라진 페이지만 다시 처리한다.
+
+    Returns:
+        {'success': int, 'cached': int, 'skipped': int, 'failures': [실패 페이지 정보, ...],
+         'routes': {route 이름: 페이지 수}, 'modes': {'full'/'patch'/'unchanged': 페이지 수}}
+    """
+    # SDK 자체 재시도는 끄고 pacer와 함께 여기서 재시도를 관리
+    client = AsyncOpenAI(api_key=OPENAI_API_KEY, max_retries=0)
+    pacer = RequestPacer(rpm=rpm, tpm=tpm)
+    semaphore = asyncio.Semaphore(concurrency)
+    system_prompt = load_system_prompt()
+
+    tasks = []
+    skipped = 0
+    for raw_file in raw_files:
+        output_path = output_dir / f"{raw_file.stem}.json"
+        if output_path.exists() and not overwrite:
+            previous_raw = load_snapshot(raw_file) if incremental else None
+            if previous_raw is None or previous_raw == load_file(raw_file):
+                skipped += 1
+                continue
+        tasks.append(clean_page(
+            client, pacer, semaphore, raw_file, output_path, system_prompt, max_retries, cache,
+            long_page_tokens, chunk_tokens, reduce_mode, ledger, routes, structure_base,
+            incremental, max_diff_ratio,
+        ))
+
+    try:
+        results = await asyncio.gather(*tasks)
+    finally:
+        await client.close()
+
+    failures = [r for r in results if not r['ok']]
+    cached = sum(1 for r in results if r.get('cached'))
+    route_counts = Counter(r['route'] for r in results if r.get('route'))
+    return {
+        'success': len(results) - len(failures),
+        'cached': cached,
+        'skipped': skipped,
+        'failures': failures,
+        'routes': dict(route_counts),
+        'modes': dict(Counter(r['mode'] for r in results if r.get('mode'))),
+    }
+
+
+def init_snapshots(raw_files: List[Path], output_dir: Path) -> int:
+    """
+    이미 정제된 페이지의 현재 원본을 diff 기준으로 보관 (API 호출 없음)
+
+    snapshot 저장 이전에 정제된 결과를 --incremental로 갱신하기 전에 한 번 실행한다.
+    """
+    count = 0
+    for raw_file in raw_files:
+        if (output_dir / f"{raw_file.stem}.json").exists() and load_snapshot(raw_file) is None:
+            save_snapshot(raw_file, load_file(raw_file))
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='AsyncOpenAI 기반 페이지 동시 정제')
+    parser.add_argument('--input', type=Path, default=raw_dir, help='원본 텍스트 디렉토리')
+    parser.add_argument('--output', type=Path, default=processed_dir, help='정제 결과 디렉토리')
+    parser.add_argument('--concurrency', type=int, default=8, help='동시에 진행할 최대 요청 수')
+    parser.add_argument('--rpm', type=int, default=500, help='분당 최대 요청 수')
+    parser.add_argument('--tpm', type=int, default=200_000, help='분당 최대 토큰 수')
+    parser.add_argument('--max-retries', type=int, default=5, help='429/5xx 재시도 횟수')
+    parser.add_argument('--overwrite', action='store_true', help='이미 정제된 페이지도 다시 처리')
+    parser.add_argument('--no-cache', action='store_true', help='응답 캐시를 사용하지 않음')
+    parser.add_argument('--long-page-tokens', type=int, default=DEFAULT_LONG_PAGE_TOKENS,
+                        help='이 값보다 긴 페이지는 chunk로 나누어 정제 (0이면 사용 안 함)')
+    parser.add_argument('--chunk-tokens', type=int, default=DEFAULT_CHUNK_TOKENS, help='chunk당 최대 입력 토큰 수')
+    parser.add_argument('--reduce', choices=['deterministic', 'llm'], default='deterministic',
+                        help='chunk 결과 병합 방식')
+    parser.add_argument('--routing', action='store_true', help='페이지 크기/구조에 따라 모델 선택 (기본 라우팅 표)')
+    parser.add_argument('--routes', type=Path, default=None, help='라우팅 표 JSON (지정하면 --routing 포함)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='원본이 바뀐 페이지만 섹션 diff로 패치 갱신 (변경이 크면 전체 재생성)')
+    parser.add_argument('--max-diff-ratio', type=float, default=DEFAULT_MAX_DIFF_RATIO,
+                        help='패치로 갱신할 최대 변경 비율 (바뀐 섹션 토큰 / 전체 토큰)')
+    parser.add_argument('--init-snapshots', action='store_true',
+                        help='이미 정제된 페이지의 현재 원본을 diff 기준으로 저장하고 종료')
+    parser.add_argument('--structure-dir', type=Path, default=structure_dir, help='표/리스트 파서 결과 디렉토리')
+    add_ledger_arguments(parser)
+    args = parser.parse_args()
+    routes = load_routes(args.routes) if args.routing or args.routes else None
+
+    raw_files = sorted(args.input.glob('*.txt'))
+    if args.init_snapshots:
+        print(f"📸 diff 기준 원본 저장: {init_snapshots(raw_files, args.output)}개")
+        return
+    print(f"🚀 정제 시작: {len(raw_files)}개 페이지 (동시 {args.concurrency}, RPM {args.rpm}, TPM {args.tpm})")
+
+    cache = None if args.no_cache else ResponseCache()
+    ledger = ledger_from_args(args)
+    started = time.perf_counter()
+    try:
+        summary = asyncio.run(clean_pages(
+            raw_files, args.output, args.concurrency, args.rpm, args.tpm, args.max_retries, args.overwrite, cache,
+            args.long_page_tokens, args.chunk_tokens, args.reduce, ledger, routes, args.structure_dir,
+            args.incremental, args.max_diff_ratio,
+        ))
+    finally:
+        if cache is not None:
+            cache.print_stats()
+            cache.close()
+
+    # 실패 목록은 병합 대상 디렉토리 밖에 저장 (merge_llm_response_to_one_jsonl.py가 읽지 않도록)
+    failures_path = args.output.parent / FAILURES_FILENAME
+    if summary['failures']:
+        failures_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(failures_path, 'w', encoding='utf-8') as f:
+            json.dump(summary['failures'], f, ensure_ascii=False, indent=4)
+
+    print(f"\n{'='*60}")
+    print(f"📊 작업 완료 요약 ({time.perf_counter() - started:.1f}s):")
+    print(f"   ✅ 성공: {summary['success']}개 (캐시 {summary['cached']}개)")
+    print(f"   ⏭️  건너뜀: {summary['skipped']}개")
+    print(f"   ❌ 실패: {len(summary['failures'])}개")
+    if summary['failures']:
+        print(f"   📝 실패 목록: {failures_path}")
+    if args.incremental:
+        modes = summary['modes']
+        print(f"   🩹 패치 갱신: {modes.get('patch', 0)}개, 전체 재생성: {modes.get('full', 0)}개, "
+              f"섹션 변경 없음: {modes.get('unchanged', 0)}개")
+    for route_name, count in sorted(summary['routes'].items()):
+        print(f"   🧭 route {route_name}: {count}개")
+    print(f"   💰 비용: ${ledger.run_cost:.4f} ({ledger.run_tokens} tokens, run {ledger.run_id})")
+    budget_failures = sum(1 for f in summary['failures'] if f['error'].startswith('BudgetExceededError'))
+    if budget_failures:
+        print(f"   ⚠️  예산 상한으로 중단된 페이지: {budget_failures}개")
+    print(f"{'='*60}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+# coding=utf-8
+"""
+OpenAI Batch API로 data/raw/*.txt 페이지들을 일괄 정제하는 스크립트
+
+전체 재적재처럼 응답 지연이 중요하지 않은 경우, 동기 chat.completions 호출 대신
+Batch API(약 50% 저렴, 별도 한도)를 사용한다.
+
+1. submit: 원본 텍스트로 batch 입력 JSONL을 만들고 업로드 후 batch 생성 (작업 정보는 상태 파일에 기록)
+2. collect: batch 완료를 기다린 뒤 결과를 페이지별 JSON으로 분리 저장
+   (main.py와 같은 형식이라 merge_llm_response_to_one_jsonl.py로 그대로 병합 가능)
+3. run: submit + collect
+
+--base-url로 로컬 stub 서버(batch_stub_server.py)를 지정하면 실제 API 없이 전체 흐름을 확인할 수 있다.
+
+Usage:
+    python batch_cleaning.py run
+    python batch_cleaning.py submit
+    python batch_cleaning.py collect --poll-interval 60
+    python batch_cleaning.py run --base-url http://127.0.0.1:8765/v1
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from openai import OpenAI
+
+from main import (
+    MODEL,
+    OPENAI_API_KEY,
+    RESPONSE_FORMAT,
+    build_messages,
+    cache_key_for,
+    extract_page_id_from_basename,
+    load_file,
+    load_system_prompt,
+    processed_dir,
+    raw_dir,
+    save_result,
+    validate_or_repair,
+)
+from page_schema import PageValidationError, is_valid_content, validate_content
+from response_cache import ResponseCache
+from monitoring.usage_ledger import UsageLedger
+
+BATCH_ENDPOINT = '/v1/chat/completions'
+COMPLETION_WINDOW = '24h'
+# Batch API 입력 파일 한도 (요청 50,000건 / 200MB) 보다 여유 있게 분할
+MAX_REQUESTS_PER_BATCH = 50_000
+MAX_BYTES_PER_BATCH = 190 * 1024 * 1024
+TERMINAL_STATUSES = {'completed', 'failed', 'expired', 'cancelled'}
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+batch_dir = ROOT_DIR / 'data' / 'batch'
+state_path = batch_dir / 'batch_jobs.json'
+FAILURES_FILENAME = 'batch_cleaning_failures.json'
+
+
+def custom_id_for(page_id: str) -> str:
+    return f"page_{page_id}"
+
+
+def page_id_from_custom_id(custom_id: str) -> str:
+    return custom_id[len('page_'):] if custom_id.startswith('page_') else custom_id
+
+
+def build_batch_request(page_id: str, raw_contract_data: str, system_prompt: str) -> Dict[str, Any]:
+    """batch 입력 JSONL 한 줄 (동기 버전과 같은 model/messages/response_format)"""
+    return {
+        'custom_id': custom_id_for(page_id),
+        'method': 'POST',
+        'url': BATCH_ENDPOINT,
+        'body': {
+            'model': MODEL,
+            'messages': build_messages(system_prompt, raw_contract_data),
+            'response_format': RESPONSE_FORMAT,
+        },
+    }
+
+
+def keys_path_for(batch_path: Path) -> Path:
+    """batch 입력 파일의 custom_id -> 응답 캐시 키 매핑 파일"""
+    return batch_path.with_name(batch_path.stem + '.keys.json')
+
+
+def build_batch_files(raw_files: List[Path], output_dir: Path, cache: ResponseCache = None,
+                      results_dir: Path = None) -> List[Path]:
+    """
+    원본 텍스트들로 batch 입력 JSONL 파일(들)을 생성 (한도를 넘으면 여러 파일로 분할)
+
+    cache에 유효한(스키마 검증을 통과하는) 응답이 있는 페이지는 batch에 넣지 않고 results_dir에 바로 저장한다.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    system_prompt = load_system_prompt()
+
+    batch_files = []
+    cache_keys = {}
+    current, current_count, current_bytes = None, 0, 0
+
+    def close_current():
+        if current is not None:
+            current.close()
+            with open(keys_path_for(batch_files[-1]), 'w', encoding='utf-8') as f:
+                json.dump(cache_keys, f)
+
+    cached_count = 0
+    for raw_file in raw_files:
+        page_id = extract_page_id_from_basename(raw_file.stem)
+        raw_contract_data = load_file(raw_file)
+        cache_key = cache_key_for(system_prompt, raw_contract_data)
+        if cache is not None and results_dir is not None:
+            cached = cache.get(cache_key)
+            # 스키마 검증에 실패하는 캐시 항목은 miss로 보고 batch에 넣음 (main.py/async_cleaning.py와 같음)
+            if cached is not None and is_valid_content(cached):
+                save_result(page_id, cached, results_dir / f"page_{page_id}_body_text.json")
+                cached_count += 1
+                continue
+
+        line = json.dumps(build_batch_request(page_id, raw_contract_data, system_prompt), ensure_ascii=False) + '\n'
+        line_bytes = len(line.encode('utf-8'))
+
+        if current is None or current_count >= MAX_REQUESTS_PER_BATCH or current_bytes + line_bytes > MAX_BYTES_PER_BATCH:
+            close_current()
+            batch_path = output_dir / f"batch_input_{int(time.time())}_{len(batch_files) + 1}.jsonl"
+            current = open(batch_path, 'w', encoding='utf-8')
+            batch_files.append(batch_path)
+            cache_keys = {}
+            current_count, current_bytes = 0, 0
+
+        current.write(line)
+        cache_keys[custom_id_for(page_id)] = cache_key
+        current_count += 1
+        current_bytes += line_bytes
+
+    close_current()
+    if cached_count:
+        print(f"🗄️  캐시된 응답 {cached_count}개는 batch에서 제외")
+    return batch_files
+
+
+def load_state() -> Dict[str, Any]:
+    if state_path.exists():
+        with open(state_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {'batches': []}
+
+
+def save_state(state: Dict[str, Any]):
+    state_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(state_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=4)
+
+
+def submit_batches(client: OpenAI, raw_files: List[Path], cache: ResponseCache = None,
+                   results_dir: Path = None) -> List[Dict[str, Any]]:
+    """batch 입력 파일을 업로드하고 batch를 생성한 뒤 상태 파일에 기록"""
+    state = load_state()
+    submitted = []
+    for batch_path in build_batch_files(raw_files, batch_dir, cache, results_dir):
+        with open(batch_path, 'rb') as f:
+            input_file = client.files.create(file=f, purpose='batch')
+        batch = client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=COMPLETION_WINDOW,
+            metadata={'stage': 'cleaning', 'source': batch_path.name},
+        )
+        job = {
+            'batch_id': batch.id,
+            'input_file': str(batch_path),
+            'input_file_id': input_file.id,
+            'status': batch.status,
+            'collected': False,
+        }
+        state['batches'].append(job)
+        submitted.append(job)
+        print(f"📤 batch 제출: {batch.id} ({batch_path.name})")
+    save_state(state)
+    return submitted
+
+
+def wait_for_batch(client: OpenAI, batch_id: str, poll_interval: float = 60, timeout: float = None):
+    """batch가 종료 상태가 될 때까지 주기적으로 조회"""
+    started = time.monotonic()
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        counts = getattr(batch, 'request_counts', None)
+        progress = f" ({counts.completed}/{counts.total})" if counts else ''
+        print(f"⏳ {batch_id}: {batch.status}{progress}")
+        if batch.status in TERMINAL_STATUSES:
+            return batch
+        if timeout is not None and time.monotonic() - started > timeout:
+            return batch
+        time.sleep(poll_interval)
+
+
+def split_batch_output(output_text: str, output_dir: Path, cache: ResponseCache = None,
+                       cache_keys: Dict[str, str] = None, ledger: UsageLedger = None,
+                       repair_client: OpenAI = None) -> Dict[str, Any]:
+    """
+    batch 결과 JSONL을 페이지별 결과 파일로 분리 (cache_keys가 있으면 응답 캐시에도 저장)
+
+    응답은 스키마로 검증하고, 실패하면 repair_client로 검증 오류만 담은 수리 요청을 보낸다
+    (repair_client가 없으면 실패로 처리). ledger가 있으면 응답별 usage를 batch 할인 가격으로 기록한다 (batch는 요청별 지연 시간이 없음).
+    """
+    success, failures = 0, []
+    for line in output_text.splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        page_id = page_id_from_custom_id(record['custom_id'])
+        response = record.get('response') or {}
+        if record.get('error') or response.get('status_code') != 200:
+            failures.append({
+                'page_id': page_id,
+                'status_code': response.get('status_code'),
+                'error': record.get('error') or response.get('body', {}).get('error'),
+            })
+            continue
+
+        body = response['body']
+        if ledger is not None:
+            ledger.record('cleaning', body.get('model', MODEL), page_id=page_id, usage=body.get('usage'), batch=True)
+        content = body['choices'][0]['message']['content']
+        try:
+            if repair_client is None:
+                _, errors = validate_content(content)
+                if errors:
+                    raise PageValidationError(page_id, errors)
+            else:
+                content = validate_or_repair(content, page_id, ledger, repair_client)
+        except PageValidationError as e:
+            failures.append({'page_id': page_id, 'status_code': 200, 'error': str(e)})
+            continue
+
+        if cache is not None and cache_keys and record['custom_id'] in cache_keys:
+            cache.put(cache_keys[record['custom_id']], content)
+        save_result(page_id, content, output_dir / f"page_{page_id}_body_text.json")
+        success += 1
+    return {'success': success, 'failures': failures}
+
+
+def collect_batches(client: OpenAI, output_dir: Path, poll_interval: float = 60, timeout: float = None,
+                    cache: ResponseCache = None, ledger: UsageLedger = None) -> Dict[str, Any]:
+    """상태 파일의 미수집 batch들을 기다렸다가 결과를 페이지별로 저장"""
+    state = load_state()
+    summary = {'success': 0, 'failures': [], 'pending': []}
+    for job in state['batches']:
+        if job.get('collected'):
+            continue
+
+        batch = wait_for_batch(client, job['batch_id'], poll_interval, timeout)
+        job['status'] = batch.status
+        if batch.status not in TERMINAL_STATUSES:
+            summary['pending'].append(job['batch_id'])
+            continue
+
+        cache_keys = {}
+        keys_path = keys_path_for(Path(job['input_file']))
+        if keys_path.exists():
+            with open(keys_path, 'r', encoding='utf-8') as f:
+                cache_keys = json.load(f)
+
+        if batch.output_file_id:
+            output_text = client.files.content(batch.output_file_id).text
+            result = split_batch_output(output_text, output_dir, cache, cache_keys, ledger, client)
+            summary['success'] += result['success']
+            summary['failures'].extend(result['failures'])
+        if batch.error_file_id:
+            # 요청 단위 오류 (예: 잘못된 body) 는 error 파일에 따로 담겨 옴
+            result = split_batch_output(client.files.content(batch.error_file_id).text, output_dir)
+            summary['failures'].extend(result['failures'])
+        if batch.status != 'completed':
+            summary['failures'].append({'batch_id': job['batch_id'], 'status': batch.status})
+
+        job['collected'] = True
+        save_state(state)
+
+    return summary
+
+
+def print_summary(summary: Dict[str, Any]):
+    if summary['failures']:
+        failures_path = batch_dir / FAILURES_FILENAME
+        failures_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(failures_path, 'w', encoding='utf-8') as f:
+            json.dump(summary['failures'], f, ensure_ascii=False, indent=4)
+
+    print(f"\n{'='*60}")
+    print(f"📊 batch 정제 요약:")
+    print(f"   ✅ 성공: {summary['success']}개")
+    print(f"   ❌ 실패: {len(summary['failures'])}개")
+    if summary['pending']:
+        print(f"   ⏳ 진행 중 batch: {', '.join(summary['pending'])}")
+    if summary['failures']:
+        print(f"   📝 실패 목록: {batch_dir / FAILURES_FILENAME}")
+    print(f"{'='*60}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='OpenAI Batch API 기반 일괄 정제')
+    parser.add_argument('command', choices=['submit', 'collect', 'run'])
+    parser.add_argument('--input', type=Path, default=raw_dir, help='원본 텍스트 디렉토리')
+    parser.add_argument('--output', type=Path, default=processed_dir, help='정제 결과 디렉토리')
+    parser.add_argument('--poll-interval', type=float, default=60, help='상태 조회 간격 (초)')
+    parser.add_argument('--timeout', type=float, default=None, help='collect 최대 대기 시간 (초)')
+    parser.add_argument('--base-url', default=None, help='API base URL (로컬 stub 서버 테스트용)')
+    parser.add_argument('--no-cache', action='store_true', help='응답 캐시를 사용하지 않음')
+    args = parser.parse_args()
+
+    client = OpenAI(api_key=OPENAI_API_KEY, base_url=args.base_url)
+    cache = None if args.no_cache else ResponseCache()
+    ledger = UsageLedger()
+
+    if args.command in ('submit', 'run'):
+        raw_files = sorted(args.input.glob('*.txt'))
+        if not raw_files:
+            print(f"정제할 원본 파일이 없습니다: {args.input}")
+            sys.exit(1)
+        submit_batches(client, raw_files, cache, args.output)
+
+    if args.command in ('collect', 'run'):
+        print_summary(collect_batches(client, args.output, args.poll_interval, args.timeout, cache, ledger))
+        print(f"💰 batch 비용: ${ledger.run_cost:.4f} ({ledger.run_tokens} tokens, run {ledger.run_id})")
+
+    if cache is not None:
+        cache.print_stats()
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+# coding=utf-8
+"""
+batch_cleaning.py를 실제 API 없이 확인하기 위한 로컬 Batch API stub 서버
+
+지원 엔드포인트 (OpenAI API와 같은 경로/응답 형태):
+    POST /v1/files                 batch 입력 파일 업로드 (multipart)
+    POST /v1/batches               batch 생성
+    GET  /v1/batches/{batch_id}    batch 상태 조회 (생성 후 첫 조회는 in_progress, 이후 completed)
+    GET  /v1/files/{file_id}/content  결과 파일 다운로드
+
+각 요청에는 user 메시지 앞부분을 summary로 담은 JSON을 응답하고,
+user 메시지에 STUB_FAIL 문자열이 있으면 500 오류 응답을 만든다.
+
+Usage:
+    python batch_stub_server.py --port 8765
+    python batch_cleaning.py run --base-url http://127.0.0.1:8765/v1 --poll-interval 1
+"""
+import argparse
+import json
+import re
+import time
+import uuid
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FILES = {}
+BATCHES = {}
+
+
+def _new_id(prefix: str) -> str:
+    return f"{prefix}-{uuid.uuid4().hex[:12]}"
+
+
+def _file_object(file_id: str) -> dict:
+    file = FILES[file_id]
+    return {
+        'id': file_id,
+        'object': 'file',
+        'bytes': len(file['content']),
+        'created_at': file['created_at'],
+        'filename': file['filename'],
+        'purpose': file['purpose'],
+        'status': 'processed',
+    }
+
+
+def _fake_completion(request: dict) -> dict:
+    """요청 하나에 대한 batch 결과 줄 생성"""
+    body = request['body']
+    user_content = next((m['content'] for m in body['messages'] if m['role'] == 'user'), '')
+    if 'STUB_FAIL' in user_content:
+        return {
+            'id': _new_id('batch_req'),
+            'custom_id': request['custom_id'],
+            'response': {'status_code': 500, 'request_id': _new_id('req'), 'body': {'error': {'message': 'stub failure'}}},
+            'error': None,
+        }
+    content = json.dumps({'summary': user_content.split('\n\n', 1)[-1][:200]}, ensure_ascii=False)
+    return {
+        'id': _new_id('batch_req'),
+        'custom_id': request['custom_id'],
+        'response': {
+            'status_code': 200,
+            'request_id': _new_id('req'),
+            'body': {
+                'id': _new_id('chatcmpl'),
+                'object': 'chat.completion',
+                'model': body['model'],
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': len(user_content) // 3, 'completion_tokens': len(content) // 3,
+                          'total_tokens': (len(user_content) + len(content)) // 3},
+            },
+        },
+        'error': None,
+    }
+
+
+def _complete_batch(batch: dict):
+    input_text = FILES[batch['input_file_id']]['content'].decode('utf-8')
+    requests = [json.loads(line) for line in input_text.splitlines() if line.strip()]
+    output_lines = [json.dumps(_fake_completion(r), ensure_ascii=False) for r in requests]
+
+    output_file_id = _new_id('file')
+    FILES[output_file_id] = {
+        'content': ('\n'.join(output_lines) + '\n').encode('utf-8'),
+        'filename': 'batch_output.jsonl',
+        'purpose': 'batch_output',
+        'created_at': int(time.time()),
+    }
+    failed = sum(1 for line in output_lines if '"status_code": 200' not in line)
+    batch.update({
+        'status': 'completed',
+        'output_file_id': output_file_id,
+        'completed_at': int(time.time()),
+        'request_counts': {'total': len(requests), 'completed': len(requests) - failed, 'failed': failed},
+    })
+
+
+class BatchStubHandler(BaseHTTPRequestHandler):
+    def _send_json(self, payload: dict, status: int = 200):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def do_POST(self):
+        if self.path.rstrip('/') == '/v1/files':
+            raw = self._read_body()
+            message = BytesParser(policy=default_policy).parsebytes(
+                f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode('utf-8') + raw
+            )
+            fields = {part.get_param('name', header='content-disposition'): part for part in message.iter_parts()}
+            file_part = fields['file']
+            file_id = _new_id('file')
+            FILES[file_id] = {
+                'content': file_part.get_payload(decode=True),
+                'filename': file_part.get_filename() or 'upload.jsonl',
+                'purpose': fields['purpose'].get_content().strip() if 'purpose' in fields else 'batch',
+                'created_at': int(time.time()),
+            }
+            return self._send_json(_file_object(file_id))
+
+        if self.path.rstrip('/') == '/v1/batches':
+            body = json.loads(self._read_body() or b'{}')
+            if body.get('input_file_id') not in FILES:
+                return self._send_json({'error': {'message': 'input file not found'}}, 404)
+            batch_id = _new_id('batch')
+            BATCHES[batch_id] = {
+                'id': batch_id,
+                'object': 'batch',
+                'endpoint': body['endpoint'],
+                'completion_window': body['completion_window'],
+                'input_file_id': body['input_file_id'],
+                'metadata': body.get('metadata'),
+                'status': 'validating',
+                'created_at': int(time.time()),
+                'output_file_id': None,
+                'error_file_id': None,
+                'request_counts': {'total': 0, 'completed': 0, 'failed': 0},
+            }
+            return self._send_json(BATCHES[batch_id])
+
+        self._send_json({'error': {'message': f'unknown path {self.path}'}}, 404)
+
+    def do_GET(self):
+        match = re.fullmatch(r'/v1/batches/([\w-]+)', self.path)
+        if match and match.group(1) in BATCHES:
+            batch = BATCHES[match.group(1)]
+            # 첫 조회는 진행 중으로 응답해 polling 경로도 확인할 수 있게 함
+            if batch['status'] == 'validating':
+                batch['status'] = 'in_progress'
+            elif batch['status'] == 'in_progress':
+                _complete_batch(batch)
+            return self._send_json(batch)
+
+        match = re.fullmatch(r'/v1/files/([\w-]+)/content', self.path)
+        if match and match.group(1) in FILES:
+            data = FILES[match.group(1)]['content']
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/octet-stream')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+
+        self._send_json({'error': {'message': f'unknown path {self.path}'}}, 404)
+
+    def log_message(self, format, *args):
+        print(f"[stub] {self.command} {self.path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='로컬 Batch API stub 서버')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), BatchStubHandler)
+    print(f"🧪 Batch API stub 서버 실행 중: http://{args.host}:{args.port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
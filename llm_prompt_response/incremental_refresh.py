@@ -0,0 +1,160 @@
+# coding=utf-8
+"""
+수정된 페이지의 차분(diff) 기반 정제 갱신
+
+정제에 성공할 때마다 사용한 원본 텍스트를 snapshot_dir에 보관해 두고, 갱신 시에는
+이전 원본과 새 원본을 섹션 단위(long_page_cleaning.split_sections)로 비교하여
+바뀐 섹션과 이전 정제 결과만 보내 JSON Merge Patch(RFC 7396)를 받는다.
+패치를 이전 결과에 적용한 뒤 스키마 검증(page_schema)을 거쳐 저장한다.
+
+바뀐 분량이 max_diff_ratio를 넘으면 패치보다 전체 재생성이 정확하므로 호출하는 쪽에서 전체 정제로 넘어간다.
+"""
+import asyncio
+import difflib
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from openai import AsyncOpenAI
+
+from long_page_cleaning import split_sections
+from main import RESPONSE_FORMAT
+from rate_limit import COMPLETION_TOKEN_RATIO, RequestPacer, call_with_retry, estimate_tokens
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+snapshot_dir = ROOT_DIR / 'data' / 'raw_snapshots'
+
+# 바뀐 섹션 토큰이 전체의 이 비율을 넘으면 전체 재생성
+DEFAULT_MAX_DIFF_RATIO = 0.3
+
+PATCH_INSTRUCTION = (
+    "아래는 이미 정제된 문서의 이전 JSON 결과와, 원본 문서에서 바뀐 부분이야. "
+    "바뀐 부분을 반영하기 위해 이전 결과에서 고쳐야 할 필드만 담은 JSON Merge Patch(RFC 7396) 객체를 출력해. "
+    "바뀌지 않은 필드는 넣지 말고, 삭제할 필드는 null로, 목록 필드를 고칠 때는 목록 전체를 새 값으로 넣어줘. "
+    "summary가 바뀐 내용의 영향을 받으면 summary도 다시 작성해."
+)
+
+
+def snapshot_path_for(raw_file: Path, base_dir: Path = None) -> Path:
+    return (base_dir or snapshot_dir) / raw_file.name
+
+
+def save_snapshot(raw_file: Path, raw_contract_data: str, base_dir: Path = None):
+    """정제에 사용한 원본 텍스트를 보관 (다음 갱신 때 diff 기준)"""
+    path = snapshot_path_for(raw_file, base_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(raw_contract_data)
+
+
+def load_snapshot(raw_file: Path, base_dir: Path = None) -> Optional[str]:
+    path = snapshot_path_for(raw_file, base_dir)
+    if not path.exists():
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def load_previous_content(output_path: Path) -> Optional[Dict[str, Any]]:
+    """main.save_result로 저장된 이전 정제 결과의 content (dict가 아니면 None)"""
+    if not output_path.exists():
+        return None
+    try:
+        with open(output_path, 'r', encoding='utf-8') as f:
+            content = json.load(f).get('content')
+    except (json.JSONDecodeError, AttributeError):
+        return None
+    return content if isinstance(content, dict) else None
+
+
+def diff_sections(old_text: str, new_text: str) -> Dict[str, Any]:
+    """
+    섹션 단위 diff
+
+    Returns:
+        {'removed': [이전 섹션], 'added': [새 섹션], 'changed_tokens': int, 'total_tokens': int, 'ratio': float}
+        total_tokens는 이전/새 원본 토큰의 합
+    """
+    old_sections = split_sections(old_text)
+    new_sections = split_sections(new_text)
+    matcher = difflib.SequenceMatcher(a=old_sections, b=new_sections, autojunk=False)
+
+    removed, added = [], []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            continue
+        removed.extend(old_sections[i1:i2])
+        added.extend(new_sections[j1:j2])
+
+    # 바뀐 섹션의 이전+이후 토큰을 양쪽 전체 토큰으로 나눔 (0~1, 한 섹션만 고치면 대략 그 섹션의 비중)
+    changed_tokens = sum(estimate_tokens(section) for section in removed + added)
+    total_tokens = max(1, estimate_tokens(old_text) + estimate_tokens(new_text))
+    return {
+        'removed': removed,
+        'added': added,
+        'changed_tokens': changed_tokens,
+        'total_tokens': total_tokens,
+        'ratio': changed_tokens / total_tokens,
+    }
+
+
+def build_patch_messages(system_prompt: str, previous: Dict[str, Any], diff: Dict[str, Any]) -> List[Dict[str, str]]:
+    removed = '\n\n'.join(diff['removed']) or '(없음)'
+    added = '\n\n'.join(diff['added']) or '(없음)'
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": (
+            f"{PATCH_INSTRUCTION}\n\n"
+            f"[이전 결과]\n{json.dumps(previous, ensure_ascii=False)}\n\n"
+            f"[삭제되거나 바뀌기 전 섹션]\n{removed}\n\n"
+            f"[추가되거나 바뀐 뒤 섹션]\n{added}"
+        )},
+    ]
+
+
+def apply_merge_patch(target: Any, patch: Any) -> Any:
+    """JSON Merge Patch(RFC 7396) 적용 (target은 변경하지 않음)"""
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = apply_merge_patch(result.get(key), value)
+    return result
+
+
+async def refresh_with_patch(
+    client: AsyncOpenAI,
+    pacer: RequestPacer,
+    semaphore: asyncio.Semaphore,
+    page_id: str,
+    previous: Dict[str, Any],
+    diff: Dict[str, Any],
+    system_prompt: str,
+    model: str,
+    max_retries: int = 5,
+    ledger: Any = None,
+    route: str = None,
+) -> Optional[str]:
+    """
+    바뀐 섹션과 이전 결과만 보내 받은 패치를 이전 결과에 적용
+
+    Returns:
+        패치를 적용한 JSON 문자열. 응답이 JSON 객체가 아니면 None (호출하는 쪽에서 전체 재생성)
+    """
+    messages = build_patch_messages(system_prompt, previous, diff)
+    estimated = int(sum(estimate_tokens(m['content']) for m in messages) * (1 + COMPLETION_TOKEN_RATIO))
+    response = await call_with_retry(
+        lambda: client.chat.completions.create(model=model, messages=messages, response_format=RESPONSE_FORMAT),
+        pacer, estimated, max_retries, label=f"{page_id}#patch", semaphore=semaphore,
+        ledger=ledger, stage='cleaning_patch', page_id=page_id, model=model, route=route,
+    )
+    try:
+        patch = json.loads(response.choices[0].message.content)
+    except (TypeError, json.JSONDecodeError):
+        return None
+    if not isinstance(patch, dict):
+        return None
+    return json.dumps(apply_merge_patch(previous, patch), ensure_ascii=False)
@@ -0,0 +1,224 @@
+# coding=utf-8
+"""
+모델 컨텍스트/출력 한도를 넘는 긴 페이지를 map-reduce로 정제하는 모듈
+
+1. split: 원본 텍스트를 섹션 경계(빈 줄, "1. 프로젝트 개요" 같은 번호 헤딩)로 나누고
+   토큰 예산(chunk_tokens) 안에 들어가도록 묶는다. 한 섹션이 예산보다 크면 문장/공백 단위로 자른다.
+2. map: chunk마다 같은 정제 프롬프트를 동시에 호출 (pacer/세마포어 공유)
+3. reduce: chunk별 JSON 결과를 결정적 규칙으로 병합하거나(deterministic),
+   병합 프롬프트로 한 번 더 호출(llm)하여 하나의 JSON으로 만든다.
+
+페이지 전체 소요 시간은 전체 길이가 아니라 (chunk 수 / 동시성)에 비례한다.
+"""
+import asyncio
+import json
+import re
+from typing import Any, Dict, List, Tuple
+
+from openai import AsyncOpenAI
+
+from main import MODEL, RESPONSE_FORMAT
+from rate_limit import COMPLETION_TOKEN_RATIO, RequestPacer, call_with_retry, estimate_tokens
+
+DEFAULT_CHUNK_TOKENS = 6000
+# 추정 입력 토큰이 이 값을 넘는 페이지만 map-reduce로 처리
+DEFAULT_LONG_PAGE_TOKENS = 12000
+
+# 빈 줄 또는 "1. ", "2.3 ", "2.3. " 같은 번호 헤딩 앞에서 섹션을 나눔 (하위 번호가 없으면 끝의 점 필요: "3 개월"은 제외)
+# (parse_text_only_from_html.py 결과는 공백으로 이어붙인 한 줄이라 번호 헤딩 경계가 주로 쓰임)
+SECTION_BOUNDARY_PATTERN = re.compile(r'\n\s*\n|(?<=\s)(?=\d{1,2}(?:(?:\.\d{1,2})+\.?|\.)\s+\S)')
+SENTENCE_BOUNDARY_PATTERN = re.compile(r'(?<=[.!?。])\s+|\n')
+# 다음 조각이 들어가지 않아 chunk를 닫을 때, 이 비율보다 작으면 다음 조각 앞부분으로 채움
+# (짧은 서문만으로 시스템 프롬프트 전체를 보내는 요청이 생기지 않도록)
+MIN_CHUNK_RATIO = 0.25
+
+REDUCE_INSTRUCTION = (
+    "아래는 하나의 긴 문서를 여러 부분으로 나누어 각각 정제한 JSON 결과들이야. "
+    "같은 스키마의 JSON 객체 하나로 병합해줘. summary는 문서 전체를 요약하도록 다시 작성하고, "
+    "목록 필드는 중복 없이 합치고, 부분 결과에 없는 내용은 추가하지 마."
+)
+
+
+def split_sections(text: str) -> List[str]:
+    """섹션 경계로 텍스트를 나눔 (빈 조각 제외)"""
+    return [section.strip() for section in SECTION_BOUNDARY_PATTERN.split(text) if section and section.strip()]
+
+
+def _split_oversized(section: str, max_tokens: int) -> List[str]:
+    """예산보다 큰 섹션을 문장 단위로, 그래도 크면 글자 수 기준으로 자름"""
+    pieces = []
+    for sentence in SENTENCE_BOUNDARY_PATTERN.split(section):
+        if not sentence or not sentence.strip():
+            continue
+        if estimate_tokens(sentence) <= max_tokens:
+            pieces.append(sentence.strip())
+            continue
+        # 문장 하나가 예산보다 큰 경우 (표 덤프 등): 바이트 기준으로 균등 분할
+        step = max(1, len(sentence) * max_tokens // estimate_tokens(sentence))
+        pieces.extend(sentence[i:i + step] for i in range(0, len(sentence), step))
+    return pieces
+
+
+def _split_head(text: str, max_tokens: int) -> Tuple[str, str]:
+    """text를 max_tokens 이하의 앞부분과 나머지로 나눔 (가능하면 공백에서)"""
+    cut = len(text) * (max_tokens - 1) // estimate_tokens(text)
+    space = text.rfind(' ', 0, cut)
+    if space > cut // 2:
+        cut = space
+    return text[:cut].strip(), text[cut:].strip()
+
+
+def chunk_text(text: str, max_tokens: int = DEFAULT_CHUNK_TOKENS) -> List[str]:
+    """섹션 경계를 최대한 유지하면서 max_tokens 이하의 chunk로 묶음 (마지막을 빼면 너무 작은 chunk는 만들지 않음)"""
+    chunks, current, current_tokens = [], [], 0
+    for section in split_sections(text):
+        pieces = [section] if estimate_tokens(section) <= max_tokens else _split_oversized(section, max_tokens)
+        for piece in pieces:
+            piece_tokens = estimate_tokens(piece)
+            if current and current_tokens + piece_tokens > max_tokens:
+                if current_tokens < max_tokens * MIN_CHUNK_RATIO:
+                    head, piece = _split_head(piece, max_tokens - current_tokens)
+                    if head:
+                        current.append(head)
+                    piece_tokens = estimate_tokens(piece)
+                chunks.append('\n'.join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += piece_tokens
+    if current:
+        chunks.append('\n'.join(current))
+    return chunks
+
+
+def build_chunk_messages(system_prompt: str, chunk: str, index: int, total: int) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": (
+            f"정제할 데이터는 긴 문서의 {index}/{total} 부분이야. "
+            f"이 부분에 있는 내용만 같은 JSON 형식으로 정제해줘:\n\n{chunk}"
+        )},
+    ]
+
+
+def build_reduce_messages(system_prompt: str, partials: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    partial_text = '\n\n'.join(
+        f"[부분 {i}]\n{json.dumps(partial, ensure_ascii=False)}" for i, partial in enumerate(partials, 1)
+    )
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": f"{REDUCE_INSTRUCTION}\n\n{partial_text}"},
+    ]
+
+
+def _merge_values(left: Any, right: Any) -> Any:
+    if left in (None, '', [], {}):
+        return right
+    if right in (None, '', [], {}):
+        return left
+    if isinstance(left, dict) and isinstance(right, dict):
+        merged = dict(left)
+        for key, value in right.items():
+            merged[key] = _merge_values(merged.get(key), value)
+        return merged
+    if isinstance(left, list) and isinstance(right, list):
+        merged = list(left)
+        seen = {json.dumps(item, ensure_ascii=False, sort_keys=True) for item in left}
+        for item in right:
+            marker = json.dumps(item, ensure_ascii=False, sort_keys=True)
+            if marker not in seen:
+                merged.append(item)
+                seen.add(marker)
+        return merged
+    if isinstance(left, str) and isinstance(right, str):
+        return left if right in left else f"{left}\n{right}"
+    # 숫자/불리언 등은 앞부분의 값을 유지
+    return left
+
+
+def merge_partial_results(partials: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    chunk별 JSON 결과를 순서대로 병합 (API 호출 없음)
+
+    - dict: 키별로 재귀 병합
+    - list: 순서를 유지하며 중복 제거 후 이어붙임
+    - str: 다른 내용이면 줄바꿈으로 이어붙임 (summary 등)
+    - 그 외: 처음 나온 값 유지
+    """
+    merged: Dict[str, Any] = {}
+    for partial in partials:
+        merged = _merge_values(merged, partial)
+    return merged
+
+
+def _parse_partial(content: str, label: str) -> Dict[str, Any]:
+    """chunk 응답 JSON 파싱. 깨진 응답을 빈 결과로 넘기면 그 섹션이 빠진 페이지가 완성본처럼 저장되므로 예외를 던짐"""
+    try:
+        parsed = json.loads(content)
+    except (TypeError, json.JSONDecodeError) as e:
+        raise ValueError(f"[{label}] chunk 응답이 올바른 JSON이 아닙니다: {e}") from e
+    if not isinstance(parsed, dict):
+        raise ValueError(f"[{label}] chunk 응답이 JSON 객체가 아닙니다: {type(parsed).__name__}")
+    return parsed
+
+
+async def clean_long_page(
+    client: AsyncOpenAI,
+    pacer: RequestPacer,
+    semaphore: asyncio.Semaphore,
+    page_id: str,
+    raw_contract_data: str,
+    system_prompt: str,
+    max_retries: int = 5,
+    chunk_tokens: int = DEFAULT_CHUNK_TOKENS,
+    reduce_mode: str = 'deterministic',
+    ledger: Any = None,
+    model: str = MODEL,
+    route: str = None,
+) -> str:
+    """
+    긴 페이지를 chunk로 나누어 동시에 정제한 뒤 하나의 JSON 문자열로 병합
+
+    Args:
+        reduce_mode: 'deterministic'(규칙 기반 병합) 또는 'llm'(병합 프롬프트 추가 호출)
+        ledger: chunk/병합 호출을 기록할 UsageLedger (None이면 기록하지 않음)
+        model, route: 사용할 모델과 라우팅 이름 (model_routing)
+
+    Returns:
+        병합된 JSON 문자열 (main.save_result에 그대로 넘길 수 있는 형식)
+
+    Raises:
+        ValueError: chunk 응답이 JSON 객체가 아닌 경우 (일부 섹션이 빠진 결과를 저장하지 않고 페이지를 실패로 처리)
+    """
+    chunks = chunk_text(raw_contract_data, chunk_tokens)
+    print(f"✂️  [{page_id}] 긴 페이지: {len(chunks)}개 chunk로 나누어 정제")
+    system_tokens = estimate_tokens(system_prompt)
+
+    async def clean_chunk(index: int, chunk: str) -> Dict[str, Any]:
+        messages = build_chunk_messages(system_prompt, chunk, index, len(chunks))
+        estimated = int((system_tokens + estimate_tokens(chunk)) * (1 + COMPLETION_TOKEN_RATIO))
+        response = await call_with_retry(
+            lambda: client.chat.completions.create(model=model, messages=messages, response_format=RESPONSE_FORMAT),
+            pacer, estimated, max_retries, label=f"{page_id}#{index}", semaphore=semaphore,
+            ledger=ledger, stage='cleaning_map', page_id=page_id, model=model, route=route,
+        )
+        return _parse_partial(response.choices[0].message.content, f"{page_id}#{index}")
+
+    # 한 chunk가 실패하면 페이지 전체가 실패하므로 남은 chunk 호출은 취소 (비용이 계속 나가지 않도록)
+    try:
+        async with asyncio.TaskGroup() as group:
+            tasks = [group.create_task(clean_chunk(i, chunk)) for i, chunk in enumerate(chunks, 1)]
+    except* Exception as errors:
+        raise errors.exceptions[0]
+    partials = [task.result() for task in tasks]
+
+    if reduce_mode == 'llm' and len(partials) > 1:
+        messages = build_reduce_messages(system_prompt, partials)
+        estimated = int(sum(estimate_tokens(m['content']) for m in messages) * (1 + COMPLETION_TOKEN_RATIO))
+        response = await call_with_retry(
+            lambda: client.chat.completions.create(model=model, messages=messages, response_format=RESPONSE_FORMAT),
+            pacer, estimated, max_retries, label=f"{page_id}#reduce", semaphore=semaphore,
+            ledger=ledger, stage='cleaning_reduce', page_id=page_id, model=model, route=route,
+        )
+        return response.choices[0].message.content
+
+    return json.dumps(merge_partial_results(partials), ensure_ascii=False)
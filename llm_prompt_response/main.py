@@ -1,8 +1,19 @@
 import os
 from openai import OpenAI
 from dotenv import load_dotenv
+from functools import lru_cache
 from pathlib import Path
+import json
 import re
+import sys
+import time
+
+from page_schema import MAX_REPAIR_ATTEMPTS, PageValidationError, build_repair_messages, is_valid_content, validate_content
+from response_cache import ResponseCache, make_cache_key
+
+# 저장소 루트의 공용 모듈(monitoring/) import
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+from monitoring.usage_ledger import UsageLedger
 
 load_dotenv()
 
@@ -10,48 +21,142 @@ OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
 client = OpenAI(api_key=OPENAI_API_KEY)
 
+MODEL = "gpt-4o-mini" # 비용 효율적인 모델 추천
+RESPONSE_FORMAT = { "type": "json_object" } # JSON 출력 강제
+SYSTEM_PROMPT_PATH = Path('prompts/cleaning_prompt.txt')
+
 def load_file(filepath):
     with open(filepath, 'r', encoding='utf-8') as f:
         return f.read()
 
+@lru_cache(maxsize=None)
+def load_system_prompt(prompt_path=SYSTEM_PROMPT_PATH):
+    """프롬프트 파일은 실행 중 바뀌지 않으므로 한 번만 읽어서 재사용"""
+    return load_file(prompt_path)
+
 def extract_page_id_from_basename(basename):
-    match = re.search(r'page_(\d+)_body_text', basename)
+    match = re.search(r'page_(\d+)_body_text', str(basename))
     if match:
         return match.group(1)
         # return int(match.group(1))
     else:
         raise ValueError(f"Invalid basename: {basename}")
 
-def process_contract(raw_text_path, output_path):
+def build_messages(system_prompt, raw_contract_data):
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": f"정제할 데이터는 다음과 같아:\n\n{raw_contract_data}"}
+    ]
+
+def cache_key_for(system_prompt, raw_contract_data, model=MODEL):
+    """응답 캐시 키 (프롬프트, 모델, response_format, 원본 텍스트)"""
+    return make_cache_key(system_prompt, model, RESPONSE_FORMAT, raw_contract_data)
+
+def save_result(page_id, content, output_path):
+    """merge_llm_response_to_one_jsonl.py가 읽는 {page_id, content} 형식으로 저장"""
+    try:
+        content = json.loads(content)
+    except (TypeError, json.JSONDecodeError):
+        # JSON이 아니면 원문 그대로 저장 (후처리 단계에서 확인)
+        pass
+    result = {
+        "page_id": page_id,
+        "content": content
+    }
+    output_path = Path(output_path)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write(json.dumps(result, ensure_ascii=False, indent=4))
+
+def validate_or_repair(content, page_id=None, ledger: UsageLedger = None, repair_client=None, model=MODEL, route=None):
+    """
+    응답을 스키마로 검증하고, 실패하면 검증 오류만 담은 수리 요청을 최대 MAX_REPAIR_ATTEMPTS번 보냄
+
+    수리 후에도 실패하면 PageValidationError
+    """
+    repair_client = repair_client or client
+    _, errors = validate_content(content)
+    attempt = 0
+    while errors and attempt < MAX_REPAIR_ATTEMPTS:
+        attempt += 1
+        print(f"🔧 [{page_id}] 스키마 검증 실패 ({'; '.join(errors)}) - 수리 요청 {attempt}/{MAX_REPAIR_ATTEMPTS}")
+        if ledger is not None:
+            ledger.check_budget()
+        started = time.perf_counter()
+        response = repair_client.chat.completions.create(
+            model=model,
+            messages=build_repair_messages(content, errors),
+            response_format=RESPONSE_FORMAT
+        )
+        if ledger is not None:
+            ledger.record('cleaning_repair', model, page_id=page_id, usage=response.usage,
+                          latency=time.perf_counter() - started, route=route)
+        content = response.choices[0].message.content
+        _, errors = validate_content(content)
+    if errors:
+        raise PageValidationError(page_id, errors)
+    return content
+
+def process_contract(raw_text_path, output_path, cache: ResponseCache = None, ledger: UsageLedger = None,
+                     model=MODEL, route=None):
+    """페이지 하나를 정제하여 저장 (model/route는 model_routing.choose_route 결과를 넘길 수 있음)"""
     # 1. 프롬프트 및 원본 데이터 로드
-    system_prompt = load_file('prompts/cleaning_prompt.txt')
+    system_prompt = load_system_prompt()
     raw_contract_data = load_file(raw_text_path)
+    page_id = extract_page_id_from_basename(raw_text_path)
 
-    # 2. OpenAI API 호출
+    # 2. 같은 입력으로 받은 응답이 있으면 API 호출 없이 재사용
+    cache_key = cache_key_for(system_prompt, raw_contract_data, model)
+    cached = cache.get(cache_key) if cache is not None else None
+    if cached is not None and is_valid_content(cached):
+        if ledger is not None:
+            ledger.record('cleaning', model, page_id=page_id, cache_hit=True, route=route)
+        save_result(page_id, cached, output_path)
+        print(f"캐시 사용: {output_path}")
+        return
+
+    # 3. OpenAI API 호출 (예산을 넘었으면 호출 전에 중단)
+    if ledger is not None:
+        ledger.check_budget()
+    started = time.perf_counter()
     response = client.chat.completions.create(
-        model="gpt-4o-mini", # 비용 효율적인 모델 추천
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": f"정제할 데이터는 다음과 같아:\n\n{raw_contract_data}"}
-        ],
-        response_format={ "type": "json_object" } # JSON 출력 강제
+        model=model,
+        messages=build_messages(system_prompt, raw_contract_data),
+        response_format=RESPONSE_FORMAT
     )
+    if ledger is not None:
+        ledger.record('cleaning', model, page_id=page_id, usage=response.usage,
+                      latency=time.perf_counter() - started, route=route)
+    content = response.choices[0].message.content
 
-    # 3. 결과 저장
-    page_id = extract_page_id_from_basename(raw_text_path)
+    # 4. 스키마 검증 (실패하면 검증 오류만 보내 수리). 검증된 응답만 캐시에 저장
+    content = validate_or_repair(content, page_id, ledger, model=model, route=route)
+    if cache is not None:
+        cache.put(cache_key, content)
+
+    # 5. 결과 저장
     print(f"Page ID: {page_id}")
-    result = {
-        "page_id": page_id,
-        "content": response.choices[0].message.content
-    }
-    with open(output_path, 'w', encoding='utf-8') as f:
-        f.write(result)
+    save_result(page_id, content, output_path)
     print(f"정제 완료: {output_path}")
 
 # 실행 예시
 raw_dir = Path('data/raw')
 processed_dir = Path('data/processed')
 
-for raw_file in raw_dir.glob('*.txt'):
-    processed_file = processed_dir / f"{raw_file.stem}.json"
-    process_contract(raw_file, processed_file)
\ No newline at end of file
+def main():
+    cache = ResponseCache()
+    ledger = UsageLedger(budget_usd=float(os.getenv("CLEANING_BUDGET_USD")) if os.getenv("CLEANING_BUDGET_USD") else None)
+    try:
+        for raw_file in raw_dir.glob('*.txt'):
+            processed_file = processed_dir / f"{raw_file.stem}.json"
+            try:
+                process_contract(raw_file, processed_file, cache, ledger)
+            except PageValidationError as e:
+                print(f"❌ {e}")
+    finally:
+        print(f"💰 run {ledger.run_id}: ${ledger.run_cost:.4f}, {ledger.run_tokens} tokens")
+        cache.print_stats()
+        cache.close()
+
+if __name__ == "__main__":
+    main()
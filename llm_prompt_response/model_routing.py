@@ -0,0 +1,135 @@
+# coding=utf-8
+"""
+정제 단계의 페이지 크기/구조 기반 모델 라우팅
+
+입력 토큰 수와 파서가 만든 표/리스트 개수(parse_table_to_csv.processed_dir/page_<id>_body/table, list)로
+짧고 단순한 페이지는 빠르고 저렴한 모델로, 길거나 표가 많은 페이지만 상위 모델로 보낸다.
+파서 결과가 없는 페이지는 구조를 알 수 없으므로 경고하고 표/리스트 조건이 있는 route에는 보내지 않는다.
+
+라우팅 표는 위에서부터 검사하여 모든 조건(max_*)을 만족하는 첫 route를 사용한다.
+max_* 값이 null이면 해당 조건은 검사하지 않는다. JSON 파일로 바꿀 수 있다:
+
+    [
+        {"name": "small", "model": "gpt-4.1-nano", "max_tokens": 2000, "max_tables": 0, "max_lists": 5},
+        {"name": "standard", "model": "gpt-4o-mini", "max_tokens": 12000, "max_tables": 10, "max_lists": null},
+        {"name": "complex", "model": "gpt-4o", "max_tokens": null, "max_tables": null, "max_lists": null}
+    ]
+
+Usage:
+    python model_routing.py plan                     # 페이지별 route 분포 미리 보기
+    python model_routing.py plan --routes routes.json
+    python model_routing.py report                   # route/모델별 지연 시간, 비용 (usage ledger 기준)
+"""
+import argparse
+import json
+import sys
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from main import extract_page_id_from_basename, load_file, load_system_prompt, raw_dir
+from rate_limit import estimate_tokens
+from monitoring.usage_ledger import DEFAULT_LEDGER_PATH, aggregate, iter_entries, print_report
+
+# 파서 결과(page_<id>_body/table, list)가 있는 디렉토리. main.processed_dir(정제 결과)와 다른 트리이므로
+# 파서가 쓰는 경로를 그대로 사용
+sys.path.append(str(Path(__file__).resolve().parent.parent / 'processing'))
+from parse_table_to_csv import processed_dir as structure_dir
+
+DEFAULT_ROUTES = [
+    {'name': 'small', 'model': 'gpt-4.1-nano', 'max_tokens': 2000, 'max_tables': 0, 'max_lists': 5},
+    {'name': 'standard', 'model': 'gpt-4o-mini', 'max_tokens': 12000, 'max_tables': 10, 'max_lists': None},
+    {'name': 'complex', 'model': 'gpt-4o', 'max_tokens': None, 'max_tables': None, 'max_lists': None},
+]
+ROUTE_LIMITS = {'max_tokens': 'tokens', 'max_tables': 'tables', 'max_lists': 'lists'}
+
+
+def load_routes(routes_path: Path = None) -> List[Dict[str, Any]]:
+    """라우팅 표 로드 (None이면 DEFAULT_ROUTES). 마지막 route가 모든 페이지를 받을 수 있어야 함"""
+    if routes_path is None:
+        return DEFAULT_ROUTES
+    with open(routes_path, 'r', encoding='utf-8') as f:
+        routes = json.load(f)
+    if not routes or any('name' not in route or 'model' not in route for route in routes):
+        raise ValueError(f"route마다 name과 model이 필요합니다: {routes_path}")
+    if any(routes[-1].get(limit) is not None for limit in ROUTE_LIMITS):
+        raise ValueError(f"마지막 route는 조건이 없어야 합니다 (모든 페이지의 기본 route): {routes_path}")
+    return routes
+
+
+def count_structure(page_id: str, base_dir: Path = None) -> Dict[str, Optional[int]]:
+    """
+    파서가 저장한 페이지의 표/리스트 파일 개수
+
+    파서는 처리한 페이지마다 page_<id>_body 폴더를 만들므로, 폴더가 없으면 0개가 아니라 알 수 없음(None)으로
+    반환하고 경고한다 (표가 많은 페이지가 표 0개 조건의 작은 모델로 가지 않도록).
+    """
+    page_dir = (base_dir or structure_dir) / f"page_{page_id}_body"
+    if not page_dir.is_dir():
+        print(f"⚠️  [{page_id}] 파서 결과가 없습니다 ({page_dir}) - 표/리스트 조건이 있는 route는 건너뜁니다. "
+              f"parse_table_to_csv.py/parse_list_to_markdown.py를 먼저 실행하거나 --structure-dir을 지정하세요.")
+        return {'tables': None, 'lists': None}
+    return {
+        'tables': sum(1 for _ in (page_dir / 'table').glob('*.csv')) if (page_dir / 'table').is_dir() else 0,
+        'lists': sum(1 for _ in (page_dir / 'list').glob('*.md')) if (page_dir / 'list').is_dir() else 0,
+    }
+
+
+def measure_page(page_id: str, raw_contract_data: str, system_prompt: str, base_dir: Path = None) -> Dict[str, int]:
+    """라우팅에 쓰는 페이지 복잡도: 입력 토큰 수 + 표/리스트 개수"""
+    complexity = {'tokens': estimate_tokens(system_prompt) + estimate_tokens(raw_contract_data)}
+    complexity.update(count_structure(page_id, base_dir))
+    return complexity
+
+
+def choose_route(complexity: Dict[str, Optional[int]], routes: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """조건을 모두 만족하는 첫 route (없으면 마지막 route). 값이 None(알 수 없음)인 항목은 그 조건을 만족하지 않음"""
+    routes = routes or DEFAULT_ROUTES
+    for route in routes:
+        if all(route.get(limit) is None or (complexity[field] is not None and complexity[field] <= route[limit])
+               for limit, field in ROUTE_LIMITS.items()):
+            return route
+    return routes[-1]
+
+
+def plan_routes(raw_files: List[Path], routes: List[Dict[str, Any]], base_dir: Path = None) -> Counter:
+    system_prompt = load_system_prompt()
+    counts = Counter()
+    for raw_file in raw_files:
+        page_id = extract_page_id_from_basename(raw_file.stem)
+        route = choose_route(measure_page(page_id, load_file(raw_file), system_prompt, base_dir), routes)
+        counts[(route['name'], route['model'])] += 1
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='정제 단계 모델 라우팅')
+    parser.add_argument('command', choices=['plan', 'report'])
+    parser.add_argument('--routes', type=Path, default=None, help='라우팅 표 JSON (없으면 기본 표)')
+    parser.add_argument('--input', type=Path, default=raw_dir, help='원본 텍스트 디렉토리')
+    parser.add_argument('--structure-dir', type=Path, default=structure_dir, help='파서 결과 디렉토리')
+    parser.add_argument('--ledger', type=Path, default=DEFAULT_LEDGER_PATH, help='usage ledger 경로')
+    parser.add_argument('--run', default=None, help='특정 run_id만 집계')
+    args = parser.parse_args()
+
+    if args.command == 'plan':
+        routes = load_routes(args.routes)
+        counts = plan_routes(sorted(args.input.glob('*.txt')), routes, args.structure_dir)
+        print(f"📊 route 분포 ({sum(counts.values())}개 페이지)")
+        for route in routes:
+            print(f"   {route['name']:<12} {route['model']:<20} {counts[(route['name'], route['model'])]:>6}개")
+        return
+
+    entries = [
+        e for e in iter_entries(args.ledger)
+        if str(e.get('stage', '')).startswith('cleaning') and e.get('route')
+        and (args.run is None or e.get('run_id') == args.run)
+    ]
+    if not entries:
+        print(f"route가 기록된 정제 호출이 없습니다: {args.ledger}")
+        return
+    print_report(aggregate(entries, ['route', 'model']), ['route', 'model'])
+
+
+if __name__ == "__main__":
+    main()
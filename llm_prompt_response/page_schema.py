@@ -0,0 +1,88 @@
+# coding=utf-8
+"""
+정제 결과(LLM 응답 JSON)의 스키마 검증과 부분 수리(repair) 요청 생성
+
+process_processed_to_vector_content.make_vector_content가 content.summary를 사용하므로
+summary가 비어 있거나 JSON이 깨진 응답은 저장 전에 걸러낸다.
+검증에 실패하면 원본 페이지 전체를 다시 보내지 않고, 직전 응답과 검증 오류만 담은
+작은 수리 요청을 보낸다 (재시도 토큰/지연 절감).
+"""
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, ConfigDict, ValidationError, field_validator
+
+# 수리 요청 최대 횟수 (그래도 실패하면 해당 페이지는 실패로 처리)
+MAX_REPAIR_ATTEMPTS = 2
+
+REPAIR_SYSTEM_PROMPT = (
+    "너는 JSON 수리기야. 사용자가 준 JSON이 스키마 검증에 실패했어. "
+    "검증 오류만 고치고 나머지 내용은 그대로 유지한 JSON 객체 하나만 출력해. "
+    "summary는 반드시 문서 내용을 요약한 비어 있지 않은 문자열이어야 해."
+)
+
+
+class PageValidationError(ValueError):
+    """수리 요청 후에도 스키마 검증을 통과하지 못한 응답"""
+
+    def __init__(self, page_id: Any, errors: List[str]):
+        self.page_id = page_id
+        self.errors = errors
+        super().__init__(f"[{page_id}] 스키마 검증 실패: {'; '.join(errors)}")
+
+
+class CleanedPage(BaseModel):
+    """
+    정제된 페이지 JSON
+
+    이후 단계에서 사용하는 필드만 검증하고, 프롬프트가 만드는 나머지 필드는 그대로 통과시킨다.
+    """
+    model_config = ConfigDict(extra='allow')
+
+    summary: str
+
+    @field_validator('summary')
+    @classmethod
+    def summary_not_blank(cls, value: str) -> str:
+        if not value.strip():
+            raise ValueError('summary가 비어 있습니다')
+        return value
+
+
+def _format_error(error: Dict[str, Any]) -> str:
+    location = '.'.join(str(part) for part in error['loc']) or '(root)'
+    return f"{location}: {error['msg']}"
+
+
+def validate_content(content: Optional[str]) -> Tuple[Optional[Dict[str, Any]], List[str]]:
+    """
+    LLM 응답 문자열을 검증
+
+    Returns:
+        (검증된 dict 또는 None, 오류 메시지 목록). 오류가 없으면 목록이 비어 있다.
+    """
+    try:
+        parsed = json.loads(content)
+    except (TypeError, json.JSONDecodeError) as e:
+        return None, [f"JSON 파싱 실패: {e}"]
+    if not isinstance(parsed, dict):
+        return None, [f"최상위 값이 JSON 객체가 아닙니다: {type(parsed).__name__}"]
+
+    try:
+        page = CleanedPage.model_validate(parsed)
+    except ValidationError as e:
+        return None, [_format_error(error) for error in e.errors()]
+    return page.model_dump(), []
+
+
+def is_valid_content(content: Optional[str]) -> bool:
+    return not validate_content(content)[1]
+
+
+def build_repair_messages(content: Optional[str], errors: List[str]) -> List[Dict[str, str]]:
+    """직전 응답과 검증 오류만 담은 수리 요청 (원본 페이지는 보내지 않음)"""
+    error_text = '\n'.join(f"- {error}" for error in errors)
+    return [
+        {"role": "system", "content": REPAIR_SYSTEM_PROMPT},
+        {"role": "user", "content": f"검증 오류:\n{error_text}\n\n수리할 JSON:\n{content or ''}"},
+    ]
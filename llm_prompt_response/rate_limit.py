@@ -0,0 +1,220 @@
+# coding=utf-8
+"""
+OpenAI API 호출 속도 조절 및 재시도 유틸리티
+
+- RequestPacer: 분당 요청 수(RPM)와 분당 토큰 수(TPM)를 토큰 버킷으로 관리하여
+  여러 코루틴이 동시에 호출해도 한도를 넘지 않도록 요청 시작 시점을 늦춘다
+- 429/5xx/네트워크 오류만 재시도 대상으로 보고, Retry-After 헤더가 있으면 우선 사용한다
+- adaptive=True이면 429를 받을 때마다 실제 적용 한도를 줄이고 성공이 이어지면 조금씩 되돌린다 (AIMD)
+"""
+import asyncio
+import contextlib
+import random
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+import openai
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+# 응답 토큰은 입력의 절반 정도로 가정하고 TPM 예산을 미리 잡아둠
+COMPLETION_TOKEN_RATIO = 0.5
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    tokenizer 없이 쓰는 보수적인 토큰 수 추정
+
+    한글은 대략 글자당 1토큰, 영문/숫자는 3~4글자당 1토큰이므로 UTF-8 바이트 수 / 3을 사용한다.
+    """
+    if not text:
+        return 0
+    return len(text.encode('utf-8')) // 3 + 1
+
+
+class RequestPacer:
+    """
+    RPM/TPM 한도를 지키는 비동기 토큰 버킷
+
+    Args:
+        rpm: 분당 최대 요청 수
+        tpm: 분당 최대 토큰 수 (None이면 토큰 한도 미적용)
+        adaptive: 429를 받으면 적용 한도를 줄이고 성공 시 천천히 복구 (공유 한도를 다른 작업과 나눠 쓸 때)
+    """
+
+    # adaptive 모드: 429마다 한도 x0.7, 성공마다 원래 한도의 1%씩 복구, 최저 원래 한도의 10%
+    DECREASE_FACTOR = 0.7
+    INCREASE_STEP = 0.01
+    MIN_RATE_FRACTION = 0.1
+
+    def __init__(self, rpm: int, tpm: Optional[int] = None, adaptive: bool = False):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.adaptive = adaptive
+        self._rate_fraction = 1.0
+        self._requests = float(rpm)
+        self._tokens = float(tpm) if tpm else 0.0
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    @property
+    def effective_rpm(self) -> float:
+        return self.rpm * self._rate_fraction
+
+    @property
+    def effective_tpm(self) -> Optional[float]:
+        return self.tpm * self._rate_fraction if self.tpm else None
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.rpm, self._requests + elapsed * self.effective_rpm / 60)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.effective_tpm / 60)
+
+    async def acquire(self, tokens: int = 0):
+        """요청 1건과 tokens만큼의 예산이 생길 때까지 대기"""
+        # 한 요청이 TPM 전체보다 크면 버킷이 가득 찼을 때 보내도록 상한을 둠
+        if self.tpm:
+            tokens = min(tokens, self.tpm)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+
+                self._refill()
+                token_ok = not self.tpm or self._tokens >= tokens
+                if self._requests >= 1 and token_ok:
+                    self._requests -= 1
+                    if self.tpm:
+                        self._tokens -= tokens
+                    return
+
+                wait = 0.0
+                if self._requests < 1:
+                    wait = max(wait, (1 - self._requests) * 60 / self.effective_rpm)
+                if not token_ok:
+                    wait = max(wait, (tokens - self._tokens) * 60 / self.effective_tpm)
+                await asyncio.sleep(wait)
+
+    def settle(self, estimated_tokens: int, actual_tokens: int):
+        """응답의 실제 usage로 추정치와의 차이를 버킷에 반영"""
+        if self.tpm and actual_tokens is not None:
+            self._tokens = min(self.tpm, self._tokens + estimated_tokens - actual_tokens)
+
+    def pause(self, seconds: float):
+        """429를 받으면 모든 워커의 다음 요청을 잠시 멈춤"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def on_rate_limited(self):
+        """adaptive 모드에서 429를 받으면 적용 한도를 곱셈으로 줄임"""
+        if self.adaptive:
+            self._rate_fraction = max(self.MIN_RATE_FRACTION, self._rate_fraction * self.DECREASE_FACTOR)
+
+    def on_success(self):
+        """adaptive 모드에서 요청이 성공하면 적용 한도를 덧셈으로 조금씩 복구"""
+        if self.adaptive and self._rate_fraction < 1.0:
+            self._rate_fraction = min(1.0, self._rate_fraction + self.INCREASE_STEP)
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """재시도하면 성공할 수 있는 오류인지 여부 (429, 5xx, 타임아웃, 연결 오류)"""
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES or error.status_code >= 500
+    return False
+
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """응답 헤더의 Retry-After(또는 retry-after-ms) 값을 초 단위로 반환"""
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except ValueError:
+        return None
+    return None
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0, error: Exception = None) -> float:
+    """지수 백오프 + full jitter (Retry-After가 있으면 그 값을 우선)"""
+    retry_after = retry_after_seconds(error) if error is not None else None
+    if retry_after is not None:
+        return min(cap, retry_after)
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+async def call_with_retry(
+    request: Callable[[], Awaitable[Any]],
+    pacer: RequestPacer,
+    estimated_tokens: int,
+    max_retries: int = 5,
+    label: str = '',
+    semaphore: asyncio.Semaphore = None,
+    ledger: Any = None,
+    stage: str = 'cleaning',
+    page_id: str = None,
+    model: str = None,
+    route: str = None,
+    kind: str = 'chat',
+) -> Any:
+    """
+    동시성 슬롯과 pacer 예산을 확보한 뒤 request()를 호출하고, 재시도 가능한 오류는 백오프 후 다시 시도
+
+    Args:
+        request: 호출할 때마다 새 API 요청 코루틴을 만드는 함수
+        pacer: RPM/TPM pacer
+        estimated_tokens: 이 요청이 쓸 것으로 예상되는 토큰 수
+        max_retries: 최대 재시도 횟수
+        label: 로그에 표시할 이름 (예: page_id)
+        semaphore: 동시에 진행 중인 요청 수 제한 (None이면 제한 없음)
+        ledger: monitoring.usage_ledger.UsageLedger (None이면 기록하지 않음)
+        stage, page_id, model, route, kind: ledger에 함께 기록할 정보
+
+    Returns:
+        API 응답 객체. 재시도 후에도 실패하면 마지막 예외를 그대로 던진다.
+    """
+    for attempt in range(max_retries + 1):
+        if ledger is not None:
+            # 예산을 넘은 뒤에는 새 요청을 보내지 않음
+            ledger.check_budget()
+        started = time.perf_counter()
+        try:
+            async with semaphore if semaphore is not None else contextlib.nullcontext():
+                # 동시성 슬롯을 얻은 뒤에 예산을 확보 (슬롯을 기다리는 요청들이 RPM/TPM을 미리 가져갔다가 한꺼번에 보내지 않도록)
+                await pacer.acquire(estimated_tokens)
+                started = time.perf_counter()
+                response = await request()
+        except Exception as e:
+            if not is_retryable_error(e) or attempt == max_retries:
+                if ledger is not None:
+                    ledger.record(stage, model, kind=kind, page_id=page_id,
+                                  latency=time.perf_counter() - started, retries=attempt, ok=False,
+                                  error=f"{type(e).__name__}: {e}", label=label, route=route)
+                raise
+            delay = backoff_delay(attempt, error=e)
+            if getattr(e, 'status_code', None) == 429:
+                pacer.pause(delay)
+                pacer.on_rate_limited()
+            print(f"🔁 [{label}] {type(e).__name__} - {delay:.1f}초 후 재시도 ({attempt + 1}/{max_retries})")
+            await asyncio.sleep(delay)
+            continue
+
+        latency = time.perf_counter() - started
+        pacer.on_success()
+        usage = getattr(response, 'usage', None)
+        if usage is not None:
+            pacer.settle(estimated_tokens, usage.total_tokens)
+        if ledger is not None:
+            ledger.record(stage, model or getattr(response, 'model', None), kind=kind, page_id=page_id,
+                          usage=usage, latency=latency, retries=attempt, label=label, route=route)
+        return response
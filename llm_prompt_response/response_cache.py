@@ -0,0 +1,162 @@
+# coding=utf-8
+"""
+LLM 응답을 입력 내용 기준으로 저장해두는 디스크 캐시
+
+키는 hash(프롬프트, 모델, response_format, 입력 텍스트)이므로 프롬프트 파일이나 모델이 바뀌면
+자동으로 다른 키가 되고, 파서 수정 후 재적재해도 입력이 바뀐 페이지만 API를 다시 호출한다.
+
+- 저장소: SQLite 파일 하나 (여러 프로세스에서 동시에 열어도 안전)
+- 크기 제한: 전체 응답 크기가 max_bytes를 넘으면 가장 오래 사용되지 않은 항목부터 삭제 (LRU)
+- 통계: 이번 실행과 누적 hit/miss 수
+
+Usage:
+    python response_cache.py stats
+    python response_cache.py clear
+"""
+import argparse
+import hashlib
+import json
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_CACHE_PATH = ROOT_DIR / 'data' / 'llm_cache.sqlite3'
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def make_cache_key(system_prompt: str, model: str, response_format: Any, input_text: str) -> str:
+    """프롬프트/모델/응답 형식/입력 텍스트로 만든 sha256 키"""
+    payload = json.dumps(
+        [system_prompt, model, response_format, input_text],
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    크기 제한이 있는 LRU 디스크 캐시
+
+    Args:
+        path: SQLite 파일 경로
+        max_bytes: 저장할 응답 크기의 상한 (바이트)
+    """
+
+    def __init__(self, path: Path = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            ' key TEXT PRIMARY KEY,'
+            ' value TEXT NOT NULL,'
+            ' size INTEGER NOT NULL,'
+            ' created_at REAL NOT NULL,'
+            ' last_access REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS responses_last_access ON responses(last_access)')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+
+    def _bump_stat(self, name: str):
+        self._conn.execute(
+            'INSERT INTO stats(name, value) VALUES (?, 1) ON CONFLICT(name) DO UPDATE SET value = value + 1',
+            (name,),
+        )
+
+    def get(self, key: str) -> Optional[str]:
+        """캐시된 응답을 반환 (없으면 None). 조회 시 최근 사용 시각을 갱신"""
+        row = self._conn.execute('SELECT value FROM responses WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            self._bump_stat('misses')
+            return None
+        self._conn.execute('UPDATE responses SET last_access = ? WHERE key = ?', (time.time(), key))
+        self.hits += 1
+        self._bump_stat('hits')
+        return row[0]
+
+    def put(self, key: str, value: str):
+        """응답을 저장하고 크기 상한을 넘으면 오래된 항목을 정리"""
+        now = time.time()
+        size = len(value.encode('utf-8'))
+        self._conn.execute(
+            'INSERT OR REPLACE INTO responses(key, value, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)',
+            (key, value, size, now, now),
+        )
+        self._evict()
+
+    def _evict(self):
+        total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in self._conn.execute('SELECT key, size FROM responses ORDER BY last_access').fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+            total -= size
+            evicted += 1
+        self._conn.execute(
+            'INSERT INTO stats(name, value) VALUES (?, ?) ON CONFLICT(name) DO UPDATE SET value = value + ?',
+            ('evictions', evicted, evicted),
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """이번 실행(session)과 누적(total) hit/miss 및 저장 용량"""
+        entries, total_bytes = self._conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+        totals = dict(self._conn.execute('SELECT name, value FROM stats').fetchall())
+        session_lookups = self.hits + self.misses
+        total_lookups = totals.get('hits', 0) + totals.get('misses', 0)
+        return {
+            'entries': entries,
+            'bytes': total_bytes,
+            'max_bytes': self.max_bytes,
+            'session_hits': self.hits,
+            'session_misses': self.misses,
+            'session_hit_rate': self.hits / session_lookups if session_lookups else 0.0,
+            'total_hits': totals.get('hits', 0),
+            'total_misses': totals.get('misses', 0),
+            'total_hit_rate': totals.get('hits', 0) / total_lookups if total_lookups else 0.0,
+            'evictions': totals.get('evictions', 0),
+        }
+
+    def print_stats(self):
+        s = self.stats()
+        print(f"🗄️  LLM 캐시: hit {s['session_hits']} / miss {s['session_misses']} "
+              f"(hit rate {s['session_hit_rate']:.1%}), "
+              f"{s['entries']}개 항목, {s['bytes'] / 1024 / 1024:.1f}MB / {s['max_bytes'] / 1024 / 1024:.0f}MB")
+
+    def clear(self):
+        self._conn.execute('DELETE FROM responses')
+        self._conn.execute('DELETE FROM stats')
+
+    def close(self):
+        self._conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='LLM 응답 캐시 관리')
+    parser.add_argument('command', choices=['stats', 'clear'])
+    parser.add_argument('--path', type=Path, default=DEFAULT_CACHE_PATH, help='캐시 파일 경로')
+    args = parser.parse_args()
+
+    cache = ResponseCache(args.path)
+    try:
+        if args.command == 'stats':
+            print(json.dumps(cache.stats(), ensure_ascii=False, indent=4))
+        else:
+            cache.clear()
+            print(f"🧹 캐시를 비웠습니다: {args.path}")
+    finally:
+        cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,271 @@
+# coding=utf-8
+"""
+LLM/임베딩 API 호출별 토큰, 지연 시간, 비용을 기록하는 append-only ledger
+
+정제(process_contract), 임베딩(update_embeddings), 검색(ask_rag_system) 단계가 같은 ledger에
+호출 한 건당 한 줄(JSONL)을 남기고, report 명령으로 단계/모델별 비용과 p50/p95/p99 지연 시간을 집계한다.
+실행(run)별 예산 상한(USD 또는 토큰)을 넘으면 다음 호출 전에 BudgetExceededError를 던져 실행을 멈춘다.
+
+Usage:
+    python monitoring/usage_ledger.py report
+    python monitoring/usage_ledger.py report --run 20260101-120000-ab12cd
+    python monitoring/usage_ledger.py report --since 2026-01-01
+"""
+import argparse
+import fcntl
+import json
+import math
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_LEDGER_PATH = ROOT_DIR / 'data' / 'usage_ledger.jsonl'
+
+# 100만 토큰당 USD (input, output). Batch API는 50% 할인
+MODEL_PRICES = {
+    'gpt-4o-mini': (0.15, 0.60),
+    'gpt-4o': (2.50, 10.00),
+    'gpt-4.1-mini': (0.40, 1.60),
+    'gpt-4.1-nano': (0.10, 0.40),
+    'gpt-4.1': (2.00, 8.00),
+    'text-embedding-3-small': (0.02, 0.0),
+    'text-embedding-3-large': (0.13, 0.0),
+    # embedding/embedding_providers.py의 local provider (API 호출 없음)
+    'local-hash-tfidf': (0.0, 0.0),
+}
+BATCH_DISCOUNT = 0.5
+
+
+class BudgetExceededError(Exception):
+    """실행별 예산 상한을 넘었을 때 발생"""
+    pass
+
+
+def _usage_value(usage: Any, name: str) -> int:
+    if usage is None:
+        return 0
+    value = usage.get(name) if isinstance(usage, dict) else getattr(usage, name, None)
+    return value or 0
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int, batch: bool = False) -> Optional[float]:
+    """가격표 기준 호출 비용(USD). 모델 이름은 날짜 접미사가 붙어도 앞부분으로 매칭"""
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        matches = [name for name in MODEL_PRICES if model and model.startswith(name)]
+        if not matches:
+            return None
+        prices = MODEL_PRICES[max(matches, key=len)]
+    cost = (prompt_tokens * prices[0] + completion_tokens * prices[1]) / 1_000_000
+    return cost * BATCH_DISCOUNT if batch else cost
+
+
+def new_run_id() -> str:
+    return f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+
+class UsageLedger:
+    """
+    API 호출 기록기
+
+    Args:
+        path: ledger JSONL 파일 경로
+        run_id: 이번 실행 식별자 (None이면 생성)
+        budget_usd: 이번 실행의 비용 상한 (None이면 제한 없음)
+        budget_tokens: 이번 실행의 토큰 상한 (None이면 제한 없음)
+    """
+
+    def __init__(self, path: Path = DEFAULT_LEDGER_PATH, run_id: str = None,
+                 budget_usd: float = None, budget_tokens: int = None):
+        self.path = Path(path)
+        self.run_id = run_id or new_run_id()
+        self.budget_usd = budget_usd
+        self.budget_tokens = budget_tokens
+        self.run_cost = 0.0
+        self.run_tokens = 0
+        self._lock = threading.Lock()
+
+    def check_budget(self):
+        """예산을 이미 넘었으면 BudgetExceededError (새 호출을 시작하기 전에 확인)"""
+        if self.budget_usd is not None and self.run_cost >= self.budget_usd:
+            raise BudgetExceededError(f"비용 상한 초과: ${self.run_cost:.4f} >= ${self.budget_usd:.4f} (run {self.run_id})")
+        if self.budget_tokens is not None and self.run_tokens >= self.budget_tokens:
+            raise BudgetExceededError(f"토큰 상한 초과: {self.run_tokens} >= {self.budget_tokens} (run {self.run_id})")
+
+    def record(
+        self,
+        stage: str,
+        model: str,
+        kind: str = 'chat',
+        page_id: Any = None,
+        usage: Any = None,
+        latency: float = None,
+        retries: int = 0,
+        cache_hit: bool = False,
+        ok: bool = True,
+        error: str = None,
+        batch: bool = False,
+        **extra: Any,
+    ) -> Dict[str, Any]:
+        """
+        호출 한 건을 기록
+
+        이미 받은 응답은 버리지 않도록 여기서는 예산 초과로 예외를 던지지 않는다.
+        호출하는 쪽이 다음 요청 전에 check_budget()으로 실행을 멈춘다.
+
+        Args:
+            stage: 파이프라인 단계 (예: cleaning, embedding, search)
+            model: 모델 이름
+            kind: chat / embedding / vector_search 등 호출 종류
+            page_id: 관련 페이지 (없으면 None)
+            usage: API 응답의 usage 객체 또는 dict
+            latency: 호출 소요 시간 (초)
+            retries: 재시도 횟수
+            cache_hit: 캐시로 API 호출을 생략했는지 여부
+        """
+        prompt_tokens = _usage_value(usage, 'prompt_tokens')
+        completion_tokens = _usage_value(usage, 'completion_tokens')
+        total_tokens = _usage_value(usage, 'total_tokens') or prompt_tokens + completion_tokens
+        cost = 0.0 if cache_hit else estimate_cost(model, prompt_tokens, completion_tokens, batch)
+
+        entry = {
+            'ts': time.time(),
+            'run_id': self.run_id,
+            'stage': stage,
+            'kind': kind,
+            'page_id': None if page_id is None else str(page_id),
+            'model': model,
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': total_tokens,
+            'latency_ms': None if latency is None else round(latency * 1000, 1),
+            'retries': retries,
+            'cache_hit': cache_hit,
+            'batch': batch,
+            'cost_usd': cost,
+            'ok': ok,
+            'error': error,
+        }
+        entry.update(extra)
+
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            # 여러 프로세스가 같은 ledger에 쓰므로 한 줄 단위로 잠그고 append
+            with open(self.path, 'a', encoding='utf-8') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    f.write(line)
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+            self.run_cost += cost or 0.0
+            self.run_tokens += total_tokens
+        return entry
+
+
+def add_ledger_arguments(parser: argparse.ArgumentParser):
+    """예산 상한 관련 CLI 옵션 추가"""
+    parser.add_argument('--budget-usd', type=float, default=None, help='이번 실행의 비용 상한 (USD)')
+    parser.add_argument('--budget-tokens', type=int, default=None, help='이번 실행의 토큰 상한')
+    parser.add_argument('--ledger', type=Path, default=DEFAULT_LEDGER_PATH, help='usage ledger 경로')
+
+
+def ledger_from_args(args: argparse.Namespace) -> UsageLedger:
+    return UsageLedger(args.ledger, budget_usd=args.budget_usd, budget_tokens=args.budget_tokens)
+
+
+# --- Report ---
+def iter_entries(path: Path = DEFAULT_LEDGER_PATH) -> Iterator[Dict[str, Any]]:
+    if not Path(path).exists():
+        return
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """nearest-rank 방식 백분위수"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(q * len(ordered) / 100) - 1))
+    return ordered[index]
+
+
+def aggregate(entries: List[Dict[str, Any]], group_by: List[str]) -> List[Dict[str, Any]]:
+    """group_by 필드 기준으로 호출 수, 토큰, 비용, 지연 백분위수를 집계"""
+    groups = defaultdict(list)
+    for entry in entries:
+        groups[tuple(entry.get(field) for field in group_by)].append(entry)
+
+    rows = []
+    for key, items in sorted(groups.items(), key=lambda kv: tuple(str(k) for k in kv[0])):
+        latencies = [e['latency_ms'] for e in items if e.get('latency_ms') is not None and not e.get('cache_hit')]
+        row = dict(zip(group_by, key))
+        row.update({
+            'calls': len(items),
+            'errors': sum(1 for e in items if not e.get('ok', True)),
+            'cache_hits': sum(1 for e in items if e.get('cache_hit')),
+            'retries': sum(e.get('retries', 0) for e in items),
+            'prompt_tokens': sum(e.get('prompt_tokens', 0) for e in items),
+            'completion_tokens': sum(e.get('completion_tokens', 0) for e in items),
+            'cost_usd': sum(e.get('cost_usd') or 0.0 for e in items),
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+        })
+        rows.append(row)
+    return rows
+
+
+def _fmt_ms(value: Optional[float]) -> str:
+    return '-' if value is None else f"{value:.0f}"
+
+
+def print_report(rows: List[Dict[str, Any]], group_by: List[str]):
+    header = ''.join(f"{field:<24}" for field in group_by)
+    print(f"{header}{'calls':>7}{'err':>5}{'cache':>7}{'retry':>7}{'in_tok':>12}{'out_tok':>10}"
+          f"{'cost($)':>11}{'p50':>8}{'p95':>8}{'p99':>8}")
+    for row in rows:
+        keys = ''.join(f"{str(row[field]):<24}" for field in group_by)
+        print(f"{keys}{row['calls']:>7}{row['errors']:>5}{row['cache_hits']:>7}{row['retries']:>7}"
+              f"{row['prompt_tokens']:>12}{row['completion_tokens']:>10}{row['cost_usd']:>11.4f}"
+              f"{_fmt_ms(row['p50_ms']):>8}{_fmt_ms(row['p95_ms']):>8}{_fmt_ms(row['p99_ms']):>8}")
+    total_cost = sum(row['cost_usd'] for row in rows)
+    total_calls = sum(row['calls'] for row in rows)
+    print(f"\n합계: {total_calls}건, ${total_cost:.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='API usage ledger 리포트')
+    parser.add_argument('command', choices=['report'])
+    parser.add_argument('--ledger', type=Path, default=DEFAULT_LEDGER_PATH, help='usage ledger 경로')
+    parser.add_argument('--run', default=None, help='특정 run_id만 집계')
+    parser.add_argument('--since', default=None, help='이 날짜(YYYY-MM-DD) 이후만 집계')
+    parser.add_argument('--by', nargs='+', default=['stage', 'model'], help='집계 기준 필드')
+    args = parser.parse_args()
+
+    since = datetime.strptime(args.since, '%Y-%m-%d').timestamp() if args.since else None
+    entries = [
+        e for e in iter_entries(args.ledger)
+        if (args.run is None or e.get('run_id') == args.run) and (since is None or e.get('ts', 0) >= since)
+    ]
+    if not entries:
+        print(f"집계할 기록이 없습니다: {args.ledger}")
+        return
+
+    print(f"📒 {args.ledger} ({len(entries)}건, run {len({e.get('run_id') for e in entries})}개)\n")
+    print_report(aggregate(entries, args.by), args.by)
+
+
+if __name__ == "__main__":
+    main()
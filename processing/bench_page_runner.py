@@ -0,0 +1,100 @@
+# coding=utf-8
+"""
+같은 HTML 코퍼스로 thread / process 워커의 파싱 처리량을 비교하는 벤치마크
+
+free-threaded(no-GIL) Python 3.13 빌드(python3.13t)와 일반 빌드에서 각각 실행해
+머신별로 더 빠른 --executor 값을 고르는 용도로 사용한다.
+
+Usage:
+    python bench_page_runner.py --workers 1 4 8 16
+    python bench_page_runner.py --input /path/to/html_body --repeat 3
+"""
+import argparse
+import os
+import platform
+import sys
+import time
+from pathlib import Path
+from typing import Dict
+
+from bs4 import BeautifulSoup
+
+from page_runner import gil_enabled, run_pages
+from parse_confluence_storage import parse_storage_content
+from parse_list_to_markdown import build_outline_index as build_list_outline, find_list_context, list_to_markdown
+from parse_table_to_csv import build_outline_index as build_table_outline, find_table_context, table_to_csv_rows
+
+DEFAULT_HTML_DIR = Path('/Users/sychoi/ProjectInsightHub/data/fetched/html_body')
+
+
+def parse_page_in_memory(html_path: Path) -> Dict[str, int]:
+    """파일 쓰기 없이 파싱 단계(storage 구조화 + 테이블/리스트 변환)만 수행"""
+    with open(html_path, 'r', encoding='utf-8') as f:
+        html_content = f.read()
+
+    parsed = parse_storage_content(html_content)
+
+    soup = BeautifulSoup(html_content, 'html.parser')
+    table_outline = build_table_outline(soup)
+    table_rows = 0
+    for table in soup.find_all('table'):
+        table_rows += len(table_to_csv_rows(table, find_table_context(table, soup, table_outline)))
+
+    list_outline = build_list_outline(soup)
+    list_chars = 0
+    for list_elem in soup.find_all(['ul', 'ol']):
+        if not list_elem.find_parent('table'):
+            list_chars += len(list_to_markdown(list_elem, context=find_list_context(list_elem, soup, list_outline)))
+
+    return {'sections': len(parsed['sections']), 'table_rows': table_rows, 'list_chars': list_chars}
+
+
+def time_run(html_paths, executor: str, workers: int, repeat: int) -> float:
+    """repeat번 실행한 중 가장 빠른 시간(초)을 반환"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        results = run_pages(parse_page_in_memory, html_paths, workers=workers, executor=executor)
+        elapsed = time.perf_counter() - started
+        failures = [r for r in results if not r['ok']]
+        if failures:
+            print(f"⚠️  {len(failures)}개 페이지 실패 (예: {failures[0]['item']}: {failures[0]['error']})")
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='thread vs process 파싱 워커 벤치마크')
+    parser.add_argument('--input', type=Path, default=DEFAULT_HTML_DIR, help='HTML 파일 디렉토리')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, os.cpu_count() or 1],
+                        help='비교할 워커 수 목록')
+    parser.add_argument('--executors', nargs='+', choices=['process', 'thread'], default=['process', 'thread'])
+    parser.add_argument('--repeat', type=int, default=3, help='설정별 반복 횟수 (최솟값 사용)')
+    parser.add_argument('--limit', type=int, default=None, help='사용할 최대 페이지 수')
+    args = parser.parse_args()
+
+    html_paths = sorted(args.input.glob('*.html'))[:args.limit]
+    if not html_paths:
+        print(f"HTML 파일을 찾을 수 없습니다: {args.input}")
+        sys.exit(1)
+
+    print(f"Python {platform.python_version()} ({sys.executable}), GIL {'enabled' if gil_enabled() else 'disabled'}")
+    print(f"코퍼스: {len(html_paths)}개 페이지, CPU {os.cpu_count()}개\n")
+
+    baseline = time_run(html_paths, 'process', 1, args.repeat)
+    print(f"{'executor':<10}{'workers':>8}{'seconds':>10}{'pages/s':>10}{'speedup':>9}")
+    print(f"{'serial':<10}{1:>8}{baseline:>10.3f}{len(html_paths) / baseline:>10.1f}{1.0:>8.2f}x")
+
+    best = ('serial', 1, baseline)
+    for executor in args.executors:
+        for workers in sorted(set(w for w in args.workers if w > 1)):
+            elapsed = time_run(html_paths, executor, workers, args.repeat)
+            print(f"{executor:<10}{workers:>8}{elapsed:>10.3f}{len(html_paths) / elapsed:>10.1f}{baseline / elapsed:>8.2f}x")
+            if elapsed < best[2]:
+                best = (executor, workers, elapsed)
+
+    print(f"\n🏁 이 머신의 권장 설정: --executor {best[0] if best[0] != 'serial' else 'process'} --workers {best[1]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -5,6 +5,8 @@ from pathlib import Path
 from typing import Any, Dict, List
 import traceback
 
+from page_runner import add_worker_arguments, report_failures, run_pages
+
 # --- Custom Exceptions ---
 class MetadataExtractionError(Exception): pass
 class InvalidJSONFormatError(MetadataExtractionError): pass
@@ -64,32 +66,30 @@ def extract_metadata(json_path: Path, output_path: Path = None) -> Dict[str, Any
     
     return cleaned_data
 
-def batch_extract_metadata(input_dir: Path, output_dir: Path):
-    """배치 처리 시 개별 파일의 에러가 전체 공정을 멈추지 않도록 관리"""
+def _extract_metadata_task(paths) -> None:
+    """(입력, 출력) 경로 쌍 하나를 처리 (워커에서 실행)"""
+    json_file, output_file = paths
+    extract_metadata(json_file, output_file)
+
+def batch_extract_metadata(input_dir: Path, output_dir: Path, workers: int = 1, chunksize: int = None,
+                           executor: str = 'process'):
+    """배치 처리 시 개별 파일의 에러가 전체 공정을 멈추지 않도록 관리 (workers > 1이면 멀티 프로세스)"""
     # 밖에서 체크: 입력 디렉토리가 존재하는가?
     if not input_dir.is_dir():
         raise FileNotFoundError(f"입력 디렉토리를 찾을 수 없습니다: {input_dir}")
 
     output_dir.mkdir(parents=True, exist_ok=True)
-    json_files = list(input_dir.rglob('*.json'))
+    json_files = sorted(input_dir.rglob('*.json'))
     
     print(f"🚀 처리 시작: {len(json_files)}개의 파일 발견")
     
     for json_file in json_files:
         print(f"🔍 처리 중: {json_file.name}")
     
-    results = {"success": 0, "failure": 0}
-    for json_file in json_files:
-        try:
-            output_file = output_dir / f"{json_file.stem}_metadata.json"
-            extract_metadata(json_file, output_file)
-            results["success"] += 1
-        except MetadataExtractionError as e:
-            # 커스텀 예외를 잡아 상세히 보고하지만, 루프는 계속됨
-            print(f"❌ 실패 ({json_file.name}): {e}")
-            results["failure"] += 1
-            
-    print(f"\n✅ 완료: 성공 {results['success']}, 실패 {results['failure']}")
+    # 파일별 예외는 run_pages 안에서 격리되므로 한 파일의 실패가 전체 공정을 멈추지 않음
+    tasks = [(json_file, output_dir / f"{json_file.stem}_metadata.json") for json_file in json_files]
+    results = run_pages(_extract_metadata_task, tasks, workers=workers, chunksize=chunksize, executor=executor)
+    report_failures(results, label='파일')
 
 # --- Entry Point ---
 def main():
@@ -97,6 +97,7 @@ def main():
     parser.add_argument('input', nargs='?', help='입력 경로')
     parser.add_argument('output', nargs='?', help='출력 경로')
     parser.add_argument('--batch', action='store_true', help='배치 처리 모드')
+    add_worker_arguments(parser)
     args = parser.parse_args()
 
     # 경로 설정 (Pathlib 활용)
@@ -107,7 +108,7 @@ def main():
         # 입력 경로가 디렉토리인지 확인
         if base_input.is_dir() or args.batch:
             # 디렉토리면 자동으로 배치 모드로 처리
-            batch_extract_metadata(base_input, base_output)
+            batch_extract_metadata(base_input, base_output, args.workers, args.chunksize, args.executor)
         else:
             # 단일 파일 처리 시에도 존재 여부 우선 체크 (Main의 책임)
             if not base_input.exists():
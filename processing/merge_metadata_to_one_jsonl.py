@@ -1,19 +1,30 @@
 import json
 from pathlib import Path
 
+from sharded_jsonl import ShardedJsonlWriter, merge_shards
+
 metadata_dir = Path('/Users/sychoi/projects/ProjectInsightHub/data/processed/metadata')
 processed_dir = Path('/Users/sychoi/projects/ProjectInsightHub/data/processed')
 output_file = processed_dir / 'merged_metadata.jsonl'
-for file in metadata_dir.iterdir():
-    print(file)
 
-    with open(file, 'r', encoding='utf-8') as f:
-        obj = json.load(f)
-        print(obj)
-    # obj['page_id'] = obj.pop('id')
 
-    # print(obj)
+def main():
+    # 워커별 샤드에 기록한 뒤 id 기준으로 병합 (append로 인한 중복/깨짐 방지)
+    with ShardedJsonlWriter(output_file) as writer:
+        for file in metadata_dir.iterdir():
+            print(file)
+
+            with open(file, 'r', encoding='utf-8') as f:
+                obj = json.load(f)
+                print(obj)
+            # obj['page_id'] = obj.pop('id')
+
+            # print(obj)
+
+            writer.write(obj)
+
+    merge_shards(output_file)
+
 
-    with open(output_file, 'a', encoding='utf-8') as of:
-        json.dump(obj, of, ensure_ascii=False)
-        of.write('\n')
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,18 @@
 import csv
-import json
 import re
 from pathlib import Path
 from typing import List
 
+from sharded_jsonl import ShardedJsonlWriter, existing_keys, merge_shards
+
+# 모듈 로드 시 한 번만 컴파일 (워커 간 읽기 전용으로 공유)
+TABLE_NUMBER_PATTERN = re.compile(r'table_(\d+)\.csv$')
+PAGE_DIR_PATTERN = re.compile(r'page_(\d+)_body')
+
 
 def extract_table_number(filename: str) -> int:
     """CSV 파일명에서 테이블 번호를 추출합니다."""
-    match = re.search(r'table_(\d+)\.csv$', filename)
+    match = TABLE_NUMBER_PATTERN.search(filename)
     if match:
         return int(match.group(1))
     return 0
@@ -126,50 +131,43 @@ def main():
         print("처리할 페이지 디렉토리를 찾을 수 없습니다.")
         return
     
-    # 결과를 저장할 리스트
-    results = []
-
-    for page_dir in page_dirs:
-        # page_id 추출 (예: page_3400499247_body -> 3400499247)
-        page_id_match = re.search(r'page_(\d+)_body', page_dir.name)
-        if not page_id_match:
-            print(f"Warning: {page_dir.name}에서 page_id를 추출할 수 없습니다.")
-            continue
-        
-        page_id = page_id_match.group(1)
-        output_file = processed_dir / "merged_tables.jsonl"
-        existing_ids = []
-
-        if output_file.exists():
-            with open(output_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = json.loads(line)
-                    existing_ids.append(line['page_id'])
+    output_file = processed_dir / "merged_tables.jsonl"
+    # 이미 처리된 page_id는 최종 파일과 완성된 샤드에서 한 번만 읽어옴
+    existing_ids = existing_keys(output_file)
+    processed_count = 0
+
+    # 워커별 샤드에 기록한 뒤 page_id 기준으로 병합 (여러 프로세스가 동시에 실행해도 안전)
+    with ShardedJsonlWriter(output_file) as writer:
+        for page_dir in page_dirs:
+            # page_id 추출 (예: page_3400499247_body -> 3400499247)
+            page_id_match = PAGE_DIR_PATTERN.search(page_dir.name)
+            if not page_id_match:
+                print(f"Warning: {page_dir.name}에서 page_id를 추출할 수 없습니다.")
+                continue
 
+            page_id = page_id_match.group(1)
             if page_id in existing_ids:
                 print(f"Page {page_id} already exists in {output_file}")
                 continue
 
-        print(f"Processing page_id: {page_id}")
-        
-        # 테이블 처리
-        table_string = process_page_tables(page_dir)
-        
-        if table_string:
-            results.append({
-                "page_id": page_id,
-                "tables": table_string
-            })
-        else:
-            print(f"Warning: {page_id}에 대한 테이블 데이터가 없습니다.")
-    
-    # JSONL 파일로 저장
-    with open(output_file, 'a', encoding='utf-8') as f:
-        for result in results:
-            json_line = json.dumps(result, ensure_ascii=False)
-            f.write(json_line + '\n')
-    
-    print(f"\n완료: {len(results)}개의 페이지가 처리되어 {output_file}에 저장되었습니다.")
+            print(f"Processing page_id: {page_id}")
+
+            # 테이블 처리
+            table_string = process_page_tables(page_dir)
+
+            if table_string:
+                writer.write({
+                    "page_id": page_id,
+                    "tables": table_string
+                })
+                processed_count += 1
+            else:
+                print(f"Warning: {page_id}에 대한 테이블 데이터가 없습니다.")
+
+    # JSONL 파일로 병합
+    merge_shards(output_file)
+
+    print(f"\n완료: {processed_count}개의 페이지가 처리되어 {output_file}에 저장되었습니다.")
 
 
 if __name__ == "__main__":
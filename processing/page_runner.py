@@ -0,0 +1,147 @@
+# coding=utf-8
+"""
+페이지 단위로 독립적인 처리 작업을 여러 프로세스에 나누어 실행하는 모듈
+
+- 페이지 목록을 chunk 단위로 묶어 ProcessPoolExecutor에 제출 (작업 제출/피클링 오버헤드 감소)
+- 한 페이지의 예외가 다른 페이지나 전체 실행을 멈추지 않도록 페이지별로 격리
+- 결과는 입력 순서대로 반환
+- executor='thread'이면 ThreadPoolExecutor 사용: free-threaded(no-GIL) Python 3.13 빌드에서는
+  피클링 없이 여러 코어를 쓰고, 컴파일된 정규식 등 읽기 전용 상태를 워커들이 공유한다
+"""
+import argparse
+import os
+import sys
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Iterable, List, Sequence
+
+
+def _run_chunk(func: Callable[[Any], Any], chunk: Sequence[Any]) -> List[Dict[str, Any]]:
+    """chunk 안의 페이지를 순서대로 처리하고, 페이지별 성공/실패 결과를 반환"""
+    results = []
+    for item in chunk:
+        try:
+            results.append({'item': item, 'ok': True, 'result': func(item), 'error': None})
+        except Exception as e:
+            results.append({
+                'item': item,
+                'ok': False,
+                'result': None,
+                'error': f"{type(e).__name__}: {e}",
+                'traceback': traceback.format_exc(),
+            })
+    return results
+
+
+EXECUTORS = {
+    'process': ProcessPoolExecutor,
+    'thread': ThreadPoolExecutor,
+}
+
+
+def gil_enabled() -> bool:
+    """현재 인터프리터에서 GIL이 켜져 있는지 여부 (3.13 미만이거나 일반 빌드면 True)"""
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+    return True if is_gil_enabled is None else is_gil_enabled()
+
+
+def _chunked(items: Sequence[Any], chunksize: int) -> List[Sequence[Any]]:
+    return [items[i:i + chunksize] for i in range(0, len(items), chunksize)]
+
+
+def default_chunksize(num_items: int, workers: int) -> int:
+    """워커당 4개 정도의 chunk가 돌아가도록 크기 결정 (부하 분산과 제출 비용의 절충)"""
+    if workers <= 1:
+        return max(num_items, 1)
+    return max(1, num_items // (workers * 4))
+
+
+def run_pages(
+    func: Callable[[Any], Any],
+    items: Iterable[Any],
+    workers: int = 1,
+    chunksize: int = None,
+    executor: str = 'process',
+) -> List[Dict[str, Any]]:
+    """
+    페이지별 작업을 병렬로 실행
+
+    Args:
+        func: 페이지 하나를 처리하는 함수 (프로세스 간 전달을 위해 모듈 최상위 함수여야 함)
+        items: 처리할 페이지 목록 (경로, page_id 등 피클링 가능한 값)
+        workers: 워커 수 (1이면 현재 프로세스에서 순차 처리)
+        chunksize: 한 번에 제출할 페이지 수 (None이면 자동 결정)
+        executor: 'process' 또는 'thread'. thread 모드에서 func는 공유 상태를 변경하지 않아야 함
+
+    Returns:
+        입력 순서와 같은 순서의 결과 리스트.
+        각 원소는 {'item', 'ok', 'result', 'error'} 키를 가지며, 실패 시 'traceback'이 추가된다.
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    if executor not in EXECUTORS:
+        raise ValueError(f"지원하지 않는 executor입니다: {executor} (가능한 값: {', '.join(EXECUTORS)})")
+
+    workers = max(1, workers or 1)
+    if executor == 'thread' and workers > 1 and gil_enabled():
+        print("⚠️  GIL이 활성화된 인터프리터입니다. thread 모드는 CPU 작업에서 병렬 이득이 거의 없습니다 (python3.13t 권장).")
+    if chunksize is None:
+        chunksize = default_chunksize(len(items), workers)
+    chunks = _chunked(items, chunksize)
+
+    if workers == 1:
+        results = []
+        for chunk in chunks:
+            results.extend(_run_chunk(func, chunk))
+        return results
+
+    chunk_results = [None] * len(chunks)
+    max_in_flight = workers * 2
+    with EXECUTORS[executor](max_workers=workers) as pool:
+        pending = {}
+        next_index = 0
+        while next_index < len(chunks) or pending:
+            # 메모리 사용량을 일정하게 유지하기 위해 제출된 chunk 수를 제한
+            while next_index < len(chunks) and len(pending) < max_in_flight:
+                future = pool.submit(_run_chunk, func, chunks[next_index])
+                pending[future] = next_index
+                next_index += 1
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                try:
+                    chunk_results[index] = future.result()
+                except Exception as e:
+                    # 워커 자체가 죽은 경우 해당 chunk의 페이지를 모두 실패로 기록
+                    chunk_results[index] = [
+                        {'item': item, 'ok': False, 'result': None, 'error': f"{type(e).__name__}: {e}"}
+                        for item in chunks[index]
+                    ]
+
+    return [result for chunk in chunk_results for result in chunk]
+
+
+def report_failures(results: List[Dict[str, Any]], label: str = '페이지') -> int:
+    """실패한 페이지를 출력하고 실패 개수를 반환"""
+    failures = [r for r in results if not r['ok']]
+    for failure in failures:
+        item = failure['item']
+        # (입력 경로, 출력 경로) 형태의 작업은 입력 파일명으로 표시
+        if isinstance(item, tuple):
+            item = item[0]
+        print(f"❌ 실패 ({getattr(item, 'name', item)}): {failure['error']}")
+    print(f"\n✅ 완료: {label} 성공 {len(results) - len(failures)}, 실패 {len(failures)}")
+    return len(failures)
+
+
+def add_worker_arguments(parser: argparse.ArgumentParser):
+    """병렬 실행 관련 CLI 옵션 추가"""
+    parser.add_argument('--workers', type=int, default=1,
+                        help=f'병렬 워커 수 (기본값 1, 이 머신의 CPU 수: {os.cpu_count()})')
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help='워커에 한 번에 넘길 페이지 수 (기본값: 자동)')
+    parser.add_argument('--executor', choices=sorted(EXECUTORS), default='process',
+                        help='워커 종류 (thread는 free-threaded Python 3.13 빌드에서 권장)')
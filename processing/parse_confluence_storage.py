@@ -2,11 +2,16 @@
 """
 Confluence page JSON 파일의 storage 내용을 파싱하여 구조화된 데이터로 변환하는 스크립트
 """
+import argparse
 import json
+import sys
 from bs4 import BeautifulSoup
+from pathlib import Path
 import re
 from typing import Dict, List, Any
 
+from page_runner import add_worker_arguments, report_failures, run_pages
+
 
 def parse_storage_content(storage_html: str) -> Dict[str, Any]:
     """
@@ -200,18 +205,56 @@ def parse_json_file(json_file_path: str, output_file: str = None) -> Dict[str, A
     return result
 
 
+def _parse_json_file_task(paths) -> Dict[str, int]:
+    """(입력, 출력) 경로 쌍을 파싱하고 요약 카운트를 반환 (워커에서 실행)"""
+    json_file, output_file = paths
+    result = parse_json_file(str(json_file), str(output_file))
+    parsed_content = result.get('parsed_content', {})
+    return {key: len(parsed_content.get(key, [])) for key in ['sections', 'tables', 'lists', 'macros']}
+
+
+def batch_parse_json_files(input_dir: Path, output_dir: Path = None, workers: int = 1, chunksize: int = None,
+                           executor: str = 'process'):
+    """
+    디렉토리 안의 모든 page JSON 파일을 병렬로 파싱
+
+    Args:
+        input_dir: Confluence page JSON 파일들이 있는 디렉토리
+        output_dir: 파싱 결과 저장 디렉토리 (None이면 입력 디렉토리)
+        workers: 워커 프로세스 수
+        chunksize: 워커에 한 번에 넘길 파일 수
+        executor: 'process' 또는 'thread'
+    """
+    output_dir = output_dir or input_dir
+    output_dir.mkdir(parents=True, exist_ok=True)
+    json_files = sorted(p for p in input_dir.glob('*.json') if not p.stem.endswith('_parsed'))
+    tasks = [(json_file, output_dir / f"{json_file.stem}_parsed.json") for json_file in json_files]
+
+    print(f"🚀 처리 시작: {len(tasks)}개의 파일 발견")
+    results = run_pages(_parse_json_file_task, tasks, workers=workers, chunksize=chunksize, executor=executor)
+    report_failures(results, label='파일')
+    return results
+
+
 if __name__ == "__main__":
-    import sys
-    
-    if len(sys.argv) < 2:
-        print("Usage: python parse_confluence_storage.py <json_file_path> [output_file_path]")
-        print("\nExample:")
-        print("  python parse_confluence_storage.py page_3341123699.json page_3341123699_parsed.json")
-        sys.exit(1)
-    
-    json_file = sys.argv[1]
-    output_file = sys.argv[2] if len(sys.argv) > 2 else None
-    
+    parser = argparse.ArgumentParser(
+        description='Confluence page JSON의 storage 내용을 파싱',
+        epilog='Example: python parse_confluence_storage.py page_3341123699.json page_3341123699_parsed.json',
+    )
+    parser.add_argument('input', help='page JSON 파일 또는 JSON 파일들이 있는 디렉토리')
+    parser.add_argument('output', nargs='?', help='출력 파일 (디렉토리 입력 시 출력 디렉토리)')
+    add_worker_arguments(parser)
+    args = parser.parse_args()
+
+    json_path = Path(args.input)
+    if json_path.is_dir():
+        batch_parse_json_files(json_path, Path(args.output) if args.output else None,
+                               args.workers, args.chunksize, args.executor)
+        sys.exit(0)
+
+    json_file = args.input
+    output_file = args.output
+
     if not output_file:
         output_file = json_file.replace('.json', '_parsed.json')
     
@@ -226,4 +269,3 @@ if __name__ == "__main__":
         print(f"Error: {e}")
         import traceback
         traceback.print_exc()
-
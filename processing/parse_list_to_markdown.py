@@ -4,6 +4,9 @@ HTML 리스트를 Markdown 파일로 변환하는 모듈
 """
 from bs4 import BeautifulSoup
 from pathlib import Path
+import argparse
+
+from page_runner import add_worker_arguments, report_failures, run_pages
 
 data_path = Path('/Users/sychoi/ProjectInsightHub/data')
 fetched_dir = data_path / 'fetched'
@@ -11,13 +14,31 @@ processed_dir = data_path / 'processed'
 html_body_dir = fetched_dir / 'html_body'
 
 
-def find_list_context(list, soup) -> str:
+OUTLINE_TAGS = ['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'ul', 'ol']
+
+
+def build_outline_index(soup) -> dict:
+    """
+    헤딩과 리스트 요소의 문서 내 순서를 한 번만 계산한 읽기 전용 인덱스
+
+    리스트마다 soup.find_all을 다시 호출하지 않도록 페이지당 한 번 만들어 재사용한다.
+    페이지 안에서만 쓰이고 변경되지 않으므로 thread 모드 워커에서도 안전하다.
+    """
+    elements = soup.find_all(OUTLINE_TAGS)
+    return {
+        'elements': elements,
+        'positions': {id(elem): i for i, elem in enumerate(elements)},
+    }
+
+
+def find_list_context(list, soup, outline: dict = None) -> str:
     """
     리스트 앞의 컨텍스트(헤딩, 제목 등)를 찾아 반환
     
     Args:
         list: BeautifulSoup 리스트 요소 (ul 또는 ol)
         soup: BeautifulSoup 전체 문서 객체
+        outline: build_outline_index 결과 (None이면 새로 계산)
         
     Returns:
         컨텍스트 텍스트 (없으면 빈 문자열)
@@ -34,23 +55,24 @@ def find_list_context(list, soup) -> str:
                 return context
     
     # 2. 리스트 이전의 가장 가까운 헤딩 찾기
-    all_elements = soup.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'ul', 'ol'])
-    for i, elem in enumerate(all_elements):
-        if elem == list:
-            # 현재 리스트의 위치를 찾았으므로, 이전 요소들을 역순으로 확인
-            for j in range(i - 1, -1, -1):
-                prev_elem = all_elements[j]
-                if prev_elem.name and prev_elem.name.startswith('h'):
-                    # 헤딩을 찾았으면 텍스트 추출
-                    heading_text = prev_elem.get_text(separator=' ', strip=True)
-                    if heading_text:
-                        # strong 태그 제거하고 텍스트만 추출
-                        heading_text = ' '.join(heading_text.split())
-                        return heading_text
-                elif prev_elem.name == 'ul' or prev_elem.name == 'ol':
-                    # 다른 리스트를 만나면 중단
-                    break
-            break
+    if outline is None:
+        outline = build_outline_index(soup)
+    all_elements = outline['elements']
+    i = outline['positions'].get(id(list))
+    if i is not None:
+        # 현재 리스트의 위치를 찾았으므로, 이전 요소들을 역순으로 확인
+        for j in range(i - 1, -1, -1):
+            prev_elem = all_elements[j]
+            if prev_elem.name and prev_elem.name.startswith('h'):
+                # 헤딩을 찾았으면 텍스트 추출
+                heading_text = prev_elem.get_text(separator=' ', strip=True)
+                if heading_text:
+                    # strong 태그 제거하고 텍스트만 추출
+                    heading_text = ' '.join(heading_text.split())
+                    return heading_text
+            elif prev_elem.name == 'ul' or prev_elem.name == 'ol':
+                # 다른 리스트를 만나면 중단
+                break
     
     # 3. 리스트의 부모 요소에서 제목 찾기
     parent = list.parent
@@ -153,9 +175,12 @@ def extract_lists_to_markdown(soup, output_prefix: str, page_dir: Path):
     list_dir = page_dir / "list"
     list_dir.mkdir(parents=True, exist_ok=True)
     
+    # 헤딩/리스트 순서는 페이지당 한 번만 계산
+    outline = build_outline_index(soup)
+
     for idx, list_elem in enumerate(lists, 1):
         # 리스트의 컨텍스트 찾기
-        context = find_list_context(list_elem, soup)
+        context = find_list_context(list_elem, soup, outline)
         
         markdown_content = list_to_markdown(list_elem, context=context)
         
@@ -195,19 +220,24 @@ def parse_list_to_markdown(html_path: Path, output_dir: Path = None):
     extract_lists_to_markdown(soup, output_prefix, output_dir)
 
 
+def process_html_page(html_path: Path):
+    """페이지 하나의 리스트를 data/processed/<페이지> 폴더에 Markdown으로 저장 (워커에서 실행)"""
+    page_dir = processed_dir / html_path.stem
+    page_dir.mkdir(parents=True, exist_ok=True)
+
+    print(f"\nProcessing {html_path.name}...")
+    parse_list_to_markdown(html_path, page_dir)
+
+
 def main():
     """data/processed 아래의 모든 page_*_body 폴더에서 HTML 파일을 찾아 리스트 추출"""
-    for html_path in html_body_dir.glob('*.html'):
-        html_path = Path(html_path)
-        
-        if not html_path.exists():
-            continue
-        
-        page_dir = processed_dir / html_path.stem
-        page_dir.mkdir(parents=True, exist_ok=True)
-        
-        print(f"\nProcessing {html_path.name}...")
-        parse_list_to_markdown(html_path, page_dir)
+    parser = argparse.ArgumentParser(description='HTML 리스트를 Markdown으로 변환')
+    add_worker_arguments(parser)
+    args = parser.parse_args()
+
+    html_paths = sorted(p for p in html_body_dir.glob('*.html') if p.exists())
+    results = run_pages(process_html_page, html_paths, workers=args.workers, chunksize=args.chunksize, executor=args.executor)
+    report_failures(results)
 
 
 if __name__ == '__main__':
@@ -1,7 +1,11 @@
 from bs4 import BeautifulSoup as bs
 from pathlib import Path
 import re
-import json
+
+from sharded_jsonl import ShardedJsonlWriter, existing_keys, merge_shards
+
+# 숫자 + 점 + 공백으로 시작하는 최상위 목차 헤딩 (모듈 로드 시 한 번만 컴파일, 워커 간 공유)
+TOP_LEVEL_HEADING_PATTERN = re.compile(r'^\d+\.\s+')
 
 
 def parse_html(html_path: Path) -> bs:
@@ -11,17 +15,18 @@ def parse_html(html_path: Path) -> bs:
     return soup
 
 
-def extract_top_level_toc(soup, page_id: str, processed_dir: Path):
-    """제일 상단 목차만 추출하여 '1. 프로젝트 개요 > 2. 작업 내용 > ...' 형식으로 JSON에 저장"""
+def extract_top_level_toc(soup, page_id: str, processed_dir: Path, writer: ShardedJsonlWriter = None, existing_ids: set = None):
+    """
+    제일 상단 목차만 추출하여 '1. 프로젝트 개요 > 2. 작업 내용 > ...' 형식으로 JSON에 저장
+
+    writer가 주어지면 해당 샤드에 기록하고 병합은 호출한 쪽에서 수행한다.
+    writer가 없으면 이 페이지만 담은 샤드를 만들어 바로 병합한다.
+    """
     toc_filename = "html_body_toc.jsonl"
     toc_path = processed_dir / toc_filename
-    
-    existing_ids = []
-    if toc_path.exists():
-        with open(toc_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                line = json.loads(line)
-                existing_ids.append(line['page_id'])
+
+    if existing_ids is None:
+        existing_ids = existing_keys(toc_path)
 
     if page_id in existing_ids:
         print(f"Page {page_id} already exists in {toc_path.relative_to(processed_dir.parent)}")
@@ -42,7 +47,7 @@ def extract_top_level_toc(soup, page_id: str, processed_dir: Path):
         
         # 숫자로 시작하는 헤딩만 추출 (예: "1. 프로젝트 개요", "2. 작업 내용")
         # 패턴: 숫자 + 점 + 공백으로 시작하는 경우
-        if re.match(r'^\d+\.\s+', text):
+        if TOP_LEVEL_HEADING_PATTERN.match(text):
             headings.append(text)
     
     if not headings:
@@ -58,10 +63,14 @@ def extract_top_level_toc(soup, page_id: str, processed_dir: Path):
         'toc': toc_string
     }
 
-    with open(toc_path, 'a', encoding='utf-8') as f:
-        f.write(json.dumps(toc_data, ensure_ascii=False))
-        f.write('\n')
-    
+    if writer is None:
+        with ShardedJsonlWriter(toc_path) as single_writer:
+            single_writer.write(toc_data)
+        merge_shards(toc_path)
+    else:
+        writer.write(toc_data)
+        existing_ids.add(page_id)
+
     print(f"Saved TOC to {toc_path.relative_to(processed_dir.parent)}")
 
 
@@ -71,19 +80,25 @@ def main():
     html_body_dir.mkdir(parents=True, exist_ok=True)
     
     processed_dir = data_path / 'processed'
+    toc_path = processed_dir / "html_body_toc.jsonl"
+    existing_ids = existing_keys(toc_path)
 
-    for html_path in html_body_dir.glob('*.html'):
-        if not html_path.exists():
-            continue
-            
-        soup = parse_html(html_path)
-        
-        # page_id 추출 (예: page_3126853834_body -> 3126853834)
-        
-        page_id = html_path.stem.replace('page_', '').replace('_body', '')
+    # 워커별 샤드에 기록한 뒤 page_id 기준으로 병합
+    with ShardedJsonlWriter(toc_path) as writer:
+        for html_path in html_body_dir.glob('*.html'):
+            if not html_path.exists():
+                continue
+
+            soup = parse_html(html_path)
+
+            # page_id 추출 (예: page_3126853834_body -> 3126853834)
+
+            page_id = html_path.stem.replace('page_', '').replace('_body', '')
+
+            # 제일 상단 목차 추출 (JSON)
+            extract_top_level_toc(soup, page_id, processed_dir, writer, existing_ids)
 
-        # 제일 상단 목차 추출 (JSON)
-        extract_top_level_toc(soup, page_id, processed_dir)
+    merge_shards(toc_path)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,192 @@
+# coding=utf-8
+"""
+여러 워커 프로세스가 같은 JSONL 결과 파일을 안전하게 만들 수 있도록
+워커별 샤드 파일에 기록한 뒤 page_id 기준으로 병합하는 모듈
+
+- 각 워커는 `<output>.shards/` 아래 자신만의 `.tmp` 파일에 기록하고,
+  close 시점에 rename 하여 완성된 샤드로 확정한다 (중간에 죽은 워커의 결과는 병합되지 않음)
+- merge_shards는 기존 결과 파일과 완성된 샤드를 page_id(또는 id) 기준으로 중복 제거하여
+  (나중에 만든 레코드가 이김) page_id 순으로 정렬된 최종 파일을 원자적으로 교체한다
+"""
+import fcntl
+import json
+import os
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Set
+
+SHARD_DIR_SUFFIX = '.shards'
+SHARD_TMP_SUFFIX = '.tmp'
+
+
+def record_key(obj: Dict[str, Any]) -> Optional[str]:
+    """레코드의 중복 제거 키 (page_id 또는 id, 문자열로 통일)"""
+    key = obj.get('page_id') or obj.get('id')
+    return str(key) if key else None
+
+
+def shard_dir_for(output_path: Path) -> Path:
+    """결과 파일에 대응하는 샤드 디렉토리 경로"""
+    output_path = Path(output_path)
+    return output_path.with_name(output_path.name + SHARD_DIR_SUFFIX)
+
+
+def iter_jsonl(file_path: Path) -> Iterator[Dict[str, Any]]:
+    """JSONL 파일의 레코드를 순서대로 반환 (깨진 줄은 건너뜀)"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                print(f"Skipping invalid JSON line in {file_path.name}: {line.strip()[:80]}")
+
+
+def list_shards(output_path: Path):
+    """완성(rename)된 샤드 파일 목록을 만들어진 순서(mtime, 같으면 이름순)로 반환"""
+    shard_dir = shard_dir_for(output_path)
+    if not shard_dir.is_dir():
+        return []
+    shards = [p for p in shard_dir.glob('*.jsonl') if p.is_file()]
+    return sorted(shards, key=lambda p: (p.stat().st_mtime_ns, p.name))
+
+
+def existing_keys(output_path: Path) -> Set[str]:
+    """최종 결과 파일과 완성된 샤드에 이미 기록된 page_id 집합"""
+    output_path = Path(output_path)
+    keys = set()
+    sources = ([output_path] if output_path.exists() else []) + list_shards(output_path)
+    for source in sources:
+        for obj in iter_jsonl(source):
+            key = record_key(obj)
+            if key:
+                keys.add(key)
+    return keys
+
+
+class ShardedJsonlWriter:
+    """
+    워커 하나가 사용하는 샤드 writer
+
+    with 블록이 정상 종료되면 임시 파일을 샤드로 rename 하고,
+    예외로 종료되면 임시 파일을 삭제하여 부분 결과가 병합되지 않도록 한다.
+
+    Args:
+        output_path: 최종 JSONL 파일 경로 (예: data/processed/merged_tables.jsonl)
+        shard_id: 샤드 식별자 (None이면 pid와 임의 문자열로 생성)
+    """
+
+    def __init__(self, output_path: Path, shard_id: Optional[str] = None):
+        self.output_path = Path(output_path)
+        self.shard_dir = shard_dir_for(self.output_path)
+        self.shard_id = shard_id or f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.shard_path = self.shard_dir / f"{self.output_path.stem}.{self.shard_id}.jsonl"
+        self.tmp_path = self.shard_path.with_name(self.shard_path.name + SHARD_TMP_SUFFIX)
+        self.count = 0
+        self._file = None
+
+    def open(self) -> 'ShardedJsonlWriter':
+        self.shard_dir.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.tmp_path, 'w', encoding='utf-8')
+        return self
+
+    def write(self, obj: Dict[str, Any]):
+        if self._file is None:
+            self.open()
+        self._file.write(json.dumps(obj, ensure_ascii=False))
+        self._file.write('\n')
+        self.count += 1
+
+    def close(self):
+        """임시 파일을 디스크에 내린 뒤 샤드로 확정 (빈 샤드는 남기지 않음)"""
+        if self._file is None:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        self._file = None
+        if self.count:
+            os.replace(self.tmp_path, self.shard_path)
+        else:
+            self.tmp_path.unlink(missing_ok=True)
+
+    def abort(self):
+        """기록 중이던 임시 파일을 버림"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self.tmp_path.unlink(missing_ok=True)
+
+    def __enter__(self) -> 'ShardedJsonlWriter':
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+@contextmanager
+def _merge_lock(output_path: Path):
+    """동시에 여러 워커가 병합을 시도해도 한 번에 하나만 수행되도록 잠금"""
+    lock_path = output_path.with_name(output_path.name + '.lock')
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def merge_shards(output_path: Path, keep_shards: bool = False) -> int:
+    """
+    완성된 샤드들을 최종 JSONL 파일로 병합
+
+    기존 결과 파일의 레코드를 먼저, 그 다음 샤드를 만들어진 순서로 읽으며
+    같은 page_id는 나중에 나온 레코드로 교체한다 (다시 정제한 페이지가 이전 결과를 덮어씀). 결과는 page_id 순으로 정렬되므로
+    워커 수나 실행 순서와 관계없이 같은 입력이면 같은 파일이 만들어진다.
+
+    Args:
+        output_path: 최종 JSONL 파일 경로
+        keep_shards: True이면 병합 후에도 샤드 파일을 지우지 않음
+
+    Returns:
+        최종 파일의 레코드 수
+    """
+    output_path = Path(output_path)
+    with _merge_lock(output_path):
+        shards = list_shards(output_path)
+        sources = ([output_path] if output_path.exists() else []) + shards
+
+        records = {}
+        replaced = 0
+        for source in sources:
+            for obj in iter_jsonl(source):
+                key = record_key(obj)
+                if key is None:
+                    print(f"Warning: page_id가 없는 레코드는 건너뜁니다 ({source.name})")
+                    continue
+                if key in records:
+                    replaced += 1
+                records[key] = obj
+
+        tmp_output = output_path.with_name(f"{output_path.name}.{os.getpid()}.tmp")
+        with open(tmp_output, 'w', encoding='utf-8') as f:
+            for key in sorted(records):
+                f.write(json.dumps(records[key], ensure_ascii=False))
+                f.write('\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_output, output_path)
+
+        if not keep_shards:
+            for shard in shards:
+                shard.unlink(missing_ok=True)
+
+    print(f"Merged {len(shards)} shard(s) into {output_path.name}: {len(records)} records ({replaced} replaced by newer records)")
+    return len(records)
@@ -0,0 +1,79 @@
+# coding=utf-8
+"""embedding/hydration.py LRU/버전 테스트"""
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / 'embedding'))
+
+from hydration import DocumentHydrator
+
+
+class FakeStore:
+    def __init__(self):
+        self.docs = {
+            '1': {'page_id': '1', 'metadata': {'title': 'A'}, 'llm_content': {'summary': 'a', 'body': 'aa'}},
+            '2': {'page_id': '2', 'metadata': {'title': 'B'}, 'llm_content': {'summary': 'b', 'body': 'bb'}},
+        }
+        self.versions = {'1': ('id1', 't0'), '2': ('id2', 't0')}
+        self.fetched = []
+
+    def fetch(self, page_ids, fields):
+        self.fetched.append(list(page_ids))
+        return {page_id: dict(self.docs[page_id]) for page_id in page_ids if page_id in self.docs}
+
+    def page_versions(self, page_ids):
+        return {page_id: self.versions[page_id] for page_id in page_ids if page_id in self.versions}
+
+
+class DocumentHydratorTest(unittest.TestCase):
+    def setUp(self):
+        self.store = FakeStore()
+        self.hydrator = DocumentHydrator(self.store.fetch, capacity=2, page_versions=self.store.page_versions)
+
+    def test_cached_pages_are_not_fetched_again(self):
+        self.hydrator.hydrate(['1', '2'], ['metadata.title'])
+        docs = self.hydrator.hydrate(['2', '1'], ['metadata.title'])
+
+        self.assertEqual(self.store.fetched, [['1', '2']])
+        self.assertEqual(docs['1'], {'metadata': {'title': 'A'}})
+        self.assertEqual(self.hydrator.hits, 2)
+
+    def test_wider_fields_fetch_only_missing(self):
+        self.hydrator.hydrate(['1'], ['llm_content'])
+        docs = self.hydrator.hydrate(['1'], ['llm_content.summary', 'metadata.title'])
+
+        self.assertEqual(self.store.fetched, [['1'], ['1']])
+        self.assertEqual(docs['1'], {'llm_content': {'summary': 'a'}, 'metadata': {'title': 'A'}})
+        self.assertEqual(self.hydrator.hydrate(['1'], ['llm_content.body'])['1'], {'llm_content': {'body': 'aa'}})
+        self.assertEqual(len(self.store.fetched), 2)
+
+    def test_reembedded_page_is_fetched_again(self):
+        self.hydrator.hydrate(['1', '2'], ['llm_content.summary'])
+        self.store.docs['1']['llm_content'] = {'summary': 'new'}
+        self.store.versions['1'] = ('id1', 't1')
+
+        docs = self.hydrator.hydrate(['1', '2'], ['llm_content.summary'])
+
+        self.assertEqual(docs['1'], {'llm_content': {'summary': 'new'}})
+        self.assertEqual(self.store.fetched[-1], ['1'])
+
+    def test_deleted_page_is_dropped(self):
+        self.hydrator.hydrate(['1'], ['metadata.title'])
+        del self.store.docs['1'], self.store.versions['1']
+
+        self.assertEqual(self.hydrator.hydrate(['1'], ['metadata.title']), {})
+
+    def test_capacity_evicts_least_recently_used(self):
+        self.hydrator.hydrate(['1', '2'], ['metadata.title'])
+        self.hydrator.hydrate(['1'], ['metadata.title'])
+        self.store.docs['3'] = {'page_id': '3', 'metadata': {'title': 'C'}}
+        self.store.versions['3'] = ('id3', 't0')
+        self.hydrator.hydrate(['3'], ['metadata.title'])
+
+        self.hydrator.hydrate(['1', '2'], ['metadata.title'])
+        self.assertEqual(self.store.fetched[-1], ['2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
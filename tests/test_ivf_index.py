@@ -0,0 +1,60 @@
+# coding=utf-8
+"""embedding/ivf_index.py recall 테스트 (전수 검색 대비)"""
+import sys
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / 'embedding'))
+
+from ivf_index import IVFIndex, exact_rows
+from vector_storage import normalize
+
+
+def random_vectors(count, dims, seed):
+    rng = np.random.default_rng(seed)
+    return normalize(rng.standard_normal((count, dims)).astype(np.float32))
+
+
+def recall(index, queries, k, nprobe):
+    truth = exact_rows(index.vectors, queries, k)
+    found = [index.search_rows(query, k, nprobe)[0] for query in queries]
+    return np.mean([len(set(a) & set(b)) / len(b) for a, b in zip(found, truth)])
+
+
+class IVFIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.vectors = random_vectors(2000, 32, seed=1)
+        self.queries = random_vectors(20, 32, seed=2)
+
+    def test_probing_every_list_matches_exact_search(self):
+        index = IVFIndex.train(self.vectors, nlist=16, iterations=5)
+
+        self.assertEqual(recall(index, self.queries, k=5, nprobe=16), 1.0)
+
+    def test_lists_cover_every_row_once(self):
+        index = IVFIndex.train(self.vectors, nlist=16, iterations=5)
+
+        self.assertEqual(index.list_offsets[-1], len(self.vectors))
+        self.assertEqual(sorted(index.list_rows.tolist()), list(range(len(self.vectors))))
+
+    def test_pq_with_rerank_keeps_recall(self):
+        index = IVFIndex.train(self.vectors, nlist=8, pq_m=4, iterations=5, rerank=200)
+
+        self.assertGreaterEqual(recall(index, self.queries, k=5, nprobe=8), 0.8)
+
+    def test_scores_are_exact_cosine(self):
+        index = IVFIndex.train(self.vectors, nlist=16, iterations=5)
+        rows, scores = index.search_rows(self.queries[0], k=3, nprobe=16)
+
+        np.testing.assert_allclose(scores, self.vectors[rows] @ self.queries[0], rtol=1e-5)
+        self.assertTrue(np.all(np.diff(scores) <= 0))
+
+    def test_pq_requires_divisible_dimensions(self):
+        with self.assertRaises(ValueError):
+            IVFIndex.train(self.vectors, nlist=8, pq_m=5)
+
+
+if __name__ == '__main__':
+    unittest.main()
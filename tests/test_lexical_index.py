@@ -0,0 +1,94 @@
+# coding=utf-8
+"""embedding/lexical_index.py BM25/RRF 테스트"""
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / 'embedding'))
+
+from lexical_index import LexicalIndex, fuse_results, reciprocal_rank_fusion, tokenize
+
+
+DOCS = [
+    {'page_id': '1', 'metadata': {'title': 'PRJ-2024-017 계약서'}, 'vector_content': '유지보수 계약 조건'},
+    {'page_id': '2', 'metadata': {'title': 'PRJ-2024-018 계약서'}, 'vector_content': '유지보수 계약 조건'},
+    {'page_id': '3', 'metadata': {'title': '회의록'}, 'vector_content': '2024년 017 안건 PRJ 일정 논의'},
+    {'page_id': '4', 'metadata': {'title': '빈 문서'}},
+]
+
+
+class TokenizeTest(unittest.TestCase):
+    def test_hangul_bigrams(self):
+        self.assertEqual(tokenize('계약서'), ['계약', '약서'])
+        self.assertEqual(tokenize('안 건'), ['안', '건'])
+
+    def test_code_keeps_whole_and_parts(self):
+        self.assertEqual(tokenize('PRJ-2024-017'), ['prj-2024-017', 'prj', '2024', '017'])
+
+    def test_nfkc_and_lowercase(self):
+        self.assertEqual(tokenize('ＡＢＣ Def'), ['abc', 'def'])
+
+
+class LexicalIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = LexicalIndex.build(DOCS)
+
+    def test_exact_code_ranks_first(self):
+        hits = self.index.search('PRJ-2024-017', k=3)
+
+        self.assertEqual(hits[0][0], '1')
+        self.assertGreater(hits[0][1], hits[1][1])
+
+    def test_unknown_query_returns_nothing(self):
+        self.assertEqual(self.index.search('xyz'), [])
+
+    def test_title_weighs_more_than_body(self):
+        index = LexicalIndex.build([
+            {'page_id': 'title', 'metadata': {'title': '보안 점검'}, 'vector_content': '기타 내용'},
+            {'page_id': 'body', 'metadata': {'title': '기타 내용'}, 'vector_content': '보안 점검'},
+        ])
+
+        self.assertEqual([page_id for page_id, _ in index.search('보안 점검')], ['title', 'body'])
+
+    def test_save_and_load_round_trip(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'lexical_index.npz'
+            self.index.save(path)
+            loaded = LexicalIndex.load(path)
+
+        self.assertEqual(loaded.search('PRJ-2024-017'), self.index.search('PRJ-2024-017'))
+
+
+class FusionTest(unittest.TestCase):
+    def test_rrf_rewards_agreement(self):
+        fused = reciprocal_rank_fusion([['a', 'b', 'c'], ['b', 'c', 'a']], k=60)
+
+        self.assertEqual([page_id for page_id, _ in fused], ['b', 'a', 'c'])
+        self.assertAlmostEqual(fused[0][1], 1 / 62 + 1 / 61)
+
+    def test_fuse_results_keeps_original_scores_and_fetches_lexical_only(self):
+        vector_results = [{'page_id': 'a', 'score': 0.9}, {'page_id': 'b', 'score': 0.8}]
+        lexical_hits = [('c', 7.0), ('a', 5.0)]
+        fetched = []
+
+        def fetch_docs(page_ids):
+            fetched.extend(page_ids)
+            return {page_id: {'page_id': page_id, 'title': page_id} for page_id in page_ids}
+
+        results = fuse_results(vector_results, lexical_hits, fetch_docs, limit=3)
+
+        self.assertEqual([doc['page_id'] for doc in results], ['a', 'c', 'b'])
+        self.assertEqual(fetched, ['c'])
+        self.assertEqual(results[0]['vector_score'], 0.9)
+        self.assertEqual(results[0]['lexical_score'], 5.0)
+        self.assertNotIn('vector_score', results[1])
+
+    def test_fuse_results_skips_deleted_documents(self):
+        results = fuse_results([{'page_id': 'a', 'score': 0.9}], [('gone', 3.0)], lambda page_ids: {}, limit=3)
+
+        self.assertEqual([doc['page_id'] for doc in results], ['a'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+# coding=utf-8
+"""embedding/query_cache.py exact/semantic 캐시 테스트"""
+import sys
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / 'embedding'))
+
+from query_cache import QueryCache
+
+CONTEXT = (3, 'local', 'v1', None)
+
+
+def hits(*page_ids):
+    return [{'page_id': page_id, 'score': 1.0} for page_id in page_ids]
+
+
+class QueryCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.versions = {'1': 'a', '2': 'a', '3': 'a'}
+        self.invalidated = []
+        self.cache = QueryCache(lambda page_ids: {page_id: self.versions[page_id] for page_id in page_ids
+                                                  if page_id in self.versions},
+                                capacity=2, threshold=0.95, on_invalidate=self.invalidated.extend)
+
+    def put(self, query, page_ids, vector=None, lexical_key=None, context=CONTEXT):
+        self.cache.put(query, context, hits(*page_ids), vector,
+                       {page_id: self.versions[page_id] for page_id in page_ids}, lexical_key)
+
+    def test_exact_hit_uses_normalized_text(self):
+        self.put('보안  점검 절차', ['1'])
+
+        self.assertEqual(self.cache.get_exact(['보안 점검 절차 ', '다른 질문'], CONTEXT), {0: hits('1')})
+        self.assertEqual(self.cache.get_exact(['보안 점검 절차'], (5, 'local', 'v1', None)), {})
+
+    def test_returns_copies(self):
+        self.put('q', ['1'])
+        self.cache.get_exact(['q'], CONTEXT)[0][0]['title'] = 'changed'
+
+        self.assertNotIn('title', self.cache.get_exact(['q'], CONTEXT)[0][0])
+
+    def test_capacity_evicts_least_recently_used_and_reuses_slot(self):
+        self.put('a', ['1'], [1, 0, 0])
+        self.put('b', ['2'], [0, 1, 0])
+        self.cache.get_exact(['a'], CONTEXT)
+        self.put('c', ['3'], [0, 0, 1])
+
+        self.assertEqual(len(self.cache), 2)
+        self.assertEqual(set(self.cache.get_exact(['a', 'b', 'c'], CONTEXT)), {0, 2})
+        self.assertEqual(self.cache.get_similar([[0, 1, 0]], CONTEXT, [0]), {})
+        self.assertEqual(self.cache.get_similar([[0, 0.1, 1]], CONTEXT, [0]), {0: hits('3')})
+
+    def test_changed_page_version_invalidates(self):
+        self.put('q', ['1', '2'])
+        self.versions['2'] = 'b'
+
+        self.assertEqual(self.cache.get_exact(['q'], CONTEXT), {})
+        self.assertEqual(self.invalidated, ['2'])
+        self.assertEqual(len(self.cache), 0)
+
+    def test_deleted_page_invalidates(self):
+        self.put('q', ['1'])
+        del self.versions['1']
+
+        self.assertEqual(self.cache.get_exact(['q'], CONTEXT), {})
+
+    def test_semantic_threshold_and_context(self):
+        self.put('보안 점검 절차', ['1'], [1, 0, 0])
+
+        self.assertEqual(self.cache.get_similar([[1, 0.1, 0], [1, 1, 0]], CONTEXT, [4, 7]), {4: hits('1')})
+        self.assertEqual(self.cache.get_similar([[1, 0.1, 0]], ('other',), [0]), {})
+
+    def test_semantic_requires_same_lexical_key(self):
+        self.put('PRJ-2024-017 일정', ['1'], [1, 0, 0], frozenset({'prj-2024-017', '일정'}))
+
+        found = self.cache.get_similar([[1, 0.01, 0], [1, 0.01, 0]], CONTEXT, [0, 1],
+                                       [frozenset({'prj-2024-018', '일정'}), frozenset({'prj-2024-017', '일정'})])
+        self.assertEqual(found, {1: hits('1')})
+
+    def test_invalidate_by_page(self):
+        self.put('a', ['1'], [1, 0, 0])
+        self.put('b', ['2'], [0, 1, 0])
+        self.cache.invalidate(['1'])
+
+        self.assertEqual(set(self.cache.get_exact(['a', 'b'], CONTEXT)), {1})
+        self.assertEqual(self.cache.get_similar([[1, 0, 0]], CONTEXT, [0]), {})
+
+    def test_ttl_expires_entries(self):
+        cache = QueryCache(capacity=2, ttl=0)
+        cache.put('q', CONTEXT, hits('1'), np.ones(3))
+
+        self.assertEqual(cache.get_exact(['q'], CONTEXT), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
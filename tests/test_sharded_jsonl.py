@@ -0,0 +1,53 @@
+# coding=utf-8
+"""processing/sharded_jsonl.py 병합 테스트"""
+import json
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1] / 'processing'))
+
+from sharded_jsonl import ShardedJsonlWriter, merge_shards
+
+
+def read_jsonl(path: Path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class MergeShardsTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.output = Path(self._tmp.name) / 'merged_llm_resps.jsonl'
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def write_shard(self, shard_id, records, mtime=None):
+        with ShardedJsonlWriter(self.output, shard_id=shard_id) as writer:
+            for record in records:
+                writer.write(record)
+        if mtime is not None:
+            os.utime(writer.shard_path, ns=(mtime, mtime))
+
+    def test_recleaned_page_replaces_existing_output(self):
+        self.output.write_text(json.dumps({'page_id': '1', 'summary': 'old'}) + '\n'
+                               + json.dumps({'page_id': '2', 'summary': 'kept'}) + '\n', encoding='utf-8')
+        self.write_shard('a', [{'page_id': '1', 'summary': 'new'}])
+
+        self.assertEqual(merge_shards(self.output), 2)
+        self.assertEqual(read_jsonl(self.output), [{'page_id': '1', 'summary': 'new'},
+                                                   {'page_id': '2', 'summary': 'kept'}])
+
+    def test_newer_shard_wins_regardless_of_name(self):
+        self.write_shard('b', [{'page_id': '1', 'summary': 'first'}], mtime=1_000_000_000)
+        self.write_shard('a', [{'page_id': '1', 'summary': 'second'}], mtime=2_000_000_000)
+
+        merge_shards(self.output)
+        self.assertEqual(read_jsonl(self.output), [{'page_id': '1', 'summary': 'second'}])
+
+
+if __name__ == '__main__':
+    unittest.main()